@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .admin_pagination import CursorPaginatedAdmin
 from .models import Document, Tag
 
 @admin.register(Tag)
@@ -8,12 +9,12 @@ class TagAdmin(admin.ModelAdmin):
     ordering = ['name']
 
 @admin.register(Document)
-class DocumentAdmin(admin.ModelAdmin):
+class DocumentAdmin(CursorPaginatedAdmin):
     search_fields = ['title', 'content']
     list_display = ['id', 'title', 'created_at']
     list_filter = ['created_at', 'tags']
     autocomplete_fields = ['tags']
-    ordering = ['-created_at']
-
-    
 
+    def get_queryset(self, request):
+        # content can be large and is never shown in the list
+        return super().get_queryset(request).defer('content')
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import base64
+from datetime import datetime
+
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from django.db.models import Q
+
+CURSOR_VAR = "cursor"
+
+
+def _encode_cursor(created_at: datetime, pk: int) -> str:
+    raw = f"{created_at.isoformat()}|{pk}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, pk = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeError) as e:
+        raise IncorrectLookupParameters(e)
+
+
+class CursorChangeList(ChangeList):
+    """
+    Keyset pagination on (created_at, pk) for the default "-created_at" order.
+
+    Each page is one indexed range scan of list_per_page + 1 rows: no COUNT(*)
+    and no OFFSET, so deep pages cost the same as the first one. When the user
+    sorts by another column the regular paginator is used.
+    """
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        self.cursor = request.GET.get(CURSOR_VAR, "")
+        self.cursor_mode = ORDER_VAR not in request.GET and not self.show_all
+        if not self.cursor_mode:
+            return super().get_results(request)
+
+        qs = self.queryset
+        if self.cursor:
+            created_at, pk = _decode_cursor(self.cursor)
+            qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+
+        rows = list(qs[: self.list_per_page + 1])
+        has_next = len(rows) > self.list_per_page
+        rows = rows[: self.list_per_page]
+
+        self.result_list = rows
+        self.result_count = len(rows)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = has_next or bool(self.cursor)
+        self.paginator = self.model_admin.get_paginator(request, rows, self.list_per_page)
+
+        self.first_page_url = self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+        self.next_cursor_url = ""
+        if has_next:
+            last = rows[-1]
+            self.next_cursor_url = self.get_query_string(
+                {CURSOR_VAR: _encode_cursor(last.created_at, last.pk)},
+                remove=[PAGE_VAR],
+            )
+
+
+class CursorPaginatedAdmin(admin.ModelAdmin):
+    """
+    ModelAdmin for large, append-mostly tables ordered by -created_at.
+    """
+
+    change_list_template = "admin/cursor_change_list.html"
+    show_full_result_count = False
+    ordering = ["-created_at", "-pk"]
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
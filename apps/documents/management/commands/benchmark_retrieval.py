@@ -0,0 +1,161 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.documents.models import Document
+from apps.documents.services.analysis import analyze_query
+from apps.documents.services.evaluation import overlap_at_k, percentiles
+from apps.documents.services.retrieval import RetrievalError, get_scorer
+
+# Named index configurations; the first variant of a run is the reference
+# every other variant's rankings are compared against.
+VARIANTS = {
+    "full": {"RETRIEVAL_INDEX_DTYPE": "float32", "RETRIEVAL_COMPACT_VOCAB": False},
+    "compact": {"RETRIEVAL_INDEX_DTYPE": "float32", "RETRIEVAL_COMPACT_VOCAB": True},
+    "uint8": {"RETRIEVAL_INDEX_DTYPE": "uint8", "RETRIEVAL_COMPACT_VOCAB": True},
+}
+
+
+def _split(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _sample_queries(corpus, n, rng):
+    """
+    Queries made of short word windows taken from random documents.
+    """
+    queries = []
+    texts = [t for t in corpus if t.split()]
+    for _ in range(n if texts else 0):
+        words = rng.choice(texts).split()
+        size = rng.randint(2, 6)
+        start = rng.randint(0, max(0, len(words) - size))
+        queries.append(" ".join(words[start:start + size]))
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        "Fit the lexical scorers on the current documents under several index "
+        "configurations and report build time, memory, query latency and "
+        "ranking agreement with the first configuration."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engines", default="tfidf,bm25", help="Comma-separated engines to fit.")
+        parser.add_argument(
+            "--variants",
+            default="full,compact,uint8",
+            help=f"Comma-separated index configurations ({', '.join(VARIANTS)}); the first is the reference.",
+        )
+        parser.add_argument("--queries", help="File with one query per line (default: sampled from documents).")
+        parser.add_argument("--n-queries", type=int, default=200)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--reference",
+            help="Engine whose first variant every row is compared against (default: each engine's own first variant).",
+        )
+        parser.add_argument(
+            "--update-docs",
+            type=int,
+            default=100,
+            help="For engines with in-place updates: documents held out of the fit and then added incrementally.",
+        )
+
+    def _run(self, engine, variant, corpus, doc_ids, queries, k):
+        with override_settings(**VARIANTS[variant]):
+            try:
+                scorer = get_scorer(engine)
+            except RetrievalError as e:
+                raise CommandError(str(e))
+
+        started = time.perf_counter()
+        scorer.fit(corpus, doc_ids)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        rankings, latencies = [], []
+        for query in queries:
+            started = time.perf_counter()
+            ranked, _ = scorer.search(query, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+            rankings.append(ranked.tolist())
+        return scorer, build_ms, rankings, latencies
+
+    def handle(self, *args, **options):
+        engines = _split(options["engines"])
+        variants = _split(options["variants"])
+        unknown = [v for v in variants if v not in VARIANTS]
+        if unknown or not variants:
+            raise CommandError(f"Unknown variants: {', '.join(unknown) or '(none)'}")
+
+        rows = list(Document.objects.all().values_list("id", "content"))
+        if not rows:
+            raise CommandError("No documents to index.")
+        doc_ids = np.fromiter((doc_id for doc_id, _ in rows), dtype=np.int64, count=len(rows))
+        corpus = [(content or "") for _, content in rows]
+
+        if options["queries"]:
+            with open(options["queries"], encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()][:options["n_queries"]]
+        else:
+            queries = _sample_queries(corpus, options["n_queries"], random.Random(options["seed"]))
+        # analyzed once up front, as retrieve_top_k does per request
+        queries = [analyze_query(q) for q in queries]
+
+        # imported up front so the first build time measures fitting only
+        import sklearn.feature_extraction.text  # noqa: F401
+
+        k = options["k"]
+        self.stdout.write(f"{len(corpus)} documents, {len(queries)} queries, k={k}")
+        self.stdout.write(
+            f"{'engine':<8} {'variant':<10} {'build ms':>10} {'index KiB':>10} {'vocab KiB':>10} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'overlap@k':>10} {'top1':>6}"
+        )
+
+        reference = None
+        if options["reference"]:
+            _, _, reference, _ = self._run(options["reference"], variants[0], corpus, doc_ids, queries, k)
+
+        for engine in engines:
+            engine_reference = reference
+            for variant in variants:
+                scorer, build_ms, rankings, latencies = self._run(engine, variant, corpus, doc_ids, queries, k)
+
+                if engine_reference is None:
+                    engine_reference = rankings
+                pairs = list(zip(engine_reference, rankings))
+                overlap = np.mean([overlap_at_k(r, c, k) for r, c in pairs]) if pairs else 1.0
+                top1 = np.mean([r[:1] == c[:1] for r, c in pairs]) if pairs else 1.0
+
+                memory = scorer.memory_usage()
+                p50, p95 = percentiles(latencies, (50, 95))
+                self.stdout.write(
+                    f"{engine:<8} {variant:<10} {build_ms:>10.1f} "
+                    f"{memory.get('index', 0) / 1024:>10.1f} {memory.get('vocabulary', 0) / 1024:>10.1f} "
+                    f"{p50:>8.3f} {p95:>8.3f} {overlap:>10.3f} {top1:>6.3f}"
+                )
+
+                if scorer.supports_updates and 0 < options["update_docs"] < len(corpus):
+                    self._benchmark_updates(scorer, build_ms, corpus, doc_ids, options["update_docs"])
+
+    def _benchmark_updates(self, scorer, build_ms, corpus, doc_ids, n_updates):
+        """
+        Fits on all but the last `n_updates` documents, adds those one by one
+        and compares the per-document update cost with a full refit.
+        """
+        n_base = len(corpus) - n_updates
+        scorer.fit(corpus[:n_base], doc_ids[:n_base])
+
+        started = time.perf_counter()
+        for text in corpus[n_base:]:
+            scorer = scorer.updated([text], np.empty(0, dtype=np.int64))
+        update_ms = (time.perf_counter() - started) * 1000
+
+        self.stdout.write(
+            f"{'':<8} {'':<10} {n_updates} incremental adds: {update_ms / n_updates:.3f} ms/doc "
+            f"(full refit: {build_ms:.1f} ms)"
+        )
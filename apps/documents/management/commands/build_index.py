@@ -0,0 +1,68 @@
+import resource
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.documents.services.retrieval import RetrievalError, build_index, get_engine_name, get_index_version
+
+
+def _peak_rss_mib(who) -> float:
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the retrieval index over the current documents and report "
+        "progress, build time per phase, throughput and peak memory. "
+        "tfidf/bm25 builds stream documents in chunks and tokenize them in "
+        "worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--engine", help="Engine to build (default: RETRIEVAL_ENGINE).")
+        parser.add_argument("--workers", type=int, help="Tokenizing processes (default: RETRIEVAL_BUILD_WORKERS).")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            help="Documents per streamed chunk (default: RETRIEVAL_BUILD_CHUNK_SIZE).",
+        )
+
+    def handle(self, *args, **options):
+        engine = (options["engine"] or get_engine_name()).lower()
+        verbosity = options["verbosity"]
+
+        def progress(documents, elapsed_ms):
+            if verbosity >= 1:
+                rate = documents / (elapsed_ms / 1000) if elapsed_ms else 0.0
+                self.stdout.write(f"  {documents} documents counted, {elapsed_ms:.0f} ms ({rate:.0f} docs/s)")
+
+        try:
+            index = build_index(
+                engine,
+                get_index_version(),
+                workers=options["workers"],
+                chunk_size=options["chunk_size"],
+                progress=progress,
+            )
+        except RetrievalError as e:
+            raise CommandError(str(e))
+
+        stats = index.build_stats
+        rate = stats.documents / (stats.total_ms / 1000) if stats.total_ms else 0.0
+        memory = index.scorer.memory_usage() if stats.documents else {}
+
+        self.stdout.write(
+            f"{engine}: {stats.documents} documents, {stats.terms} terms, {stats.nonzeros} nonzeros, "
+            f"{stats.chunks} chunks, {stats.workers} workers"
+        )
+        self.stdout.write(
+            f"{'count ms':>10} {'fit ms':>10} {'total ms':>10} {'docs/s':>10} "
+            f"{'index KiB':>10} {'peak MiB':>9} {'workers peak MiB':>17}"
+        )
+        self.stdout.write(
+            f"{stats.count_ms:>10.1f} {stats.fit_ms:>10.1f} {stats.total_ms:>10.1f} {rate:>10.0f} "
+            f"{memory.get('index', 0) / 1024:>10.1f} "
+            f"{_peak_rss_mib(resource.RUSAGE_SELF):>9.1f} {_peak_rss_mib(resource.RUSAGE_CHILDREN):>17.1f}"
+        )
@@ -18,6 +18,21 @@ class Document(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='documents_created_idx'),
+        ]
 
     def __str__(self) -> str:
-        return self.title
\ No newline at end of file
+        return self.title
+
+class DocumentChange(models.Model):
+    """
+    Append-only log of saved/deleted document ids. The id is the change
+    sequence number that incremental index refreshes replay from.
+    """
+
+    document_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"#{self.pk}: document {self.document_id}"
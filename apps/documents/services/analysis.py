@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Tuple
+
+from django.conf import settings
+
+# Arabic code points folded to the forms used in Persian text, Arabic-Indic
+# and Persian digits folded to ASCII; diacritics and tatweel removed.
+_CHAR_MAP = str.maketrans(
+    {
+        "ي": "ی",  # ARABIC YEH -> FARSI YEH
+        "ى": "ی",  # ALEF MAKSURA -> FARSI YEH
+        "ك": "ک",  # ARABIC KAF -> KEHEH
+        "ة": "ه",  # TEH MARBUTA -> HEH
+        "أ": "ا",  # ALEF WITH HAMZA ABOVE -> ALEF
+        "إ": "ا",  # ALEF WITH HAMZA BELOW -> ALEF
+        "ٱ": "ا",  # ALEF WASLA -> ALEF
+        "ؤ": "و",  # WAW WITH HAMZA ABOVE -> WAW
+        "ـ": None,      # TATWEEL
+        **{chr(c): None for c in range(0x064B, 0x0660)},  # harakat
+        "ٰ": None,      # SUPERSCRIPT ALEF
+        **{chr(0x0660 + d): str(d) for d in range(10)},  # Arabic-Indic digits
+        **{chr(0x06F0 + d): str(d) for d in range(10)},  # Persian digits
+    }
+)
+
+# same token definition as scikit-learn's default token_pattern
+_TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+PERSIAN_STOP_WORDS = frozenset(
+    """
+    و در به از که این آن را با است برای یک خود تا بر هم نیز شده شود می ها های
+    او ما من شما آنها ایشان یا اما اگر هر بود باشد دارد کند کنند کرد کرده نه
+    چه چرا کجا چگونه چطور آیا وی همه پس بین پیش روی زیر بی ای هست نیست شد
+    """.split()
+)
+
+_PERSIAN_SUFFIXES = ("هایی", "های", "ها")
+
+
+def normalize_text(text: str) -> str:
+    """
+    NFKC, Arabic -> Persian character unification and lowercasing.
+    """
+    return unicodedata.normalize("NFKC", text or "").translate(_CHAR_MAP).lower()
+
+
+def _light_stem(token: str) -> str:
+    """
+    Strips English plural endings and Persian plural suffixes only.
+    """
+    if token.isascii():
+        if len(token) > 4 and token.endswith("ies"):
+            return token[:-3] + "y"
+        if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+            return token[:-1]
+        return token
+    for suffix in _PERSIAN_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+            return token[: -len(suffix)]
+    return token
+
+
+def ngrams(tokens: Iterable[str], ngram_range: Tuple[int, int] = (1, 1)) -> List[str]:
+    """
+    Word n-grams joined by a space, in the order scikit-learn generates them.
+    """
+    tokens = list(tokens)
+    low, high = ngram_range
+    if high == 1:
+        return tokens
+
+    terms = list(tokens) if low == 1 else []
+    for n in range(max(2, low), high + 1):
+        terms.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return terms
+
+
+@dataclass(frozen=True)
+class AnalyzedQuery:
+    """
+    A query after analysis: normalized text (for encoders and rerankers)
+    and its token sequence (for lexical scoring and cache keys).
+    """
+
+    text: str
+    tokens: Tuple[str, ...]
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256("\x1f".join(self.tokens).encode("utf-8")).hexdigest()
+
+    @property
+    def text_digest(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class Analyzer:
+    """
+    The text pipeline shared by indexing and querying:
+    normalize -> tokenize -> drop stop words -> (optionally) stem.
+    """
+
+    stop_words: FrozenSet[str] = frozenset()
+    stemming: bool = False
+
+    def tokens(self, text: str) -> List[str]:
+        return self._tokenize(normalize_text(text))
+
+    def _tokenize(self, normalized: str) -> List[str]:
+        tokens = _TOKEN_RE.findall(normalized)
+        if self.stop_words:
+            tokens = [t for t in tokens if t not in self.stop_words]
+        if self.stemming:
+            tokens = [_light_stem(t) for t in tokens]
+        return tokens
+
+    def document_terms(self, text: str, ngram_range: Tuple[int, int] = (1, 1)) -> List[str]:
+        return ngrams(self.tokens(text), ngram_range)
+
+    def analyze_query(self, text: str) -> AnalyzedQuery:
+        return _analyze_query(self, text)
+
+
+@functools.lru_cache(maxsize=4096)
+def _analyze_query(analyzer: Analyzer, text: str) -> AnalyzedQuery:
+    # memoized: the same question is analyzed once even when a request
+    # retrieves more than once (ask endpoint + LangChain retriever)
+    normalized = normalize_text(text)
+    return AnalyzedQuery(text=" ".join(normalized.split()), tokens=tuple(analyzer._tokenize(normalized)))
+
+
+@functools.lru_cache(maxsize=8)
+def _build_analyzer(stop_word_sets: Tuple[str, ...], stemming: bool) -> Analyzer:
+    stop_words = set()
+    for name in stop_word_sets:
+        if name == "english":
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+            stop_words |= ENGLISH_STOP_WORDS
+        elif name == "persian":
+            stop_words |= PERSIAN_STOP_WORDS
+        else:
+            raise ValueError(f"Unsupported ANALYSIS_STOP_WORDS entry: {name}")
+    return Analyzer(stop_words=frozenset(stop_words), stemming=stemming)
+
+
+def get_analyzer() -> Analyzer:
+    stop_word_sets = getattr(settings, "ANALYSIS_STOP_WORDS", []) or []
+    return _build_analyzer(
+        tuple(sorted(s.strip().lower() for s in stop_word_sets if s.strip())),
+        bool(getattr(settings, "ANALYSIS_STEMMING", False)),
+    )
+
+
+def analyze_query(query) -> AnalyzedQuery:
+    """
+    Analyzes a query string with the configured pipeline (AnalyzedQuery passes through).
+    """
+    if isinstance(query, AnalyzedQuery):
+        return query
+    return get_analyzer().analyze_query(query or "")
+
+
+def pretokenized(terms):
+    """
+    scikit-learn `analyzer=` callable for documents already turned into terms.
+    """
+    return terms
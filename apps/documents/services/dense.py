@@ -0,0 +1,362 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import hashlib
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from apps.documents.services.analysis import AnalyzedQuery, normalize_text
+from apps.documents.services.inverted_index import select_top_k
+from apps.documents.services.pretrained import SharedPretrained
+from apps.documents.services.retrieval import Scorer
+
+
+class DenseError(RuntimeError):
+    pass
+
+
+# ---- Encoder ----
+
+_encoder_models = SharedPretrained("AutoModel")
+
+
+class Encoder:
+    """
+    Local sentence encoder on CPU (transformers + mean pooling).
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 256):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Returns L2-normalized float32 embeddings, encoded in batches.
+        """
+        import torch
+
+        model, tokenizer = _encoder_models.get(self.model_name)
+
+        out: List[np.ndarray] = []
+        with torch.inference_mode():
+            for start in range(0, len(texts), self.batch_size):
+                batch = [t or "" for t in texts[start:start + self.batch_size]]
+                tokens = tokenizer(
+                    batch,
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                hidden = model(**tokens).last_hidden_state
+                mask = tokens["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+                pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+                out.append(pooled.cpu().numpy().astype(np.float32))
+
+        if not out:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(out)
+
+
+@functools.lru_cache(maxsize=1024)
+def embed_query(model_name: str, query: str) -> np.ndarray:
+    """
+    Query embeddings are cached per process; repeated questions skip the model.
+    """
+    vec = Encoder(model_name).encode([query])[0]
+    vec.flags.writeable = False
+    return vec
+
+
+def _content_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b((text or "").encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# ---- Vector storage ----
+
+class VectorStore:
+    """
+    Document vectors in a memory-mapped file, stored as float16 or as int8
+    codes with a float32 scale per row. Each build writes a new directory and
+    atomically repoints CURRENT, so readers never see a partial file. The
+    previous generation is kept for readers that resolved CURRENT just before
+    the swap; older ones are removed. Builders serialize on locked().
+    """
+
+    def __init__(self, path: Path, meta: Dict[str, np.ndarray]):
+        self.path = path
+        self.dtype = str(meta["dtype"])
+        self.model_name = str(meta["model_name"])
+        self.hashes = meta["hashes"]
+        self.scales = meta["scales"]
+        n, dim = (int(x) for x in meta["shape"])
+        self.vectors = np.memmap(path / "vectors.bin", dtype=self.dtype, mode="r", shape=(n, dim))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.vectors.shape
+
+    @classmethod
+    def open(cls, directory: Path) -> "VectorStore | None":
+        try:
+            name = (directory / "CURRENT").read_text().strip()
+            path = directory / name
+            with np.load(path / "meta.npz") as meta:
+                return cls(path, dict(meta))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    @staticmethod
+    @contextlib.contextmanager
+    def locked(directory: Path):
+        """
+        Exclusive lock on `directory` across processes, held while a build
+        reads the current vectors, encodes the rest and swaps CURRENT.
+        """
+        import fcntl
+
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / "LOCK", "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    @classmethod
+    def write(
+        cls,
+        directory: Path,
+        vectors: np.ndarray,
+        hashes: np.ndarray,
+        *,
+        dtype: str,
+        model_name: str,
+    ) -> "VectorStore":
+        if dtype not in ("float16", "int8"):
+            raise DenseError(f"Unsupported DENSE_DTYPE: {dtype}")
+
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = (directory / "CURRENT").read_text().strip() if (directory / "CURRENT").exists() else None
+
+        name = uuid.uuid4().hex
+        path = directory / name
+        path.mkdir()
+
+        if dtype == "int8":
+            scales = (np.abs(vectors).max(axis=1) / 127.0).astype(np.float32)
+            safe = np.where(scales > 0, scales, 1.0)[:, None]
+            codes = np.clip(np.rint(vectors / safe), -127, 127).astype(np.int8)
+        else:
+            scales = np.ones(len(vectors), dtype=np.float32)
+            codes = vectors.astype(np.float16)
+
+        mm = np.memmap(path / "vectors.bin", dtype=codes.dtype, mode="w+", shape=codes.shape)
+        mm[:] = codes
+        mm.flush()
+        del mm
+
+        np.savez(
+            path / "meta.npz",
+            dtype=np.array(dtype),
+            model_name=np.array(model_name),
+            hashes=hashes.astype(np.uint64),
+            scales=scales,
+            shape=np.array(codes.shape),
+        )
+
+        tmp = directory / f"CURRENT.{name}"
+        tmp.write_text(name)
+        os.replace(tmp, directory / "CURRENT")
+
+        for old in directory.iterdir():
+            if old.is_dir() and old.name not in (name, previous):
+                shutil.rmtree(old, ignore_errors=True)
+
+        with np.load(path / "meta.npz") as meta:
+            return cls(path, dict(meta))
+
+    def dequantize(self, rows: np.ndarray | None = None) -> np.ndarray:
+        vecs = self.vectors if rows is None else self.vectors[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        return np.asarray(vecs, dtype=np.float32) * scales[:, None]
+
+    def dot(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        vecs = self.vectors if rows is None else self.vectors[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+        return (np.asarray(vecs, dtype=np.float32) @ query) * scales
+
+
+# ---- ANN: inverted file (IVF) over spherical k-means centroids ----
+
+class IVFIndex:
+    """
+    Rows are bucketed by their nearest centroid; a query scans only the
+    nprobe closest buckets. Lists are stored back to back in one row array.
+    """
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+        out = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), chunk):
+            out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+        return out
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int, *, iters: int = 10, seed: int = 0) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        nlist = max(1, min(nlist, n))
+
+        sample = vectors[rng.choice(n, size=min(n, nlist * 256), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(iters):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)
+
+        assign = cls._assign(vectors, centroids)
+        rows = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(centroids.astype(np.float32), offsets, rows)
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        lists = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+        rows.sort()
+        return rows
+
+
+class DenseScorer(Scorer):
+    """
+    Embedding similarity with a local encoder and an IVF index.
+
+    Document vectors are encoded in batches when the index is built and
+    reused across rebuilds for documents whose content did not change.
+    Small corpora are scanned exactly; IVF kicks in from ivf_min_docs.
+    """
+
+    name = "dense"
+
+    def __init__(
+        self,
+        encoder: Encoder,
+        directory: Path,
+        *,
+        dtype: str = "float16",
+        nlist: int = 0,
+        nprobe: int = 8,
+        ivf_min_docs: int = 4096,
+    ):
+        self.encoder = encoder
+        self.directory = Path(directory)
+        self.dtype = dtype
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ivf_min_docs = ivf_min_docs
+
+    def fit(self, corpus: Sequence[str], doc_ids: np.ndarray) -> None:
+        # documents are encoded after the same normalization as queries, and
+        # vectors are reused by the hash of the text actually encoded
+        corpus = [normalize_text(t) for t in corpus]
+        hashes = np.fromiter((_content_hash(t) for t in corpus), dtype=np.uint64, count=len(corpus))
+
+        # workers building at the same time take turns, and each one reuses
+        # the vectors the previous one wrote
+        with VectorStore.locked(self.directory):
+            vectors = self._vectors(corpus, hashes)
+
+        self.ivf = None
+        if len(corpus) >= self.ivf_min_docs:
+            nlist = self.nlist or int(np.sqrt(len(corpus)))
+            self.ivf = IVFIndex.build(vectors, nlist)
+
+    def _vectors(self, corpus: Sequence[str], hashes: np.ndarray) -> np.ndarray:
+        """
+        Writes the vector store for `corpus`, encoding only texts whose hash
+        is not in the current store, and returns the float32 vectors.
+        """
+        previous = VectorStore.open(self.directory)
+        known: Dict[int, int] = {}
+        if previous is not None and previous.model_name == self.encoder.model_name:
+            known = {int(h): row for row, h in enumerate(previous.hashes)}
+
+        reuse = [(row, known[int(h)]) for row, h in enumerate(hashes) if int(h) in known]
+        missing = [row for row, h in enumerate(hashes) if int(h) not in known]
+
+        encoded = self.encoder.encode([corpus[row] for row in missing])
+        dim = encoded.shape[1] if missing else previous.shape[1]
+
+        vectors = np.empty((len(corpus), dim), dtype=np.float32)
+        if reuse:
+            new_rows, old_rows = (np.array(x, dtype=np.int64) for x in zip(*reuse))
+            vectors[new_rows] = previous.dequantize(old_rows)
+        if missing:
+            vectors[np.array(missing, dtype=np.int64)] = encoded
+
+        self.store = VectorStore.write(
+            self.directory,
+            vectors,
+            hashes,
+            dtype=self.dtype,
+            model_name=self.encoder.model_name,
+        )
+        return vectors
+
+    def search(self, query: AnalyzedQuery, k: int, allowed=None) -> Tuple[np.ndarray, np.ndarray]:
+        # normalized text, as documents are encoded: equivalent spellings
+        # share one cached embedding
+        q = embed_query(self.encoder.model_name, query.text)
+
+        if self.ivf is None and allowed is None:
+            rows = np.arange(self.store.shape[0], dtype=np.int32)
+            scores = self.store.dot(q)
+        else:
+            if self.ivf is None:
+                rows = allowed.rows()
+            elif allowed is None:
+                rows = self.ivf.candidates(q, self.nprobe)
+            else:
+                rows = self._allowed_candidates(q, k, allowed)
+            scores = self.store.dot(q, rows)
+
+        return select_top_k(rows, scores.astype(np.float64), k)
+
+    def _allowed_candidates(self, q: np.ndarray, k: int, allowed) -> np.ndarray:
+        """
+        IVF candidates under a tag filter. A filter matching no more rows than
+        the probed lists hold on average is scanned exactly; otherwise nprobe
+        is doubled until the probed lists hold k allowed rows, so a selective
+        filter does not come back short.
+        """
+        nlist = len(self.ivf.centroids)
+        if allowed.count() <= self.store.shape[0] * self.nprobe / nlist:
+            return allowed.rows()
+
+        nprobe = self.nprobe
+        while True:
+            rows = self.ivf.candidates(q, nprobe)
+            rows = rows[allowed.contains(rows)]
+            if rows.size >= k or nprobe >= nlist:
+                return rows
+            nprobe *= 2
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def overlap_at_k(reference: Sequence[int], candidate: Sequence[int], k: int) -> float:
+    """
+    Share of the reference top-k that also appears in the candidate top-k.
+    Two empty rankings agree fully.
+    """
+    ref = list(reference)[:k]
+    if not ref:
+        return 1.0 if not list(candidate)[:k] else 0.0
+    return len(set(ref) & set(list(candidate)[:k])) / len(ref)
+
+
+def rank_correlation(reference: Sequence[int], candidate: Sequence[int]) -> Optional[float]:
+    """
+    Spearman correlation between the orders in which both rankings list the
+    documents they have in common (1.0 = same relative order, -1.0 =
+    reversed). None when fewer than two documents are shared.
+    """
+    position = {doc_id: i for i, doc_id in enumerate(candidate)}
+    common = [doc_id for doc_id in reference if doc_id in position]
+    m = len(common)
+    if m < 2:
+        return None
+
+    # ranks within the shared documents: 0..m-1 in reference order
+    candidate_ranks = np.argsort(np.argsort([position[doc_id] for doc_id in common]))
+    d = candidate_ranks - np.arange(m)
+    return float(1.0 - 6.0 * float(np.sum(d * d)) / (m * (m * m - 1)))
+
+
+def percentiles(values: List[float], qs: Sequence[float] = (50, 95, 99)) -> List[float]:
+    if not values:
+        return [0.0 for _ in qs]
+    return [float(v) for v in np.percentile(np.asarray(values, dtype=np.float64), qs)]
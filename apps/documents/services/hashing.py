@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import copy
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from apps.documents.services.analysis import AnalyzedQuery, Analyzer, ngrams, pretokenized
+from apps.documents.services.inverted_index import InvertedIndex, select_top_k
+from apps.documents.services.retrieval import Scorer
+
+
+class _LiveRows:
+    """
+    Row filter for one segment: drops deleted rows and, when given, rows
+    outside `allowed` (a tag_filter.Bitmap over global rows).
+    """
+
+    def __init__(self, deleted: np.ndarray, allowed, offset: int):
+        self.deleted = deleted
+        self.allowed = allowed
+        self.offset = offset
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64) + self.offset
+        keep = ~self.deleted[rows]
+        if self.allowed is not None:
+            keep &= self.allowed.contains(rows)
+        return keep
+
+
+class HashingTfidfScorer(Scorer):
+    """
+    TF-IDF without a fitted vocabulary.
+
+    Terms (unigrams and bigrams) are hashed into `n_features` columns, so
+    memory is bounded by n_features whatever the corpus vocabulary. Postings
+    hold L2-normalized term frequencies; IDF is computed at query time from
+    document-frequency counts kept next to the index, so it never goes stale:
+        score(q, d) = sum_t q_t * idf_t^2 * tf_dt / (|q * idf| * |tf_d|)
+    (cosine of TF-IDF vectors, except that documents are normalized on raw
+    term frequencies so adding one never touches the others).
+
+    updated() applies added/removed documents in O(changed documents): new
+    rows go to a small delta segment (indexed over the columns it uses)
+    and removed rows become tombstones.
+    The delta is merged into the main segment once it outgrows
+    `merge_ratio` of it, which re-indexes stored rows without re-tokenizing.
+
+    A fitted scorer is never mutated: updated() returns a new scorer sharing
+    the unchanged arrays, so searches in flight keep a consistent view.
+    """
+
+    name = "hashing"
+    supports_updates = True
+
+    def __init__(
+        self,
+        n_features: int = 2 ** 18,
+        prune: bool = True,
+        dtype: str = "float32",
+        merge_ratio: float = 0.1,
+        min_merge_rows: int = 1024,
+        analyzer: Analyzer | None = None,
+    ):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.analyzer = analyzer or Analyzer()
+        self.prune = prune
+        self.dtype = dtype
+        self.merge_ratio = merge_ratio
+        self.min_merge_rows = min_merge_rows
+        # stateless: nothing to fit, the same instance encodes documents and queries
+        self.vectorizer = HashingVectorizer(
+            analyzer=pretokenized,
+            n_features=n_features,
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32,
+        )
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.deleted.size)
+
+    def _term_frequencies(self, corpus: Sequence[str]):
+        """
+        L2-normalized term-frequency rows of `corpus` (one column at most once per row).
+        """
+        rows = self.vectorizer.transform(self.analyzer.document_terms(text, (1, 2)) for text in corpus).tocsr()
+        rows.sort_indices()
+        lengths = np.diff(rows.indptr)
+        norms = np.sqrt(np.add.reduceat(rows.data * rows.data, rows.indptr[:-1][lengths > 0]))
+        rows.data /= np.repeat(norms, lengths[lengths > 0]).astype(np.float32)
+        return rows
+
+    def fit(self, corpus: Sequence[str], doc_ids: np.ndarray) -> None:
+        rows = self._term_frequencies(corpus)
+        self.df = np.bincount(rows.indices, minlength=rows.shape[1]).astype(np.int32)
+        self.n_live = rows.shape[0]
+        self.deleted = np.zeros(rows.shape[0], dtype=bool)
+        self.main_rows, self.main = rows, InvertedIndex.from_matrix(rows, dtype=self.dtype)
+        self.delta_rows, self.delta, self.delta_cols = None, None, None
+
+    def updated(self, corpus: Sequence[str], removed_rows: np.ndarray) -> "HashingTfidfScorer":
+        """
+        New scorer with `removed_rows` tombstoned and `corpus` appended as
+        rows n_rows .. n_rows + len(corpus) - 1.
+        """
+        from scipy import sparse
+
+        new = copy.copy(self)
+        new.df = self.df.copy()
+        new.deleted = self.deleted.copy()
+
+        removed_rows = np.asarray(removed_rows, dtype=np.int64)
+        removed_rows = removed_rows[~new.deleted[removed_rows]]
+        for row in removed_rows:
+            new.df[new._stored_row(int(row)).indices] -= 1
+        new.deleted[removed_rows] = True
+        new.n_live -= removed_rows.size
+
+        if len(corpus):
+            rows = new._term_frequencies(corpus)
+            np.add.at(new.df, rows.indices, 1)
+            new.n_live += rows.shape[0]
+            new.deleted = np.concatenate([new.deleted, np.zeros(rows.shape[0], dtype=bool)])
+            new.delta_rows = rows if new.delta_rows is None else sparse.vstack([new.delta_rows, rows], format="csr")
+
+            if new.delta_rows.shape[0] > max(self.min_merge_rows, self.merge_ratio * new.main_rows.shape[0]):
+                new.main_rows = sparse.vstack([new.main_rows, new.delta_rows], format="csr")
+                new.main = InvertedIndex.from_matrix(new.main_rows, dtype=self.dtype)
+                new.delta_rows, new.delta, new.delta_cols = None, None, None
+            else:
+                new.delta, new.delta_cols = new._index_delta()
+
+        return new
+
+    def _index_delta(self):
+        """
+        Indexes the delta rows over the columns they use only, so the cost
+        is O(delta size) rather than O(n_features).
+        """
+        from scipy import sparse
+
+        rows = self.delta_rows
+        cols, local = np.unique(rows.indices, return_inverse=True)
+        matrix = sparse.csr_matrix((rows.data, local.ravel(), rows.indptr), shape=(rows.shape[0], cols.size))
+        return InvertedIndex.from_matrix(matrix, dtype=self.dtype), cols
+
+    def _stored_row(self, row: int):
+        n_main = self.main_rows.shape[0]
+        return self.main_rows[row] if row < n_main else self.delta_rows[row - n_main]
+
+    def search(self, query: AnalyzedQuery, k: int, allowed=None) -> Tuple[np.ndarray, np.ndarray]:
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+
+        counts = self.vectorizer.transform([ngrams(query.tokens, (1, 2))]).tocsr()
+        term_ids, tf = counts.indices, counts.data
+        df = self.df[term_ids]
+        known = df > 0
+        term_ids, tf, df = term_ids[known], tf[known], df[known]
+        if term_ids.size == 0 or self.n_live == 0:
+            return empty
+
+        # smooth idf, as in TfidfVectorizer
+        idf = np.log((1.0 + self.n_live) / (1.0 + df)) + 1.0
+        query_weights = (tf * idf * idf / np.linalg.norm(tf * idf)).astype(np.float32)
+
+        filtered = allowed is not None or self.n_live < self.n_rows
+        segments = [(self.main, term_ids, query_weights, 0)]
+        if self.delta is not None:
+            local = np.searchsorted(self.delta_cols, term_ids)
+            hit = local < self.delta_cols.size
+            hit[hit] = self.delta_cols[local[hit]] == term_ids[hit]
+            segments.append((self.delta, local[hit], query_weights[hit], self.main.n_docs))
+
+        parts = []
+        for segment, seg_terms, seg_weights, offset in segments:
+            rows, scores = segment.search(
+                seg_terms,
+                seg_weights,
+                k,
+                prune=self.prune,
+                allowed=_LiveRows(self.deleted, allowed, offset) if filtered else None,
+            )
+            parts.append((rows.astype(np.int32) + offset, scores))
+
+        if len(parts) == 1:
+            return parts[0]
+        return select_top_k(
+            np.concatenate([rows for rows, _ in parts]),
+            np.concatenate([scores for _, scores in parts]),
+            k,
+        )
+
+    def memory_usage(self) -> Dict[str, int]:
+        def csr_bytes(m):
+            return 0 if m is None else int(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes)
+
+        index = self.main.nbytes + (self.delta.nbytes if self.delta is not None else 0)
+        return {
+            "index": index,
+            "vocabulary": int(self.df.nbytes),
+            "rows": csr_bytes(self.main_rows) + csr_bytes(self.delta_rows) + int(self.deleted.nbytes),
+        }
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from django.conf import settings
+
+from apps.documents.services.analysis import AnalyzedQuery, normalize_text
+from apps.documents.services.retrieval import (
+    RetrievalResult,
+    RetrievalTimings,
+    elapsed_ms,
+    get_index,
+    hydrate_results,
+    resolve_allowed,
+)
+from apps.documents.services.pretrained import SharedPretrained
+
+logger = logging.getLogger(__name__)
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Tuple[int, float]]],
+    *,
+    k: int = 60,
+) -> List[Tuple[int, float]]:
+    """
+    Fuses ranked (doc_id, score) lists: score(d) = sum over lists of 1 / (k + rank).
+    Only ranks are used, so engines with different score scales mix safely.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+# ---- Cross-encoder reranker ----
+
+_reranker_models = SharedPretrained("AutoModelForSequenceClassification")
+
+
+class CrossEncoderReranker:
+    """
+    Local cross-encoder (query, passage) scorer on CPU.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 8, max_length: int = 512):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+
+    def load(self) -> None:
+        """
+        Loads the model now (once per process), so a caller can keep the
+        load out of a timed window.
+        """
+        _reranker_models.get(self.model_name)
+
+    def score(self, query: str, passages: Sequence[str], *, deadline: float) -> np.ndarray | None:
+        """
+        Returns relevance scores in (0, 1), or None if the deadline
+        (a time.perf_counter() value) passes before every batch is scored.
+        The deadline is checked between batches, so a small batch size
+        bounds how far a single forward pass can overrun it.
+        """
+        import torch
+
+        model, tokenizer = _reranker_models.get(self.model_name)
+
+        out: List[np.ndarray] = []
+        with torch.inference_mode():
+            for start in range(0, len(passages), self.batch_size):
+                if time.perf_counter() >= deadline:
+                    return None
+                batch = [p or "" for p in passages[start:start + self.batch_size]]
+                tokens = tokenizer(
+                    [query] * len(batch),
+                    batch,
+                    padding=True,
+                    truncation=True,
+                    max_length=self.max_length,
+                    return_tensors="pt",
+                )
+                logits = model(**tokens).logits
+                relevance = logits[:, 0] if logits.shape[1] == 1 else logits[:, -1]
+                out.append(torch.sigmoid(relevance).cpu().numpy().astype(np.float64))
+
+        if time.perf_counter() >= deadline:
+            return None
+        return np.concatenate(out) if out else np.empty(0, dtype=np.float64)
+
+
+def get_reranker() -> CrossEncoderReranker:
+    return CrossEncoderReranker(
+        str(getattr(settings, "RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")),
+        batch_size=int(getattr(settings, "RERANK_BATCH_SIZE", 8)),
+    )
+
+
+def hybrid_search(
+    query: AnalyzedQuery,
+    k: int,
+    version: str,
+    *,
+    tags: Sequence[str] | None = None,
+    tags_mode: str = "any",
+) -> Tuple[List[RetrievalResult], RetrievalTimings]:
+    """
+    Hybrid retrieval:
+    1. each engine in settings.HYBRID_ENGINES returns HYBRID_CANDIDATES hits
+    2. the lists are fused with reciprocal-rank fusion
+    3. optionally (HYBRID_RERANK) the top RERANK_TOP_N fused hits are
+       rescored by a cross-encoder within RERANK_BUDGET_MS; if the budget
+       runs out (or the reranker fails) the fused order is kept.
+
+    Returned scores are cross-encoder relevances when reranked, RRF otherwise.
+    """
+    started = time.perf_counter()
+
+    engines = [e.strip().lower() for e in getattr(settings, "HYBRID_ENGINES", ["bm25", "dense"]) if e.strip()]
+    n_candidates = max(k, int(getattr(settings, "HYBRID_CANDIDATES", 100)))
+
+    rankings = []
+    for engine in engines:
+        index = get_index(engine, version)
+        if index.doc_ids.size:
+            rankings.append(index.search(query, n_candidates, resolve_allowed(index, tags, tags_mode)))
+
+    fused = reciprocal_rank_fusion(rankings, k=int(getattr(settings, "HYBRID_RRF_K", 60)))
+
+    if not fused or not getattr(settings, "HYBRID_RERANK", False):
+        results = hydrate_results(fused[:k])
+        return results, RetrievalTimings(retrieval_ms=elapsed_ms(started))
+
+    # rerank at least k hits so every returned score is on the same scale
+    head = hydrate_results(fused[:max(k, int(getattr(settings, "RERANK_TOP_N", 20)))])
+    retrieval_ms = elapsed_ms(started)
+
+    try:
+        reranker = get_reranker()
+        # a first-use model load is not part of the rerank budget
+        reranker.load()
+    except Exception:
+        logger.exception("Cross-encoder load failed; keeping fused order")
+        reranker = None
+
+    rerank_started = time.perf_counter()
+    budget_s = float(getattr(settings, "RERANK_BUDGET_MS", 150)) / 1000.0
+    try:
+        # passages normalized like the query text, so both sides match
+        scores = None if reranker is None else reranker.score(
+            query.text,
+            [normalize_text(r.document.content) for r in head],
+            deadline=rerank_started + budget_s,
+        )
+    except Exception:
+        logger.exception("Cross-encoder rerank failed; keeping fused order")
+        scores = None
+    rerank_ms = elapsed_ms(rerank_started)
+
+    if scores is None:
+        return head[:k], RetrievalTimings(retrieval_ms=retrieval_ms, rerank_ms=rerank_ms)
+
+    order = np.argsort(-scores, kind="stable")[:k]
+    results = [RetrievalResult(document=head[i].document, score=float(scores[i])) for i in order]
+    return results, RetrievalTimings(retrieval_ms=retrieval_ms, rerank_ms=rerank_ms, reranked=True)
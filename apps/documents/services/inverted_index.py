@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+INDEX_DTYPES = ("float32", "uint8")
+
+
+@dataclass(frozen=True)
+class InvertedIndex:
+    """
+    Term -> posting list index stored as flat NumPy arrays (CSC layout).
+
+    Postings of term t are rows docs[indptr[t]:indptr[t + 1]] (sorted, unique)
+    with their precomputed per-document impact in the matching slice of weights.
+    max_weights[t] is the largest impact of term t, used as a MaxScore bound.
+
+    With dtype="uint8" impacts are quantized per term: weights holds codes in
+    0..255 and the impact is code * scales[t]. The largest posting of a term
+    maps to 255 exactly; max_weights is taken over the quantized impacts, so
+    it stays a valid upper bound when scales are given by the caller.
+    """
+
+    indptr: np.ndarray
+    docs: np.ndarray
+    weights: np.ndarray
+    max_weights: np.ndarray
+    n_docs: int
+    scales: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_matrix(cls, doc_term, dtype: str = "float32", scales: Optional[np.ndarray] = None) -> "InvertedIndex":
+        """
+        Builds the index from a (n_docs x n_terms) sparse matrix of impacts.
+        With dtype="uint8", `scales` (see uint8_scales()) overrides the
+        per-term scales derived from this matrix.
+        """
+        from scipy import sparse
+
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype: {dtype}")
+
+        csc = sparse.csc_matrix(doc_term, dtype=np.float32)
+        csc.sort_indices()
+
+        indptr_dtype = np.int32 if csc.nnz <= np.iinfo(np.int32).max else np.int64
+        indptr = csc.indptr.astype(indptr_dtype)
+        docs = csc.indices.astype(np.int32)
+        weights = csc.data.astype(np.float32)
+
+        max_weights = np.zeros(csc.shape[1], dtype=np.float32)
+        non_empty = np.diff(indptr) > 0
+        if weights.size:
+            max_weights[non_empty] = np.maximum.reduceat(weights, indptr[:-1][non_empty])
+
+        if dtype != "uint8":
+            scales = None
+        else:
+            if scales is None:
+                scales = uint8_scales(max_weights)
+            term_of_posting = np.repeat(np.arange(csc.shape[1]), np.diff(indptr))
+            weights = np.rint(weights / scales[term_of_posting]).clip(0, 255).astype(np.uint8)
+            if weights.size:
+                max_weights[non_empty] = np.maximum.reduceat(weights, indptr[:-1][non_empty]) * scales[non_empty]
+
+        return cls(
+            indptr=indptr,
+            docs=docs,
+            weights=weights,
+            max_weights=max_weights,
+            n_docs=int(csc.shape[0]),
+            scales=scales,
+        )
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.indptr, self.docs, self.weights, self.max_weights, self.scales)
+        return int(sum(a.nbytes for a in arrays if a is not None))
+
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[term_id], self.indptr[term_id + 1]
+        weights = self.weights[start:end]
+        if self.scales is not None:
+            weights = weights * self.scales[term_id]
+        return self.docs[start:end], weights
+
+    def search(
+        self,
+        term_ids: np.ndarray,
+        query_weights: np.ndarray,
+        k: int,
+        *,
+        prune: bool = True,
+        allowed=None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Term-at-a-time scoring with MaxScore-style early termination.
+
+        Only rows that appear in at least one query term's postings are scored.
+        Terms are visited by decreasing upper bound; once the current k-th best
+        score beats the sum of bounds of the remaining terms, no unseen row can
+        enter the top-k, so the remaining terms only update known candidates.
+
+        `allowed` (a tag_filter.Bitmap) drops ineligible rows from each posting
+        list before accumulation, so filtered rows never become candidates.
+
+        Returns (rows, scores) ordered by score desc, then row asc.
+        """
+        empty = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+        if k < 1 or len(term_ids) == 0:
+            return empty
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        query_weights = np.asarray(query_weights, dtype=np.float32)
+
+        bounds = self.max_weights[term_ids] * query_weights
+        order = np.argsort(-bounds, kind="stable")
+        term_ids, query_weights, bounds = term_ids[order], query_weights[order], bounds[order]
+        # remaining[i] = best score a row could still collect from terms i..end
+        remaining = np.concatenate([np.cumsum(bounds[::-1])[::-1], [0.0]])
+
+        cand = np.empty(0, dtype=np.int32)
+        cand_scores = np.empty(0, dtype=np.float64)
+        frozen = False
+
+        for pos, (term_id, qw) in enumerate(zip(term_ids, query_weights)):
+            docs, weights = self.postings(int(term_id))
+            if allowed is not None and docs.size:
+                keep = allowed.contains(docs)
+                docs, weights = docs[keep], weights[keep]
+            if docs.size == 0:
+                continue
+            contrib = weights * qw
+
+            if frozen:
+                idx = np.searchsorted(cand, docs)
+                hit = idx < cand.size
+                hit[hit] = cand[idx[hit]] == docs[hit]
+                cand_scores[idx[hit]] += contrib[hit]
+                continue
+
+            cand, inverse = np.unique(np.concatenate([cand, docs]), return_inverse=True)
+            cand_scores = np.bincount(
+                inverse,
+                weights=np.concatenate([cand_scores, contrib]),
+                minlength=cand.size,
+            )
+
+            if prune and cand.size >= k:
+                threshold = np.partition(cand_scores, cand.size - k)[cand.size - k]
+                if threshold > remaining[pos + 1]:
+                    frozen = True
+
+        return select_top_k(cand, cand_scores, k)
+
+
+def uint8_scales(max_weights: np.ndarray) -> np.ndarray:
+    """
+    Per-term uint8 quantization scales: the largest impact maps to 255.
+    """
+    return np.where(max_weights > 0, max_weights / 255.0, 1.0).astype(np.float32)
+
+
+def select_top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deterministic top-k: score desc, ties broken by row asc.
+    """
+    if rows.size > k:
+        threshold = np.partition(scores, rows.size - k)[rows.size - k]
+        keep = scores >= threshold
+        rows, scores = rows[keep], scores[keep]
+
+    order = np.lexsort((rows, -scores))[:k]
+    return rows[order], scores[order]
+
+
+class _ShardRows:
+    """
+    Adapts a global-row bitmap to the local rows of one shard.
+    """
+
+    def __init__(self, allowed, row_map: np.ndarray):
+        self.allowed = allowed
+        self.row_map = row_map
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        return self.allowed.contains(self.row_map[rows])
+
+
+class ShardedInvertedIndex:
+    """
+    Postings partitioned into shards by document id (doc_id % n_shards).
+
+    Impacts are computed on the whole corpus before partitioning, so IDF and
+    length statistics are global and shard scores are directly comparable.
+    uint8 scales are also taken from the whole corpus, so every shard
+    quantizes a term's impacts exactly as the unsharded index does.
+    search() scatters the query to every shard on `executor` (NumPy releases
+    the GIL in its sorting/reduction kernels) and merges the per-shard top-k
+    with a heap.
+    """
+
+    def __init__(self, shards, row_maps, n_docs: int, executor=None):
+        self.shards = shards
+        self.row_maps = row_maps
+        self.n_docs = n_docs
+        self.executor = executor
+
+    @classmethod
+    def from_matrix(
+        cls,
+        doc_term,
+        doc_ids: np.ndarray,
+        n_shards: int,
+        executor=None,
+        dtype: str = "float32",
+    ) -> "ShardedInvertedIndex":
+        from scipy import sparse
+
+        csr = sparse.csr_matrix(doc_term, dtype=np.float32)
+        shard_of_row = np.asarray(doc_ids, dtype=np.int64) % n_shards
+
+        scales = None
+        if dtype == "uint8":
+            max_weights = csr.max(axis=0).toarray().ravel() if csr.nnz else np.zeros(csr.shape[1])
+            scales = uint8_scales(max_weights.astype(np.float32))
+
+        shards, row_maps = [], []
+        for shard in range(n_shards):
+            rows = np.flatnonzero(shard_of_row == shard).astype(np.int32)
+            shards.append(InvertedIndex.from_matrix(csr[rows], dtype=dtype, scales=scales))
+            row_maps.append(rows)
+
+        return cls(shards, row_maps, n_docs=int(csr.shape[0]), executor=executor)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(s.nbytes for s in self.shards) + sum(r.nbytes for r in self.row_maps))
+
+    def search(
+        self,
+        term_ids: np.ndarray,
+        query_weights: np.ndarray,
+        k: int,
+        *,
+        prune: bool = True,
+        allowed=None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        def scatter(shard: int):
+            rows, scores = self.shards[shard].search(
+                term_ids,
+                query_weights,
+                k,
+                prune=prune,
+                allowed=None if allowed is None else _ShardRows(allowed, self.row_maps[shard]),
+            )
+            return self.row_maps[shard][rows], scores
+
+        if self.executor is None:
+            parts = [scatter(s) for s in range(len(self.shards))]
+        else:
+            parts = list(self.executor.map(scatter, range(len(self.shards))))
+
+        # row_maps are increasing, so each part is ordered by (score desc, row asc)
+        merged = heapq.merge(
+            *(zip(rows.tolist(), scores.tolist()) for rows, scores in parts),
+            key=lambda hit: (-hit[1], hit[0]),
+        )
+        top = list(itertools.islice(merged, k))
+        return (
+            np.fromiter((r for r, _ in top), dtype=np.int32, count=len(top)),
+            np.fromiter((s for _, s in top), dtype=np.float64, count=len(top)),
+        )
+
+
+def build_inverted_index(
+    doc_term,
+    doc_ids: np.ndarray,
+    n_shards: int = 1,
+    executor=None,
+    dtype: str = "float32",
+):
+    if n_shards > 1:
+        return ShardedInvertedIndex.from_matrix(doc_term, doc_ids, n_shards, executor, dtype=dtype)
+    return InvertedIndex.from_matrix(doc_term, dtype=dtype)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import threading
+from typing import Tuple
+
+
+class SharedPretrained:
+    """
+    A transformers model and its tokenizer, loaded on first use and shared
+    by every caller in the process. Asking for another model name replaces
+    the loaded one.
+    """
+
+    def __init__(self, model_class: str):
+        # name of a transformers Auto* class, resolved when the model is loaded
+        self.model_class = model_class
+        self._lock = threading.Lock()
+        self._loaded: Tuple[str, object, object] | None = None
+
+    def get(self, model_name: str) -> Tuple[object, object]:
+        """
+        (model, tokenizer) for `model_name`, the model in eval mode.
+        """
+        with self._lock:
+            if self._loaded is None or self._loaded[0] != model_name:
+                # imported lazily: pulls in torch only when a model is used
+                import transformers
+
+                tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+                model = getattr(transformers, self.model_class).from_pretrained(model_name)
+                model.eval()
+                self._loaded = (model_name, model, tokenizer)
+            return self._loaded[1], self._loaded[2]
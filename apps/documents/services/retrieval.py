@@ -1,100 +1,714 @@
 from __future__ import annotations
 
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import List, Tuple
+from datetime import timedelta
+from typing import Dict, List, Sequence, Tuple
 import hashlib
+import threading
+import time
 
-from django.core.cache import cache
-from django.db.models import Case, When
+import numpy as np
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Max, Min, When
+from django.utils import timezone
 
-from apps.documents.models import Document
+from apps.documents.models import Document, DocumentChange
+from apps.documents.services.analysis import AnalyzedQuery, Analyzer, analyze_query, get_analyzer, ngrams
+from apps.documents.services.inverted_index import INDEX_DTYPES, build_inverted_index
+from apps.documents.services.term_counts import TermCounts, count_documents, top_features
+from apps.documents.services.vocabulary import build_vocabulary
 
 _CACHE_TIMEOUT_SECONDS = 300
+_CHANGE_LOG_TIMEOUT_SECONDS = 24 * 3600
+_CHANGE_LOG_MAX_ENTRIES = 10000
+# entries older than the timeout are pruned once every N appends
+_CHANGE_LOG_PRUNE_EVERY = 100
+# share of tombstoned rows above which an updatable index is rebuilt instead
+_MAX_DELETED_RATIO = 0.25
+
+
+class RetrievalError(RuntimeError):
+    pass
+
+
+# engines that only see the query's tokens; others (dense, hybrid rerank) read its text
+_TOKEN_ENGINES = ("tfidf", "bm25", "hashing")
 
-def _cache_key(query: str, k: int) -> str:
-    q = query.strip().lower()
-    h = hashlib.sha256(q.encode("utf-8")).hexdigest()
-    return f"retrieve:tfidf:{h}:k={k}"
+
+def _cache_key(query: AnalyzedQuery, k: int, engine: str = "tfidf", version: str = "") -> str:
+    # equivalent queries (same tokens after analysis) share a cache entry
+    h = query.digest if engine in _TOKEN_ENGINES else query.text_digest
+    return f"retrieve:{engine}:{version}:{h}:k={k}"
 
 @dataclass(frozen=True)
 class RetrievalResult:
     document: Document
     score: float
 
-def retrieve_top_k(query: str, k: int = 3) -> List[RetrievalResult]:
+
+@dataclass(frozen=True)
+class RetrievalTimings:
+    retrieval_ms: float = 0.0
+    rerank_ms: float = 0.0
+    reranked: bool = False
+    cached: bool = False
+
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+# ---- Scorers ----
+
+class Scorer:
     """
-    Returns top-k documents most relevant to the query based on cosine similarity of TF-IDF vectors.
+    Ranking engine over an in-memory corpus.
 
-    Cache behavior:
-    - Cache key: hash(query) + k
-    - Cache value: List[(doc_id, score)]
-    - TTL: 5 minutes
+    fit() receives the corpus and document ids in row order; search() receives
+    an AnalyzedQuery and returns (rows, scores) ordered by score desc. Rows are positions in the fitted corpus; when
+    `allowed` (a tag_filter.Bitmap) is given, only its rows may be scored.
     """
-    query = (query or "").strip()
-    if not query:
-        return []
 
-    k = int(k or 3)
-    if k < 1:
-        return []
+    name: str = "base"
+    # scorers that can apply document changes without a full fit implement updated()
+    supports_updates: bool = False
+    # scorers fitted from term counts implement fit_counts() (which may reuse
+    # the count matrix in place), so builds can stream documents and
+    # tokenize/count them in worker processes
+    supports_counts: bool = False
+    ngram_range: Tuple[int, int] = (1, 1)
 
-    # ---- Cache lookup ----
-    key = _cache_key(query, k)
-    cached: List[Tuple[int, float]] | None = cache.get(key)
+    def fit(self, corpus: Sequence[str], doc_ids: np.ndarray) -> None:
+        raise NotImplementedError
 
-    if cached:
-        # Rehydrate documents while preserving order
-        doc_ids = [doc_id for doc_id, _ in cached]
+    def fit_counts(self, counts: TermCounts) -> None:
+        raise NotImplementedError
 
-        preserved_order = Case(
-            *[When(id=doc_id, then=pos) for pos, doc_id in enumerate(doc_ids)]
+    def search(self, query: AnalyzedQuery, k: int, allowed=None) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def updated(self, corpus: Sequence[str], removed_rows: np.ndarray) -> "Scorer":
+        raise NotImplementedError
+
+    def memory_usage(self) -> Dict[str, int]:
+        """
+        Bytes held in memory by the fitted scorer, per component.
+        """
+        return {}
+
+
+def _query_terms(vocabulary, terms: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (term ids, term frequencies) of the in-vocabulary terms of a query.
+    """
+    tf = Counter(terms)
+    term_ids = vocabulary.lookup(list(tf))
+    counts = np.fromiter(tf.values(), dtype=np.float32, count=len(tf))
+    known = term_ids >= 0
+    return term_ids[known], counts[known]
+
+
+class TfidfScorer(Scorer):
+    """
+    Cosine similarity of TF-IDF vectors.
+
+    Document vectors are L2-normalized, so the cosine is a plain sum of
+    query weight * document weight over shared terms. They are stored as an
+    inverted index, and a query only scores documents containing one of its
+    terms: cost is O(sum of posting lengths) instead of O(corpus).
+    """
+
+    name = "tfidf"
+    supports_counts = True
+    ngram_range = (1, 2)
+    max_features = 5000
+
+    def __init__(
+        self,
+        prune: bool = True,
+        shards: int = 1,
+        dtype: str = "float32",
+        compact_vocab: bool = False,
+        analyzer: Analyzer | None = None,
+    ):
+        self.analyzer = analyzer or Analyzer()
+        self.prune = prune
+        self.shards = shards
+        self.dtype = dtype
+        self.compact_vocab = compact_vocab
+
+    def fit(self, corpus: Sequence[str], doc_ids: np.ndarray) -> None:
+        self.fit_counts(count_documents(zip(doc_ids, corpus), self.analyzer, self.ngram_range))
+
+    def fit_counts(self, counts: TermCounts) -> None:
+        from sklearn.feature_extraction.text import TfidfTransformer
+
+        if not counts.vocabulary:
+            raise ValueError("empty vocabulary; perhaps the documents only contain stop words")
+
+        # same weights as TfidfVectorizer(max_features=5000, dtype=float32);
+        # only the vocabulary and idf are kept, terms cut by max_features are dropped
+        matrix, vocabulary = top_features(counts.counts.astype(np.float32), counts.vocabulary, self.max_features)
+        transformer = TfidfTransformer()
+        matrix = transformer.fit_transform(matrix)
+        self.idf = transformer.idf_.astype(np.float32)
+        self.vocabulary = build_vocabulary(vocabulary, compact=self.compact_vocab)
+        self.index = build_inverted_index(
+            matrix,
+            counts.doc_ids,
+            self.shards,
+            get_shard_executor() if self.shards > 1 else None,
+            dtype=self.dtype,
         )
 
-        docs = list(
-            Document.objects
-            .filter(id__in=doc_ids)
-            .only("id", "title", "content")
-            .order_by(preserved_order)
+    def search(self, query: AnalyzedQuery, k: int, allowed=None) -> Tuple[np.ndarray, np.ndarray]:
+        # same weighting as TfidfVectorizer.transform: tf * idf, L2-normalized
+        term_ids, tf = _query_terms(self.vocabulary, ngrams(query.tokens, (1, 2)))
+        weights = tf * self.idf[term_ids]
+        norm = float(np.linalg.norm(weights))
+        if norm == 0.0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        return self.index.search(term_ids, weights / norm, k, prune=self.prune, allowed=allowed)
+
+    def memory_usage(self) -> Dict[str, int]:
+        return {"index": self.index.nbytes, "vocabulary": self.vocabulary.nbytes}
+
+
+class BM25Scorer(Scorer):
+    """
+    Okapi BM25 over an inverted index with the full unigram vocabulary.
+
+    Per-posting impacts (idf * saturated tf with length normalization) are
+    precomputed at fit time, so a query is a sum over its terms' postings
+    and only touches documents sharing at least one term with it.
+    """
+
+    name = "bm25"
+    supports_counts = True
+
+    def __init__(
+        self,
+        k1: float = 1.5,
+        b: float = 0.75,
+        prune: bool = True,
+        shards: int = 1,
+        dtype: str = "float32",
+        compact_vocab: bool = False,
+        analyzer: Analyzer | None = None,
+    ):
+        self.analyzer = analyzer or Analyzer()
+        self.k1 = k1
+        self.b = b
+        self.prune = prune
+        self.shards = shards
+        self.dtype = dtype
+        self.compact_vocab = compact_vocab
+
+    def fit(self, corpus: Sequence[str], doc_ids: np.ndarray) -> None:
+        self.fit_counts(count_documents(zip(doc_ids, corpus), self.analyzer, self.ngram_range))
+
+    def fit_counts(self, counts: TermCounts) -> None:
+        if not counts.vocabulary:
+            # empty vocabulary (e.g. only stop characters)
+            self.index = None
+            return
+        doc_ids = counts.doc_ids
+        self.vocabulary = build_vocabulary(counts.vocabulary, compact=self.compact_vocab)
+        counts = counts.counts
+
+        n_docs = counts.shape[0]
+        tf = counts.data.astype(np.float32)
+        doc_len = np.asarray(counts.sum(axis=1), dtype=np.float32).ravel()
+        avg_len = float(doc_len.mean()) or 1.0
+
+        df = np.bincount(counts.indices, minlength=counts.shape[1]).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5))
+
+        row_len = np.repeat(doc_len, np.diff(counts.indptr))
+        norm = self.k1 * (1.0 - self.b + self.b * row_len / avg_len)
+        counts.data = (idf[counts.indices] * tf * (self.k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        self.index = build_inverted_index(
+            counts,
+            doc_ids,
+            self.shards,
+            get_shard_executor() if self.shards > 1 else None,
+            dtype=self.dtype,
+        )
+
+    def search(self, query: AnalyzedQuery, k: int, allowed=None) -> Tuple[np.ndarray, np.ndarray]:
+        if self.index is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+
+        term_ids, query_weights = _query_terms(self.vocabulary, query.tokens)
+        return self.index.search(term_ids, query_weights, k, prune=self.prune, allowed=allowed)
+
+    def memory_usage(self) -> Dict[str, int]:
+        if self.index is None:
+            return {}
+        return {"index": self.index.nbytes, "vocabulary": self.vocabulary.nbytes}
+
+
+def get_scorer(engine: str) -> Scorer:
+    prune = bool(getattr(settings, "RETRIEVAL_EARLY_EXIT", True))
+    shards = max(1, int(getattr(settings, "RETRIEVAL_SHARDS", 1)))
+    compact_vocab = bool(getattr(settings, "RETRIEVAL_COMPACT_VOCAB", False))
+    dtype = str(getattr(settings, "RETRIEVAL_INDEX_DTYPE", "float32") or "float32").lower()
+
+    if engine in ("tfidf", "bm25", "hashing") and dtype not in INDEX_DTYPES:
+        raise RetrievalError(f"Unsupported RETRIEVAL_INDEX_DTYPE: {dtype}")
+
+    analyzer = get_analyzer()
+
+    if engine == "tfidf":
+        return TfidfScorer(prune=prune, shards=shards, dtype=dtype, compact_vocab=compact_vocab, analyzer=analyzer)
+
+    if engine == "bm25":
+        return BM25Scorer(
+            k1=float(getattr(settings, "BM25_K1", 1.5)),
+            b=float(getattr(settings, "BM25_B", 0.75)),
+            prune=prune,
+            shards=shards,
+            dtype=dtype,
+            compact_vocab=compact_vocab,
+            analyzer=analyzer,
+        )
+
+    if engine == "hashing":
+        from apps.documents.services.hashing import HashingTfidfScorer
+
+        return HashingTfidfScorer(
+            n_features=int(getattr(settings, "HASHING_N_FEATURES", 2 ** 18)),
+            prune=prune,
+            dtype=dtype,
+            analyzer=analyzer,
+        )
+
+    if engine == "dense":
+        # imported lazily: pulls in the encoder stack only when selected
+        from apps.documents.services.dense import DenseScorer, Encoder
+
+        return DenseScorer(
+            Encoder(
+                str(getattr(settings, "DENSE_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")),
+                batch_size=int(getattr(settings, "DENSE_BATCH_SIZE", 32)),
+            ),
+            getattr(settings, "DENSE_INDEX_DIR", "var/dense"),
+            dtype=str(getattr(settings, "DENSE_DTYPE", "float16")),
+            nlist=int(getattr(settings, "DENSE_IVF_NLIST", 0)),
+            nprobe=int(getattr(settings, "DENSE_IVF_NPROBE", 8)),
         )
 
-        doc_map = {d.id: d for d in docs}
-        return [
-            RetrievalResult(document=doc_map[doc_id], score=score)
-            for doc_id, score in cached
-            if doc_id in doc_map
-        ]
+    raise RetrievalError(f"Unsupported RETRIEVAL_ENGINE: {engine}")
+
+
+def get_engine_name() -> str:
+    return str(getattr(settings, "RETRIEVAL_ENGINE", "tfidf") or "tfidf").lower()
+
+
+# ---- Corpus index (built once per process, rebuilt when documents change) ----
+
+@dataclass(frozen=True)
+class BuildStats:
+    """
+    Sizes and wall-clock phases of a full index build. count_ms covers
+    reading the documents and, for count-based scorers, tokenizing and
+    counting them; fit_ms the scorer fit that follows.
+    """
 
-    # ---- Cache miss: compute TF-IDF ----
-    docs = list(Document.objects.all().only("id", "title", "content"))
-    if not docs:
+    documents: int
+    terms: int = 0
+    nonzeros: int = 0
+    workers: int = 1
+    chunks: int = 0
+    count_ms: float = 0.0
+    fit_ms: float = 0.0
+    total_ms: float = 0.0
+
+
+@dataclass(frozen=True)
+class CorpusIndex:
+    """
+    A fitted scorer and the document id of each of its rows.
+    Rows of documents removed by an in-place update have doc_id -1.
+    """
+
+    engine: str
+    version: str
+    doc_ids: np.ndarray
+    scorer: Scorer
+    change_seq: int = 0
+    # set by full builds, None for in-place refreshes
+    build_stats: BuildStats | None = None
+    # time.monotonic() of the full build the index derives from
+    built_at: float = 0.0
+
+    def search(self, query: AnalyzedQuery | str, k: int, allowed=None) -> List[Tuple[int, float]]:
+        rows, scores = self.scorer.search(analyze_query(query), k, allowed)
+        return [(int(self.doc_ids[r]), float(s)) for r, s in zip(rows, scores)]
+
+
+_index_lock = threading.Lock()
+_indexes: Dict[str, CorpusIndex] = {}
+
+_shard_executor_lock = threading.Lock()
+_shard_executor: ThreadPoolExecutor | None = None
+
+
+def get_shard_executor() -> ThreadPoolExecutor:
+    """
+    Thread pool used to score index shards in parallel (shared by all indexes).
+    """
+    global _shard_executor
+
+    with _shard_executor_lock:
+        if _shard_executor is None:
+            workers = int(getattr(settings, "RETRIEVAL_SHARD_WORKERS", 0)) or int(getattr(settings, "RETRIEVAL_SHARDS", 1))
+            _shard_executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="retrieval-shard")
+        return _shard_executor
+
+
+_version_lock = threading.Lock()
+_version: Tuple[float, str] | None = None  # (monotonic time read, version)
+
+
+def _read_index_version() -> str:
+    last_doc = Document.objects.aggregate(last=Max("id"))["last"] or 0
+    return f"{get_change_seq()}.{last_doc}"
+
+
+def get_index_version() -> str:
+    """
+    Version of the document set, read from the database: the last change
+    log sequence (saves and deletes from any process) and the highest
+    document id (also moved by bulk_create, which sends no signals).
+
+    It is re-read at most every RETRIEVAL_VERSION_CHECK_SECONDS, so changes
+    made by other processes reach this one within that delay.
+    """
+    global _version
+
+    interval = float(getattr(settings, "RETRIEVAL_VERSION_CHECK_SECONDS", 5))
+    with _version_lock:
+        now = time.monotonic()
+        if _version is None or now - _version[0] >= interval:
+            _version = (now, _read_index_version())
+        return _version[1]
+
+
+def invalidate_index() -> None:
+    """
+    Makes this process re-read the index version on its next query.
+    """
+    global _version
+
+    with _version_lock:
+        _version = None
+
+
+def get_change_seq() -> int:
+    return DocumentChange.objects.aggregate(seq=Max("id"))["seq"] or 0
+
+
+def record_document_change(doc_id: int) -> None:
+    """
+    Appends a document id to the change log and invalidates the index.
+
+    The log is a database table, so it is shared by every process and
+    survives restarts and cache eviction. Indexes whose scorer supports
+    updates replay the entries after the sequence number they were built at
+    instead of refitting the corpus.
+    """
+    seq = DocumentChange.objects.create(document_id=int(doc_id)).pk
+    if seq % _CHANGE_LOG_PRUNE_EVERY == 0:
+        cutoff = timezone.now() - timedelta(seconds=_CHANGE_LOG_TIMEOUT_SECONDS)
+        DocumentChange.objects.filter(created_at__lt=cutoff).delete()
+    invalidate_index()
+
+
+def get_changed_documents(since: int, until: int) -> List[int] | None:
+    """
+    Ids of documents changed in (since, until], or None if part of the log
+    has been pruned and a full rebuild is required.
+    """
+    if until <= since:
+        return []
+    if until - since > _CHANGE_LOG_MAX_ENTRIES:
+        return None
+
+    # entries are only ever pruned from the start of the log
+    oldest = DocumentChange.objects.aggregate(seq=Min("id"))["seq"]
+    if oldest is None or oldest > since + 1:
+        return None
+    found = DocumentChange.objects.filter(id__gt=since, id__lte=until).values_list("document_id", flat=True)
+    return sorted(set(found))
+
+
+def build_index(
+    engine: str,
+    version: str,
+    *,
+    workers: int | None = None,
+    chunk_size: int | None = None,
+    progress=None,
+) -> CorpusIndex:
+    """
+    Fits a scorer on every document.
+
+    Count-based scorers (tfidf, bm25) stream the documents from the database
+    in chunks of RETRIEVAL_BUILD_CHUNK_SIZE and tokenize/count them in
+    RETRIEVAL_BUILD_WORKERS processes (see term_counts.count_documents);
+    the other engines read the whole corpus first. `progress(documents_done,
+    elapsed_ms)` is called after each chunk.
+    """
+    if workers is None:
+        workers = int(getattr(settings, "RETRIEVAL_BUILD_WORKERS", 1))
+    if chunk_size is None:
+        chunk_size = int(getattr(settings, "RETRIEVAL_BUILD_CHUNK_SIZE", 2000))
+    workers, chunk_size = max(1, workers), max(1, chunk_size)
+
+    started = time.perf_counter()
+    # read before the documents: later changes are replayed again, never missed
+    change_seq = get_change_seq()
+    documents = Document.objects.all().values_list("id", "content")
+    scorer = get_scorer(engine)
+
+    if scorer.supports_counts:
+        counts = count_documents(
+            documents.iterator(chunk_size=chunk_size),
+            scorer.analyzer,
+            scorer.ngram_range,
+            workers=workers,
+            chunk_size=chunk_size,
+            progress=progress,
+        )
+        doc_ids = counts.doc_ids
+        stats = dict(
+            terms=len(counts.vocabulary),
+            nonzeros=int(counts.counts.nnz),
+            workers=counts.workers,
+            chunks=counts.chunks,
+        )
+        fit_started = time.perf_counter()
+        if doc_ids.size:
+            scorer.fit_counts(counts)
+        del counts
+    else:
+        rows = list(documents)
+        doc_ids = np.fromiter((doc_id for doc_id, _ in rows), dtype=np.int64, count=len(rows))
+        if progress is not None:
+            progress(len(rows), (time.perf_counter() - started) * 1000)
+        stats = dict(workers=1, chunks=1 if rows else 0)
+        fit_started = time.perf_counter()
+        if rows:
+            scorer.fit([(content or "") for _, content in rows], doc_ids)
+
+    finished = time.perf_counter()
+    return CorpusIndex(
+        engine=engine,
+        version=version,
+        doc_ids=doc_ids,
+        scorer=scorer,
+        change_seq=change_seq,
+        built_at=time.monotonic(),
+        build_stats=BuildStats(
+            documents=int(doc_ids.size),
+            count_ms=(fit_started - started) * 1000,
+            fit_ms=(finished - fit_started) * 1000,
+            total_ms=(finished - started) * 1000,
+            **stats,
+        ),
+    )
+
+
+def refresh_index(index: CorpusIndex, version: str) -> CorpusIndex | None:
+    """
+    Applies the documents changed since `index` was built to its scorer
+    (only re-reading and re-analyzing those documents). Returns None when
+    the scorer cannot be updated in place and a full build is needed.
+    """
+    if not index.scorer.supports_updates or not index.doc_ids.size:
+        return None
+
+    change_seq = get_change_seq()
+    changed = get_changed_documents(index.change_seq, change_seq)
+    if changed is None:
+        return None
+
+    removed_rows = np.flatnonzero(np.isin(index.doc_ids, changed))
+    deleted = int(np.count_nonzero(index.doc_ids < 0)) + removed_rows.size
+    if deleted > _MAX_DELETED_RATIO * index.doc_ids.size:
+        return None
+
+    rows = list(Document.objects.filter(id__in=changed).values_list("id", "content"))
+    new_ids = np.fromiter((doc_id for doc_id, _ in rows), dtype=np.int64, count=len(rows))
+
+    doc_ids = index.doc_ids.copy()
+    doc_ids[removed_rows] = -1
+    # documents added without a log entry (bulk_create) need a full build
+    last_doc = Document.objects.aggregate(last=Max("id"))["last"] or 0
+    if max(int(doc_ids.max(initial=0)), int(new_ids.max(initial=0))) != last_doc:
+        return None
+
+    scorer = index.scorer.updated([(content or "") for _, content in rows], removed_rows)
+
+    return CorpusIndex(
+        engine=index.engine,
+        version=version,
+        doc_ids=np.concatenate([doc_ids, new_ids]),
+        scorer=scorer,
+        change_seq=change_seq,
+        built_at=index.built_at,
+    )
+
+
+def get_index(engine: str | None = None, version: str | None = None) -> CorpusIndex:
+    engine = engine or get_engine_name()
+    version = version or get_index_version()
+
+    # bounds how long changes that bypass the change log and the version
+    # (QuerySet.update, raw SQL) stay invisible
+    max_age = float(getattr(settings, "RETRIEVAL_INDEX_MAX_AGE_SECONDS", 300))
+
+    with _index_lock:
+        index = _indexes.get(engine)
+        if index is not None and max_age > 0 and time.monotonic() - index.built_at > max_age:
+            index = None
+        if index is None or index.version != version:
+            refreshed = refresh_index(index, version) if index is not None else None
+            index = _indexes[engine] = refreshed or build_index(engine, version)
+        return index
+
+
+def hydrate_results(hits: List[Tuple[int, float]]) -> List[RetrievalResult]:
+    # Rehydrate documents while preserving order
+    doc_ids = [doc_id for doc_id, _ in hits]
+    if not doc_ids:
         return []
 
-    corpus = [(d.content or "") for d in docs]
+    preserved_order = Case(
+        *[When(id=doc_id, then=pos) for pos, doc_id in enumerate(doc_ids)]
+    )
 
-    vectorizer = TfidfVectorizer(
-        stop_words=None,
-        max_features=5000,
-        ngram_range=(1, 2),
+    docs = list(
+        Document.objects
+        .filter(id__in=doc_ids)
+        .only("id", "title", "content")
+        .order_by(preserved_order)
     )
 
-    doc_matrix = vectorizer.fit_transform(corpus)
-    query_vec = vectorizer.transform([query])
+    doc_map = {d.id: d for d in docs}
+    return [
+        RetrievalResult(document=doc_map[doc_id], score=score)
+        for doc_id, score in hits
+        if doc_id in doc_map
+    ]
+
+
+def resolve_allowed(index: CorpusIndex, tags: Sequence[str] | None, tags_mode: str):
+    """
+    Returns the Bitmap of rows eligible under a tag filter, or None if unfiltered.
+    """
+    if not tags:
+        return None
+
+    from apps.documents.services.tag_filter import get_tag_bitmaps
+
+    return get_tag_bitmaps(index).select(tags, tags_mode)
+
+
+def retrieve_top_k(
+    query: str | AnalyzedQuery,
+    k: int = 3,
+    engine: str | None = None,
+    *,
+    tags: Sequence[str] | None = None,
+    tags_mode: str = "any",
+) -> List[RetrievalResult]:
+    """
+    Returns top-k documents most relevant to the query, ranked by `engine`
+    or, by default, settings.RETRIEVAL_ENGINE ("tfidf", "bm25", "hashing",
+    "dense" or "hybrid").
+
+    `tags` restricts results to documents carrying any (tags_mode="any") or
+    all (tags_mode="all") of the given tag names; the filter is applied
+    while scoring, through precomputed per-tag bitmaps.
+
+    The fitted index is kept in memory and rebuilt only when documents change.
 
-    scores = cosine_similarity(query_vec, doc_matrix).flatten()
+    The query is analyzed once (apps.documents.services.analysis, the same
+    pipeline used for indexing) and its tokens drive both scoring and the
+    cache key, so e.g. "Django ORM?" and "django  orm" share a cache entry.
+
+    Cache behavior:
+    - Cache key: engine + index version + hash(query tokens) + k (+ tag filter)
+    - Cache value: List[(doc_id, score)]
+    - TTL: 5 minutes
+    """
+    results, _ = retrieve_top_k_timed(query, k, engine, tags=tags, tags_mode=tags_mode)
+    return results
 
-    ranked = sorted(
-        ((docs[i], float(scores[i])) for i in range(len(docs))),
-        key=lambda x: x[1],
-        reverse=True,
-    )[:k]
 
-    results = [RetrievalResult(document=d, score=s) for d, s in ranked]
+def retrieve_top_k_timed(
+    query: str | AnalyzedQuery,
+    k: int = 3,
+    engine: str | None = None,
+    *,
+    tags: Sequence[str] | None = None,
+    tags_mode: str = "any",
+) -> Tuple[List[RetrievalResult], RetrievalTimings]:
+    """
+    Same as retrieve_top_k(), also reporting retrieval and rerank time.
+    """
+    started = time.perf_counter()
+
+    query = analyze_query(query)
+    if not query.text:
+        return [], RetrievalTimings()
+
+    k = int(k or 3)
+    if k < 1:
+        return [], RetrievalTimings()
+
+    engine = (engine or get_engine_name()).lower()
+    if engine in _TOKEN_ENGINES and not query.tokens:
+        return [], RetrievalTimings(retrieval_ms=elapsed_ms(started))
+    version = get_index_version()
+    cache_version = version
+
+    tags = sorted(set(tags or []))
+    if tags:
+        from apps.documents.services.tag_filter import get_tags_version
+
+        scope = hashlib.sha256("\x1f".join([tags_mode, *tags]).encode("utf-8")).hexdigest()[:16]
+        cache_version = f"{version}:{get_tags_version()}:{scope}"
+
+    # ---- Cache lookup ----
+    key = _cache_key(query, k, engine, cache_version)
+    cached: List[Tuple[int, float]] | None = cache.get(key)
+
+    if cached:
+        results = hydrate_results(cached)
+        return results, RetrievalTimings(retrieval_ms=elapsed_ms(started), cached=True)
+
+    # ---- Cache miss: score against the in-memory index(es) ----
+    if engine == "hybrid":
+        from apps.documents.services.hybrid import hybrid_search
+
+        results, timings = hybrid_search(query, k, version, tags=tags, tags_mode=tags_mode)
+    else:
+        index = get_index(engine, version)
+        results = []
+        if index.doc_ids.size:
+            results = hydrate_results(index.search(query, k, resolve_allowed(index, tags, tags_mode)))
+        timings = RetrievalTimings(retrieval_ms=elapsed_ms(started))
 
     # ---- Save cache (primitive only) ----
     cache_payload = [(r.document.id, float(r.score)) for r in results]
     cache.set(key, cache_payload, timeout=_CACHE_TIMEOUT_SECONDS)
 
-    return results
+    return results, timings
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from apps.documents.models import Document, Tag
+
+TAGS_ANY = "any"
+TAGS_ALL = "all"
+
+
+class Bitmap:
+    """
+    Packed bitset over index rows (1 bit per document).
+    """
+
+    __slots__ = ("bits", "size")
+
+    def __init__(self, bits: np.ndarray, size: int):
+        self.bits = bits
+        self.size = size
+
+    @classmethod
+    def empty(cls, size: int) -> "Bitmap":
+        return cls(np.zeros((size + 7) // 8, dtype=np.uint8), size)
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray, size: int) -> "Bitmap":
+        mask = np.zeros(size, dtype=bool)
+        mask[rows] = True
+        return cls(np.packbits(mask), size)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits & other.bits, self.size)
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap(self.bits | other.bits, self.size)
+
+    def contains(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows, dtype=np.int64)
+        return ((self.bits[rows >> 3] >> (7 - (rows & 7))) & 1).astype(bool)
+
+    def rows(self) -> np.ndarray:
+        return np.flatnonzero(np.unpackbits(self.bits, count=self.size)).astype(np.int32)
+
+    def count(self) -> int:
+        return int(np.unpackbits(self.bits, count=self.size).sum())
+
+
+@dataclass(frozen=True)
+class TagBitmaps:
+    """
+    One bitmap per tag name, aligned with the rows of a CorpusIndex.
+    """
+
+    index_version: str
+    index_built_at: float
+    tags_version: str
+    size: int
+    by_name: Dict[str, Bitmap]
+
+    def select(self, tags: Sequence[str], mode: str = TAGS_ANY) -> Bitmap:
+        maps = [self.by_name.get(name) for name in dict.fromkeys(tags)]
+
+        if mode == TAGS_ALL:
+            if any(m is None for m in maps):
+                return Bitmap.empty(self.size)
+            out = maps[0]
+            for m in maps[1:]:
+                out = out & m
+            return out
+
+        out = Bitmap.empty(self.size)
+        for m in maps:
+            if m is not None:
+                out = out | m
+        return out
+
+
+_version_lock = threading.Lock()
+_version: Tuple[float, str] | None = None  # (monotonic time read, version)
+
+
+def _read_tags_version() -> str:
+    links = Document.tags.through.objects.aggregate(
+        n=Count("id"), last=Max("id"), docs=Sum("document_id"), tags=Sum("tag_id")
+    )
+    names = zlib.crc32(
+        "\x1f".join(f"{pk}:{name}" for pk, name in Tag.objects.order_by("id").values_list("id", "name")).encode("utf-8")
+    )
+    return f"{links['n']}.{links['last'] or 0}.{links['docs'] or 0}.{links['tags'] or 0}.{names:08x}"
+
+
+def get_tags_version() -> str:
+    """
+    Version of the tag assignments, read from the database: a summary of the
+    document-tag through table and a checksum of the tag names. Unlike the
+    signals, it also sees links written by bulk operations or raw SQL.
+
+    It is re-read at most every RETRIEVAL_VERSION_CHECK_SECONDS, like the
+    document set version.
+    """
+    global _version
+
+    interval = float(getattr(settings, "RETRIEVAL_VERSION_CHECK_SECONDS", 5))
+    with _version_lock:
+        now = time.monotonic()
+        if _version is None or now - _version[0] >= interval:
+            _version = (now, _read_tags_version())
+        return _version[1]
+
+
+def invalidate_tags() -> None:
+    """
+    Makes this process re-read the tags version on its next query.
+    """
+    global _version
+
+    with _version_lock:
+        _version = None
+
+
+def build_tag_bitmaps(doc_ids: np.ndarray, index_version: str, tags_version: str, index_built_at: float = 0.0) -> TagBitmaps:
+    size = int(doc_ids.size)
+    names = dict(Tag.objects.values_list("id", "name"))
+
+    links = np.array(
+        list(Document.tags.through.objects.values_list("tag_id", "document_id")),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+
+    # map document ids to index rows
+    order = np.argsort(doc_ids, kind="stable")
+    sorted_ids = doc_ids[order]
+    pos = np.searchsorted(sorted_ids, links[:, 1])
+    known = pos < size
+    known[known] = sorted_ids[pos[known]] == links[known, 1]
+    tag_ids, rows = links[known, 0], order[pos[known]]
+
+    group = np.argsort(tag_ids, kind="stable")
+    tag_ids, rows = tag_ids[group], rows[group]
+    unique_ids, starts = np.unique(tag_ids, return_index=True)
+    ends = np.append(starts[1:], tag_ids.size)
+
+    by_name: Dict[str, Bitmap] = {}
+    for tag_id, start, end in zip(unique_ids, starts, ends):
+        name = names.get(int(tag_id))
+        if name is not None:
+            by_name[name] = Bitmap.from_rows(rows[start:end], size)
+
+    return TagBitmaps(
+        index_version=index_version,
+        index_built_at=index_built_at,
+        tags_version=tags_version,
+        size=size,
+        by_name=by_name,
+    )
+
+
+_bitmaps_lock = threading.Lock()
+_bitmaps: Dict[str, TagBitmaps] = {}
+
+
+def get_tag_bitmaps(index, tags_version: str | None = None) -> TagBitmaps:
+    """
+    Bitmaps for `index` (a CorpusIndex), rebuilt when either documents or
+    tag assignments change, or the index itself was rebuilt (its rows may
+    have moved). Rebuilding only reads the tag through-table.
+    """
+    tags_version = tags_version or get_tags_version()
+
+    with _bitmaps_lock:
+        bitmaps = _bitmaps.get(index.engine)
+        if (
+            bitmaps is None
+            or bitmaps.index_version != index.version
+            or bitmaps.index_built_at != index.built_at
+            or bitmaps.tags_version != tags_version
+        ):
+            bitmaps = _bitmaps[index.engine] = build_tag_bitmaps(
+                index.doc_ids, index.version, tags_version, index.built_at
+            )
+        return bitmaps
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import multiprocessing
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from apps.documents.services.analysis import Analyzer
+
+
+@dataclass
+class TermCounts:
+    """
+    Document-term count matrix with columns in alphabetical term order (as
+    CountVectorizer produces), and the document id of each row.
+    """
+
+    counts: object  # scipy.sparse.csr_matrix, int32
+    vocabulary: Dict[str, int]
+    doc_ids: np.ndarray
+    chunks: int = 0
+    workers: int = 1
+    count_ms: float = 0.0
+
+
+def count_chunk(analyzer: Analyzer, ngram_range: Tuple[int, int], texts: Sequence[str]):
+    """
+    Term counts of one chunk of documents against a chunk-local vocabulary:
+    (terms, indptr, indices, data). Runs in pool workers, so it only needs
+    the analyzer and plain arrays.
+    """
+    local: Dict[str, int] = {}
+    indptr = [0]
+    indices: List[int] = []
+    data: List[int] = []
+
+    for text in texts:
+        for term, n in Counter(analyzer.document_terms(text or "", ngram_range)).items():
+            indices.append(local.setdefault(term, len(local)))
+            data.append(n)
+        indptr.append(len(indices))
+
+    return (
+        list(local),
+        np.asarray(indptr, dtype=np.int64),
+        np.asarray(indices, dtype=np.int32),
+        np.asarray(data, dtype=np.int32),
+    )
+
+
+class _CountMerger:
+    """
+    Appends chunk counts in order, mapping chunk-local columns to global ones.
+    """
+
+    def __init__(self):
+        self.vocabulary: Dict[str, int] = {}
+        self.indptr = [np.zeros(1, dtype=np.int64)]
+        self.indices: List[np.ndarray] = []
+        self.data: List[np.ndarray] = []
+        self.nnz = 0
+
+    def add(self, terms, indptr, indices, data) -> None:
+        vocabulary = self.vocabulary
+        columns = np.fromiter(
+            (vocabulary.setdefault(t, len(vocabulary)) for t in terms), dtype=np.int32, count=len(terms)
+        )
+        self.indices.append(columns[indices])
+        self.data.append(data)
+        self.indptr.append(indptr[1:] + self.nnz)
+        self.nnz += int(indices.size)
+
+    def result(self):
+        from scipy import sparse
+
+        indptr = np.concatenate(self.indptr)
+        indices = np.concatenate(self.indices) if self.indices else np.empty(0, dtype=np.int32)
+        data = np.concatenate(self.data) if self.data else np.empty(0, dtype=np.int32)
+        self.indices, self.data = [], []
+
+        # alphabetical columns, as CountVectorizer sorts its vocabulary
+        order = sorted(self.vocabulary.items())
+        new_column = np.empty(len(order), dtype=np.int32)
+        vocabulary = {}
+        for new, (term, old) in enumerate(order):
+            new_column[old] = new
+            vocabulary[term] = new
+
+        counts = sparse.csr_matrix(
+            (data, new_column[indices], indptr),
+            shape=(indptr.size - 1, len(vocabulary)),
+        )
+        counts.sort_indices()
+        return counts, vocabulary
+
+
+def _chunked(rows: Iterable[Tuple[int, str]], chunk_size: int) -> Iterator[Tuple[List[int], List[str]]]:
+    ids: List[int] = []
+    texts: List[str] = []
+    for doc_id, text in rows:
+        ids.append(doc_id)
+        texts.append(text or "")
+        if len(ids) >= chunk_size:
+            yield ids, texts
+            ids, texts = [], []
+    if ids:
+        yield ids, texts
+
+
+def count_documents(
+    rows: Iterable[Tuple[int, str]],
+    analyzer: Analyzer,
+    ngram_range: Tuple[int, int] = (1, 1),
+    *,
+    workers: int = 1,
+    chunk_size: int = 1000,
+    progress: Optional[Callable[[int, float], None]] = None,
+) -> TermCounts:
+    """
+    Counts terms of (doc_id, text) rows, consumed as a stream in chunks of
+    `chunk_size`. With workers > 1 chunks are tokenized and counted in a
+    process pool; at most 2 * workers chunks are in flight, so the texts held
+    in memory are bounded by the chunk size, not by the corpus.
+    Chunks are merged in input order: row i is the i-th input document.
+
+    `progress(documents_done, elapsed_ms)` is called after every chunk.
+    """
+    started = time.perf_counter()
+    chunk_size = max(1, int(chunk_size))
+    merger = _CountMerger()
+    doc_ids: List[int] = []
+    n_chunks = 0
+
+    def merge(ids, counted):
+        nonlocal n_chunks
+        merger.add(*counted)
+        doc_ids.extend(ids)
+        n_chunks += 1
+        if progress is not None:
+            progress(len(doc_ids), (time.perf_counter() - started) * 1000)
+
+    if workers <= 1:
+        for ids, texts in _chunked(rows, chunk_size):
+            merge(ids, count_chunk(analyzer, ngram_range, texts))
+    else:
+        # spawn: forking a process that runs server/executor threads is unsafe
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            for ids, texts in _chunked(rows, chunk_size):
+                pending.append((ids, pool.submit(count_chunk, analyzer, ngram_range, texts)))
+                if len(pending) >= 2 * workers:
+                    ids, future = pending.popleft()
+                    merge(ids, future.result())
+            while pending:
+                ids, future = pending.popleft()
+                merge(ids, future.result())
+
+    counts, vocabulary = merger.result()
+    return TermCounts(
+        counts=counts,
+        vocabulary=vocabulary,
+        doc_ids=np.asarray(doc_ids, dtype=np.int64),
+        chunks=n_chunks,
+        workers=max(1, workers),
+        count_ms=(time.perf_counter() - started) * 1000,
+    )
+
+
+def top_features(counts, vocabulary: Dict[str, int], limit: Optional[int]):
+    """
+    Keeps the `limit` most frequent terms, choosing them (ties included)
+    exactly as CountVectorizer(max_features=limit) does on the same counts.
+    """
+    if limit is None or counts.shape[1] <= limit:
+        return counts, vocabulary
+
+    frequencies = np.asarray(counts.sum(axis=0)).ravel()
+    keep = np.sort((-frequencies).argsort()[:limit])
+    new_column = np.full(counts.shape[1], -1, dtype=np.int64)
+    new_column[keep] = np.arange(keep.size)
+    vocabulary = {term: int(new_column[col]) for term, col in vocabulary.items() if new_column[col] >= 0}
+    return counts[:, keep], vocabulary
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+
+
+def term_hash(term: str) -> int:
+    """
+    Stable 64-bit hash of a term (independent of PYTHONHASHSEED).
+    """
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _hash_terms(terms: Iterable[str]) -> np.ndarray:
+    return np.fromiter((term_hash(t) for t in terms), dtype=np.uint64)
+
+
+class DictVocabulary:
+    """
+    term -> column lookup backed by the vectorizer's own dict.
+    """
+
+    def __init__(self, mapping: Dict[str, int]):
+        self.mapping = mapping
+
+    def __len__(self) -> int:
+        return len(self.mapping)
+
+    def lookup(self, terms: Sequence[str]) -> np.ndarray:
+        """
+        Column of each term, -1 for terms outside the vocabulary.
+        """
+        return np.fromiter((self.mapping.get(t, -1) for t in terms), dtype=np.int64, count=len(terms))
+
+    @property
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.mapping) + sum(sys.getsizeof(t) + sys.getsizeof(c) for t, c in self.mapping.items())
+
+
+class CompactVocabulary:
+    """
+    term -> column lookup without keeping the terms: a sorted array of
+    64-bit term hashes and the matching columns, searched with binary search.
+    Costs 12 bytes per term instead of a str object plus a dict slot.
+    """
+
+    def __init__(self, hashes: np.ndarray, columns: np.ndarray):
+        self.hashes = hashes
+        self.columns = columns
+
+    @classmethod
+    def from_mapping(cls, mapping: Dict[str, int]) -> "CompactVocabulary":
+        hashes = _hash_terms(mapping.keys())
+        columns = np.fromiter(mapping.values(), dtype=np.int32, count=len(mapping))
+
+        order = np.argsort(hashes, kind="stable")
+        hashes, columns = hashes[order], columns[order]
+        if hashes.size > 1 and bool((hashes[1:] == hashes[:-1]).any()):
+            raise ValueError("Term hash collision in vocabulary")
+        return cls(hashes, columns)
+
+    def __len__(self) -> int:
+        return int(self.hashes.size)
+
+    def lookup(self, terms: Sequence[str]) -> np.ndarray:
+        """
+        Column of each term, -1 for terms outside the vocabulary.
+        """
+        out = np.full(len(terms), -1, dtype=np.int64)
+        if not len(terms) or not self.hashes.size:
+            return out
+
+        wanted = _hash_terms(terms)
+        pos = np.searchsorted(self.hashes, wanted)
+        hit = pos < self.hashes.size
+        hit[hit] = self.hashes[pos[hit]] == wanted[hit]
+        out[hit] = self.columns[pos[hit]]
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.hashes.nbytes + self.columns.nbytes)
+
+
+def build_vocabulary(mapping: Dict[str, int], compact: bool = False):
+    if compact:
+        try:
+            return CompactVocabulary.from_mapping(mapping)
+        except ValueError:
+            # a 64-bit collision is practically impossible; stay exact if it happens
+            pass
+    return DictVocabulary(mapping)
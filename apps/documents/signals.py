@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.documents.models import Document, Tag
+from apps.documents.services.retrieval import record_document_change
+from apps.documents.services.tag_filter import invalidate_tags
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+def _document_changed(sender, instance, **kwargs):
+    # pk is captured now (delete() clears it) and the change published after
+    # commit, so other processes re-read committed content
+    doc_id = instance.pk
+    transaction.on_commit(lambda: record_document_change(doc_id))
+
+
+@receiver(m2m_changed, sender=Document.tags.through)
+def _document_tags_changed(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        # after commit, or a concurrent query could cache pre-commit rows under the new version
+        transaction.on_commit(invalidate_tags)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def _tag_changed(sender, **kwargs):
+    # renames change bitmap keys; deletes cascade through rows without m2m_changed
+    transaction.on_commit(invalidate_tags)
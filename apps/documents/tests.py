@@ -1,3 +1,520 @@
-from django.test import TestCase
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from apps.documents.models import Document, DocumentChange, Tag
+from apps.documents.services import retrieval, tag_filter
+from apps.documents.services.analysis import Analyzer, ngrams, pretokenized
+from apps.documents.services.evaluation import overlap_at_k
+from apps.documents.services.retrieval import (
+    BM25Scorer,
+    TfidfScorer,
+    build_index,
+    get_changed_documents,
+    get_index,
+    retrieve_top_k,
+)
+from apps.documents.services.term_counts import count_documents, top_features
+
+WORDS = [f"w{i}" for i in range(400)] + ["django", "orm", "query", "index", "کتاب", "کتابها"]
+
+
+def make_corpus(n_docs=300, seed=0):
+    """
+    Documents with a skewed word distribution, so terms have very different
+    posting lengths (and some documents are empty).
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n_docs):
+        vocabulary = WORDS[:rng.randint(20, len(WORDS))]
+        corpus.append(" ".join(rng.choice(vocabulary) for _ in range(rng.randint(0, 60))))
+    return corpus, np.arange(100, 100 + n_docs, dtype=np.int64)
+
+
+def make_queries(n=60, seed=1):
+    rng = random.Random(seed)
+    analyzer = Analyzer()
+    return [analyzer.analyze_query(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))) for _ in range(n)]
+
+
+class InvertedIndexSearchTests(TestCase):
+    def test_maxscore_matches_exhaustive_ranking(self):
+        corpus, doc_ids = make_corpus()
+        for scorer_class in (TfidfScorer, BM25Scorer):
+            pruned, exhaustive = scorer_class(prune=True), scorer_class(prune=False)
+            pruned.fit(corpus, doc_ids)
+            exhaustive.fit(corpus, doc_ids)
+
+            for query in make_queries():
+                for k in (1, 5, 20):
+                    rows, scores = pruned.search(query, k)
+                    expected_rows, expected_scores = exhaustive.search(query, k)
+                    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+                    self.assertEqual(rows.tolist(), expected_rows.tolist())
+
+    def test_tfidf_scores_are_vectorizer_cosine(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        corpus, doc_ids = make_corpus()
+        analyzer = Analyzer()
+        scorer = TfidfScorer(analyzer=analyzer)
+        scorer.fit(corpus, doc_ids)
+
+        vectorizer = TfidfVectorizer(analyzer=pretokenized, max_features=5000, dtype=np.float32)
+        matrix = vectorizer.fit_transform(analyzer.document_terms(text, (1, 2)) for text in corpus)
+
+        for query in make_queries():
+            cosine = (matrix @ vectorizer.transform([ngrams(query.tokens, (1, 2))]).T).toarray().ravel()
+            expected = np.sort(cosine[cosine > 0])[::-1][:10]
+
+            rows, scores = scorer.search(query, 10)
+            np.testing.assert_allclose(scores, expected, rtol=1e-5)
+            np.testing.assert_allclose(cosine[rows], scores, rtol=1e-5)
+
+
+class IndexStorageTests(TestCase):
+    def test_compact_vocabulary_gives_identical_results(self):
+        corpus, doc_ids = make_corpus()
+        for scorer_class in (TfidfScorer, BM25Scorer):
+            full, compact = scorer_class(compact_vocab=False), scorer_class(compact_vocab=True)
+            full.fit(corpus, doc_ids)
+            compact.fit(corpus, doc_ids)
+
+            for query in make_queries():
+                rows, scores = compact.search(query, 10)
+                expected_rows, expected_scores = full.search(query, 10)
+                self.assertEqual(rows.tolist(), expected_rows.tolist())
+                np.testing.assert_array_equal(scores, expected_scores)
+
+    def test_uint8_scores_stay_close_to_vectorizer_cosine(self):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        corpus, doc_ids = make_corpus()
+        analyzer = Analyzer()
+        scorer = TfidfScorer(dtype="uint8", analyzer=analyzer)
+        scorer.fit(corpus, doc_ids)
+
+        vectorizer = TfidfVectorizer(analyzer=pretokenized, max_features=5000, dtype=np.float32)
+        matrix = vectorizer.fit_transform(analyzer.document_terms(text, (1, 2)) for text in corpus)
+
+        for query in make_queries():
+            cosine = (matrix @ vectorizer.transform([ngrams(query.tokens, (1, 2))]).T).toarray().ravel()
+            rows, scores = scorer.search(query, 10)
+            if not rows.size:
+                continue
+            # per-term codes are within half a quantization step of the float weight
+            np.testing.assert_allclose(scores, cosine[rows], atol=0.01 * cosine.max())
+            self.assertAlmostEqual(scores[0], cosine.max(), delta=0.01 * cosine.max())
+
+    def test_uint8_rankings_agree_with_float32(self):
+        corpus, doc_ids = make_corpus()
+        for scorer_class in (TfidfScorer, BM25Scorer):
+            full, quantized = scorer_class(dtype="float32"), scorer_class(dtype="uint8")
+            full.fit(corpus, doc_ids)
+            quantized.fit(corpus, doc_ids)
+
+            overlaps = [
+                overlap_at_k(full.search(q, 10)[0].tolist(), quantized.search(q, 10)[0].tolist(), 10)
+                for q in make_queries()
+            ]
+            self.assertGreaterEqual(np.mean(overlaps), 0.95)
+            self.assertLess(quantized.memory_usage()["index"], full.memory_usage()["index"])
+
+    def test_sharded_index_matches_unsharded(self):
+        corpus, doc_ids = make_corpus()
+        for scorer_class in (TfidfScorer, BM25Scorer):
+            for dtype in ("float32", "uint8"):
+                single, sharded = scorer_class(dtype=dtype), scorer_class(dtype=dtype, shards=7)
+                single.fit(corpus, doc_ids)
+                sharded.fit(corpus, doc_ids)
+
+                for query in make_queries(120):
+                    rows, scores = sharded.search(query, 10)
+                    expected_rows, expected_scores = single.search(query, 10)
+                    self.assertEqual(rows.tolist(), expected_rows.tolist())
+                    np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+
+def _ranked_ids(scorer, doc_ids, query, k=10):
+    rows, scores = scorer.search(query, k)
+    return [int(doc_ids[r]) for r in rows], scores
+
+
+class HashingUpdateTests(TestCase):
+    def test_incremental_updates_match_full_rebuild(self):
+        from apps.documents.services.hashing import HashingTfidfScorer
+
+        corpus, doc_ids = make_corpus(400)
+        texts = dict(zip(doc_ids.tolist(), corpus))
+        # a small merge threshold, so the delta is merged into the main segment midway
+        scorer = HashingTfidfScorer(n_features=2 ** 12, min_merge_rows=40, merge_ratio=0.1)
+        scorer.fit(corpus[:300], doc_ids[:300])
+        rows = doc_ids[:300].copy()
+
+        rng = random.Random(2)
+        for start in range(300, 400, 20):
+            removed = np.asarray(rng.sample([i for i in range(rows.size) if rows[i] >= 0], 5))
+            scorer = scorer.updated(corpus[start:start + 20], removed)
+            rows[removed] = -1
+            rows = np.concatenate([rows, doc_ids[start:start + 20]])
+
+        live = rows[rows >= 0]
+        rebuilt = HashingTfidfScorer(n_features=2 ** 12)
+        rebuilt.fit([texts[int(d)] for d in live], live)
+
+        for query in make_queries():
+            ranked, scores = _ranked_ids(scorer, rows, query)
+            expected, expected_scores = _ranked_ids(rebuilt, live, query)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+            self.assertEqual(ranked, expected)
+
+
+@override_settings(RETRIEVAL_VERSION_CHECK_SECONDS=0)
+class ChangeLogTests(TestCase):
+    def setUp(self):
+        retrieval._indexes.clear()
+        retrieval.invalidate_index()
+        cache.clear()
+        corpus, _ = make_corpus(50)
+        self.documents = Document.objects.bulk_create(
+            [Document(title=f"d{i}", content=text) for i, text in enumerate(corpus)]
+        )
+
+    def test_saved_and_deleted_documents_are_applied_in_place(self):
+        index = get_index("hashing")
+        self.assertIsNotNone(index.build_stats)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            added = Document.objects.create(title="new", content="quokka marsupial island")
+            changed = self.documents[0]
+            changed.content = "wombat burrow"
+            changed.save()
+            deleted_id = self.documents[1].pk
+            self.documents[1].delete()
+
+        refreshed = get_index("hashing")
+        # refreshed from the change log, not rebuilt
+        self.assertIsNone(refreshed.build_stats)
+        self.assertEqual(refreshed.search("quokka island", 3)[0][0], added.pk)
+        self.assertEqual(refreshed.search("wombat", 3)[0][0], changed.pk)
+        self.assertNotIn(deleted_id, refreshed.doc_ids.tolist())
+
+    def test_pruned_log_requires_a_full_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for document in self.documents[:3]:
+                document.save()
+        last = DocumentChange.objects.latest("id").pk
+        self.assertEqual(len(get_changed_documents(last - 3, last)), 3)
+
+        DocumentChange.objects.filter(pk__lte=last - 1).delete()
+        self.assertIsNone(get_changed_documents(last - 3, last))
+        self.assertEqual(len(get_changed_documents(last - 1, last)), 1)
+
+
+@override_settings(RETRIEVAL_VERSION_CHECK_SECONDS=0)
+class IndexVersionTests(TestCase):
+    def setUp(self):
+        retrieval._indexes.clear()
+        retrieval.invalidate_index()
+        cache.clear()
+        corpus, _ = make_corpus(50)
+        Document.objects.bulk_create([Document(title=f"d{i}", content=text) for i, text in enumerate(corpus)])
+
+    def test_bulk_created_documents_are_indexed(self):
+        for engine in ("bm25", "hashing"):
+            get_index(engine)
+            added = Document.objects.bulk_create([Document(title="bulk", content=f"platypus {engine}")])[0]
+            self.assertEqual(get_index(engine).search(f"platypus {engine}", 1)[0][0], added.pk)
+
+    def test_changes_logged_by_another_process_are_indexed(self):
+        document = Document.objects.first()
+        get_index("bm25")
+        # what another process's save() leaves behind: new content and a log entry,
+        # but no invalidate_index() call in this process
+        Document.objects.filter(pk=document.pk).update(content="echidna spines")
+        DocumentChange.objects.create(document_id=document.pk)
+        self.assertEqual(get_index("bm25").search("echidna", 1)[0][0], document.pk)
+
+    def test_unlogged_updates_are_bounded_by_max_age(self):
+        document = Document.objects.first()
+        get_index("bm25")
+        Document.objects.filter(pk=document.pk).update(content="numbat termites")
+        self.assertEqual(get_index("bm25").search("numbat", 1), [])
+
+        with override_settings(RETRIEVAL_INDEX_MAX_AGE_SECONDS=1e-6):
+            self.assertEqual(get_index("bm25").search("numbat", 1)[0][0], document.pk)
+
+
+@override_settings(RETRIEVAL_VERSION_CHECK_SECONDS=0)
+class TagFilterTests(TestCase):
+    def setUp(self):
+        retrieval._indexes.clear()
+        retrieval.invalidate_index()
+        tag_filter._bitmaps.clear()
+        tag_filter.invalidate_tags()
+        cache.clear()
+        self.docs = Document.objects.bulk_create(
+            [Document(title=f"d{i}", content=f"wombat burrow {i}") for i in range(12)]
+        )
+        self.alpha, self.beta = Tag.objects.bulk_create([Tag(name="alpha"), Tag(name="beta")])
+        for doc in self.docs[2:8]:
+            doc.tags.add(self.alpha)
+        for doc in self.docs[6:10]:
+            doc.tags.add(self.beta)
+
+    def retrieve_ids(self, tags, tags_mode="any"):
+        return {r.document.pk for r in retrieve_top_k("wombat", 12, "bm25", tags=tags, tags_mode=tags_mode)}
+
+    def test_any_and_all_modes(self):
+        alpha, beta = {d.pk for d in self.docs[2:8]}, {d.pk for d in self.docs[6:10]}
+        self.assertEqual(self.retrieve_ids(["alpha"]), alpha)
+        self.assertEqual(self.retrieve_ids(["alpha", "beta"]), alpha | beta)
+        self.assertEqual(self.retrieve_ids(["alpha", "beta"], "all"), alpha & beta)
+        self.assertEqual(self.retrieve_ids(["alpha", "missing"]), alpha)
+        self.assertEqual(self.retrieve_ids(["alpha", "missing"], "all"), set())
+        self.assertEqual(len(self.retrieve_ids([])), 12)
+
+    def test_bitmaps_match_the_through_table(self):
+        index = get_index("bm25")
+        bitmaps = tag_filter.get_tag_bitmaps(index)
+        for tag in (self.alpha, self.beta):
+            rows = bitmaps.select([tag.name]).rows()
+            self.assertEqual({int(index.doc_ids[r]) for r in rows}, set(tag.documents.values_list("pk", flat=True)))
+        self.assertEqual(bitmaps.select(["alpha", "beta"], "all").count(), 2)
+
+    @override_settings(RETRIEVAL_VERSION_CHECK_SECONDS=3600)
+    def test_tag_changes_invalidate_after_commit(self):
+        tag_filter.invalidate_tags()
+        self.assertEqual(self.retrieve_ids(["beta"]), {d.pk for d in self.docs[6:10]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.docs[0].tags.add(self.beta)
+        self.assertEqual(self.retrieve_ids(["beta"]), {d.pk for d in self.docs[6:10]} | {self.docs[0].pk})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beta.name = "gamma"
+            self.beta.save()
+        self.assertEqual(self.retrieve_ids(["beta"]), set())
+
+    def test_links_written_behind_the_process_back_are_seen(self):
+        self.assertEqual(self.retrieve_ids(["beta"]), {d.pk for d in self.docs[6:10]})
+
+        # through-table writes send no m2m_changed, as with raw SQL or another process
+        Document.tags.through.objects.create(document=self.docs[10], tag=self.beta)
+        self.assertEqual(self.retrieve_ids(["beta"]), {d.pk for d in self.docs[6:10]} | {self.docs[10].pk})
+
+        Document.tags.through.objects.filter(document=self.docs[6], tag=self.beta).delete()
+        self.assertEqual(self.retrieve_ids(["beta"]), {d.pk for d in self.docs[7:10]} | {self.docs[10].pk})
+
+        Tag.objects.filter(pk=self.beta.pk).update(name="gamma")
+        self.assertEqual(self.retrieve_ids(["beta"]), set())
+        self.assertEqual(self.retrieve_ids(["gamma"]), {d.pk for d in self.docs[7:10]} | {self.docs[10].pk})
+
+    def test_bitmaps_follow_an_index_rebuild(self):
+        self.assertEqual(self.retrieve_ids(["alpha"]), {d.pk for d in self.docs[2:8]})
+
+        # rows shift when an untagged document disappears without a change log entry
+        Document.objects.filter(pk=self.docs[10].pk)._raw_delete(Document.objects.db)
+        cache.clear()
+        with override_settings(RETRIEVAL_INDEX_MAX_AGE_SECONDS=1e-6):
+            self.assertEqual(self.retrieve_ids(["alpha"]), {d.pk for d in self.docs[2:8]})
+
+
+class TermCountTests(TestCase):
+    def test_counts_match_count_vectorizer(self):
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        corpus, doc_ids = make_corpus()
+        analyzer = Analyzer()
+        for ngram_range in ((1, 1), (1, 2)):
+            vectorizer = CountVectorizer(analyzer=pretokenized, dtype=np.int32)
+            expected = vectorizer.fit_transform(analyzer.document_terms(text, ngram_range) for text in corpus)
+
+            counts = count_documents(zip(doc_ids, corpus), analyzer, ngram_range, chunk_size=7)
+            self.assertEqual(counts.vocabulary, vectorizer.vocabulary_)
+            self.assertEqual((counts.counts != expected).nnz, 0)
+            np.testing.assert_array_equal(counts.doc_ids, doc_ids)
+
+    def test_top_features_match_max_features(self):
+        from sklearn.feature_extraction.text import CountVectorizer
+
+        corpus, doc_ids = make_corpus()
+        analyzer = Analyzer()
+        terms = [analyzer.document_terms(text, (1, 2)) for text in corpus]
+        vectorizer = CountVectorizer(analyzer=pretokenized, max_features=500, dtype=np.float32)
+        expected = vectorizer.fit_transform(terms)
+
+        counts = count_documents(zip(doc_ids, corpus), analyzer, (1, 2))
+        matrix, vocabulary = top_features(counts.counts.astype(np.float32), counts.vocabulary, 500)
+        self.assertEqual(vocabulary, vectorizer.vocabulary_)
+        self.assertEqual((matrix != expected).nnz, 0)
+
+    def test_worker_processes_give_the_same_counts(self):
+        corpus, doc_ids = make_corpus()
+        analyzer = Analyzer()
+        serial = count_documents(zip(doc_ids, corpus), analyzer, (1, 2), chunk_size=40)
+        parallel = count_documents(zip(doc_ids, corpus), analyzer, (1, 2), workers=2, chunk_size=40)
+
+        self.assertEqual(parallel.workers, 2)
+        self.assertEqual(parallel.chunks, 8)
+        self.assertEqual(parallel.vocabulary, serial.vocabulary)
+        np.testing.assert_array_equal(parallel.doc_ids, serial.doc_ids)
+        for name in ("indptr", "indices", "data"):
+            np.testing.assert_array_equal(getattr(parallel.counts, name), getattr(serial.counts, name))
+
+
+class BuildIndexTests(TestCase):
+    def setUp(self):
+        corpus, _ = make_corpus(120)
+        Document.objects.bulk_create([Document(title=f"d{i}", content=text) for i, text in enumerate(corpus)])
+
+    def test_multiprocess_build_matches_single_process_build(self):
+        for engine in ("tfidf", "bm25"):
+            serial = build_index(engine, "v", workers=1, chunk_size=1000)
+            progress = []
+            parallel = build_index(engine, "v", workers=2, chunk_size=25, progress=lambda n, ms: progress.append(n))
+
+            self.assertEqual(progress, [25, 50, 75, 100, 120])
+            self.assertEqual(parallel.build_stats.documents, 120)
+            self.assertEqual(parallel.build_stats.chunks, 5)
+            self.assertEqual(parallel.build_stats.terms, serial.build_stats.terms)
+            np.testing.assert_array_equal(parallel.doc_ids, serial.doc_ids)
+            for query in make_queries():
+                self.assertEqual(parallel.search(query, 10), serial.search(query, 10))
+
+
+class DenseSearchTests(TestCase):
+    def setUp(self):
+        from apps.documents.services.dense import DenseScorer, Encoder, IVFIndex, VectorStore
+
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((5000, 16)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.query = self.vectors[0]
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.scorer = DenseScorer(Encoder("test-encoder"), Path(directory.name), nprobe=4)
+        self.scorer.store = VectorStore.write(
+            Path(directory.name),
+            self.vectors,
+            np.arange(len(self.vectors), dtype=np.uint64),
+            dtype="float16",
+            model_name="test-encoder",
+        )
+        self.scorer.ivf = IVFIndex.build(self.vectors, 64)
+
+    def search(self, allowed, k=10):
+        with mock.patch("apps.documents.services.dense.embed_query", return_value=self.query):
+            rows, _ = self.scorer.search(Analyzer().analyze_query("query"), k, allowed)
+        return rows
+
+    def exact_top_k(self, rows, k=10):
+        scores = self.vectors[rows] @ self.query
+        return set(rows[np.argsort(-scores)[:k]])
+
+    def test_rare_tag_is_scanned_exactly(self):
+        from apps.documents.services.tag_filter import Bitmap
+
+        rows = np.random.default_rng(1).choice(len(self.vectors), size=25, replace=False)
+        found = self.search(Bitmap.from_rows(rows, len(self.vectors)))
+        self.assertEqual(set(found), self.exact_top_k(rows))
+
+    def test_filter_far_from_the_query_widens_the_probe(self):
+        from apps.documents.services.tag_filter import Bitmap
+
+        # the rows least similar to the query: none of them in its closest lists
+        rows = np.argsort(self.vectors @ self.query)[:1000]
+        found = self.search(Bitmap.from_rows(rows, len(self.vectors)))
+        self.assertEqual(len(found), 10)
+        self.assertTrue(set(found) <= set(rows))
+
+    def test_documents_are_encoded_like_queries(self):
+        from apps.documents.services.dense import DenseScorer, Encoder
+
+        class RecordingEncoder(Encoder):
+            def encode(self, texts):
+                self.encoded = getattr(self, "encoded", []) + list(texts)
+                return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+        encoder = RecordingEncoder("test-encoder")
+        with tempfile.TemporaryDirectory() as directory:
+            scorer = DenseScorer(encoder, Path(directory))
+            scorer.fit(["Django ORM", "كتاب"], np.array([1, 2]))
+            self.assertEqual(encoder.encoded, ["django orm", "کتاب"])
+
+            # equivalent spellings reuse the stored vectors
+            scorer.fit(["DJANGO orm", "كتاب", "new"], np.array([1, 2, 3]))
+            self.assertEqual(encoder.encoded, ["django orm", "کتاب", "new"])
+
+    def test_concurrent_builds_share_vectors_and_keep_two_generations(self):
+        from apps.documents.services.dense import DenseScorer, Encoder, VectorStore
+
+        class CountingEncoder(Encoder):
+            encoded = 0
+
+            def encode(self, texts):
+                CountingEncoder.encoded += len(texts)
+                return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+        corpus = [f"document {i}" for i in range(50)]
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            builders = [
+                threading.Thread(target=DenseScorer(CountingEncoder("test-encoder"), directory).fit, args=(corpus, None))
+                for _ in range(4)
+            ]
+            for builder in builders:
+                builder.start()
+            for builder in builders:
+                builder.join()
+
+            # one build encoded the corpus, the others reused its vectors
+            self.assertEqual(CountingEncoder.encoded, len(corpus))
+            generations = [p for p in directory.iterdir() if p.is_dir()]
+            self.assertEqual(len(generations), 2)
+
+            # the generation before the last swap is kept for readers that resolved it
+            self.assertIn(VectorStore.open(directory).path, generations)
+            self.assertTrue(all((g / "meta.npz").exists() for g in generations))
+
+
+@override_settings(RETRIEVAL_VERSION_CHECK_SECONDS=0, HYBRID_ENGINES=["bm25"], HYBRID_RERANK=True, RERANK_BUDGET_MS=100)
+class HybridRerankTests(TestCase):
+    def setUp(self):
+        retrieval._indexes.clear()
+        retrieval.invalidate_index()
+        cache.clear()
+        Document.objects.bulk_create([Document(title=f"d{i}", content=f"quokka {'smile ' * i}") for i in range(5)])
+
+    def test_model_load_is_outside_the_rerank_budget(self):
+        from apps.documents.services.hybrid import CrossEncoderReranker, hybrid_search
+
+        class SlowLoadingReranker(CrossEncoderReranker):
+            loaded = False
+
+            def load(self):
+                if not self.loaded:
+                    time.sleep(0.3)
+                    self.loaded = True
+
+            def score(self, query, passages, *, deadline):
+                # like the real model, loaded on first use
+                self.load()
+                return None if time.perf_counter() >= deadline else np.linspace(0, 1, len(passages))
+
+        query = Analyzer().analyze_query("quokka")
+        with mock.patch("apps.documents.services.hybrid.get_reranker", return_value=SlowLoadingReranker("test")):
+            results, timings = hybrid_search(query, 3, retrieval.get_index_version())
+
+        self.assertTrue(timings.reranked)
+        self.assertLess(timings.rerank_ms, 100)
+        self.assertEqual([r.score for r in results], [1.0, 0.75, 0.5])
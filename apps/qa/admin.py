@@ -1,22 +1,52 @@
 from django.contrib import admin
+from django.db.models.functions import Substr
+
+from apps.documents.admin_pagination import CursorPaginatedAdmin
 from .models import Question, Answer
 
+PREVIEW_CHARS = 75
+
+
+def _preview(text: str) -> str:
+    return (text[:PREVIEW_CHARS] + '...') if len(text) > PREVIEW_CHARS else text
+
+
+def _short_text(obj) -> str:
+    preview = getattr(obj, 'text_preview', None)
+    # '' (failed/pending answers) is a preview too; only a missing one reads the deferred field
+    return _preview(obj.text if preview is None else preview)
+
+
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
+class QuestionAdmin(CursorPaginatedAdmin):
     search_fields = ['text']
     list_display = ['id', 'short_text', 'created_at']
-    ordering = ['-created_at']
+
+    def get_queryset(self, request):
+        # Only the first characters of the text are shown in the list
+        return (
+            super().get_queryset(request)
+            .annotate(text_preview=Substr('text', 1, PREVIEW_CHARS + 1))
+            .defer('text')
+        )
 
     def short_text(self, obj: Question) -> str:
-        return (obj.text[:75] + '...') if len(obj.text) > 75 else obj.text
+        return _short_text(obj)
     
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
+class AnswerAdmin(CursorPaginatedAdmin):
     search_fields = ['text', 'question__text']
-    list_display = ['id', 'question_id', 'short_text', 'created_at']
+    list_display = ['id', 'question_id', 'short_text', 'status', 'created_at']
+    list_filter = ['status']
     autocomplete_fields = ['question']
     filter_horizontal = ['source_documents']
 
-    def short_text(self, obj: Answer) -> str:
-        return (obj.text[:75] + '...') if len(obj.text) > 75 else obj.text
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request)
+            .annotate(text_preview=Substr('text', 1, PREVIEW_CHARS + 1))
+            .defer('text', 'error_message')
+        )
 
+    def short_text(self, obj: Answer) -> str:
+        return _short_text(obj)
@@ -1,20 +1,28 @@
 from rest_framework.generics import GenericAPIView
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
 from drf_spectacular.utils import extend_schema
 
 from django.conf import settings
 
-from apps.documents.services.retrieval import retrieve_top_k
+from apps.documents.services.retrieval import retrieve_top_k, retrieve_top_k_timed
 from .serializers import RetrievalRequestSerializer
 
+from apps.qa.parsers import ORJSONParser
+from apps.qa.renderers import ORJSONRenderer
 from apps.qa.serializers import (
     RetrievalRequestSerializer,
     RetrievalResponseSerializer,
     AskRequestSerializer,
     AskResponseSerializer,
+    ReadinessSerializer,
 )
 from apps.qa.services.answer_generation import generate_answer_for_question
+from apps.qa.services.deadline import deadline_scope, request_deadline
+from apps.qa.services.warmup import get_warmup_state
 
 
 from rest_framework.generics import GenericAPIView
@@ -22,8 +30,15 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
 
+# orjson for the hot QA endpoints; same media types, so the schema is unchanged
+QA_RENDERER_CLASSES = [ORJSONRenderer, BrowsableAPIRenderer]
+QA_PARSER_CLASSES = [ORJSONParser, FormParser, MultiPartParser]
+
+
 class RetrieveAPIView(GenericAPIView):
     permission_classes = [AllowAny]
+    renderer_classes = QA_RENDERER_CLASSES
+    parser_classes = QA_PARSER_CLASSES
     serializer_class = RetrievalRequestSerializer
 
     @extend_schema(
@@ -38,8 +53,10 @@ class RetrieveAPIView(GenericAPIView):
 
         question = serializer.validated_data["question"]
         k = serializer.validated_data["k"]
+        tags = serializer.validated_data["tags"]
+        tags_mode = serializer.validated_data["tags_mode"]
 
-        results = retrieve_top_k(question, k=k)
+        results, timings = retrieve_top_k_timed(question, k=k, tags=tags, tags_mode=tags_mode)
 
         return Response({
             "question": question,
@@ -53,11 +70,19 @@ class RetrieveAPIView(GenericAPIView):
                 }
                 for idx, r in enumerate(results, start=1)
             ],
+            "timings": {
+                "retrieval_ms": timings.retrieval_ms,
+                "rerank_ms": timings.rerank_ms,
+                "reranked": timings.reranked,
+                "cached": timings.cached,
+            },
         })
 
 
 class AskAPIView(GenericAPIView):
     permission_classes = [AllowAny]
+    renderer_classes = QA_RENDERER_CLASSES
+    parser_classes = QA_PARSER_CLASSES
     serializer_class = AskRequestSerializer
 
     @extend_schema(
@@ -72,15 +97,26 @@ class AskAPIView(GenericAPIView):
 
         question = s.validated_data["question"]
         k = s.validated_data["k"]
+        tags = s.validated_data["tags"]
+        tags_mode = s.validated_data["tags_mode"]
 
         top_k = int(getattr(settings, "RETRIEVAL_TOP_K", k) or k)
         max_chars = int(getattr(settings, "MAX_CONTEXT_CHARS", 1500))
 
-        # Retrieve (cached) for precise citations
-        results = retrieve_top_k(question, k=top_k)
-
-        # Generate answer
-        ans = generate_answer_for_question(question, top_k=top_k, max_context_chars=max_chars)
+        # one deadline (QA_DEADLINE_MS) for retrieval, cold index builds included, and generation
+        with deadline_scope(request_deadline()):
+            # Retrieve once: the same results are cited and passed to the chain
+            results = retrieve_top_k(question, k=top_k, tags=tags, tags_mode=tags_mode)
+
+            # Generate answer
+            ans = generate_answer_for_question(
+                question,
+                top_k=top_k,
+                max_context_chars=max_chars,
+                tags=tags,
+                tags_mode=tags_mode,
+                results=results,
+            )
 
         sources = [
             {
@@ -92,11 +128,7 @@ class AskAPIView(GenericAPIView):
             for idx, r in enumerate(results, start=1)
         ]
 
-        # Optional: keep DB relation aligned (اگر M2M داری)
-        try:
-            ans.source_documents.set([r.document.id for r in results])
-        except Exception:
-            pass
+        # source_documents were written with the answer (same retrieval)
 
         return Response({
             "question_id": ans.question.id,
@@ -108,3 +140,16 @@ class AskAPIView(GenericAPIView):
             "prompt_version": ans.prompt_version,
             "latency_ms": ans.latency_ms,
         })
+
+
+class ReadinessAPIView(APIView):
+    permission_classes = [AllowAny]
+
+    @extend_schema(
+        tags=["Health"],
+        responses={200: ReadinessSerializer, 503: ReadinessSerializer},
+        description="Readiness probe: 200 once warm-up (index + LLM load + dummy generation) has finished.",
+    )
+    def get(self, request):
+        state = get_warmup_state()
+        return Response(state.as_dict(), status=200 if state.ready else 503)
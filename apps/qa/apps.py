@@ -1,6 +1,32 @@
+import os
+import sys
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class QaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'apps.qa'
\ No newline at end of file
+    name = 'apps.qa'
+
+    def ready(self):
+        from apps.qa.services import warmup
+
+        if not getattr(settings, "WARMUP_ON_BOOT", False):
+            warmup.mark_warmup_disabled()
+            return
+
+        # Management commands other than the serving runserver process
+        # (not its autoreloader parent) don't need a warm model.
+        argv = sys.argv
+        if argv and argv[0].endswith("manage.py"):
+            serving = len(argv) > 1 and argv[1] == "runserver" and (
+                os.environ.get("RUN_MAIN") == "true" or "--noreload" in argv
+            )
+            if serving:
+                warmup.start_warmup_in_background()
+            return
+
+        # WSGI/ASGI servers may import the app in a master process and fork
+        # the workers from it: each worker warms up on its first request
+        warmup.start_warmup_on_first_request()
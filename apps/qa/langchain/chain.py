@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import threading
+from typing import Dict, Tuple
+
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableMap, RunnablePassthrough, RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda
 
+from apps.qa.langchain.llm import get_langchain_llm, get_llm_provider
 from apps.qa.langchain.retriever import TfidfDBRetriever
+from apps.qa.services.confidence import get_confidence_gate
+from apps.qa.services.deadline import DeadlineExceeded, current_deadline
+from apps.qa.services.prompts import RAG_PROMPT_VERSION, RAG_TEMPLATE, REFUSAL_TEXT
+
+# compiled once at import, shared by every chain
+RAG_PROMPT = PromptTemplate.from_template(RAG_TEMPLATE)
+
+_chains_lock = threading.Lock()
+_chains: Dict[Tuple[str, str, int, str], Tuple[object, Runnable]] = {}
 
 
 def _format_docs(docs) -> str:
@@ -18,48 +31,74 @@ def _format_docs(docs) -> str:
 def build_rag_chain(llm, *, k: int = 3):
     """
     Returns a LangChain Runnable (LCEL) with `.invoke(question: str)` support.
+    Retrieval is scoped per call with
+    `.invoke({"question": str, "tags": [...], "tags_mode": "any" | "all"})`,
+    so one chain serves every request. Callers that already retrieved pass
+    `"context_docs": [LangChain Document, ...]` instead, and the chain does
+    not retrieve again.
 
     Output:
-      {"answer": str, "context": list[langchain_core.documents.Document]}
+      {"answer": str, "context": list[langchain_core.documents.Document], "refused": str, "fallback": str}
+
+    When the retrieval scores fail the confidence gate, the LLM is not
+    invoked: "answer" is the canned refusal and "refused" the reason.
+    When the request deadline (apps.qa.services.deadline) passes before or
+    during generation, "answer" is empty and "fallback" the reason; the
+    caller answers from the retrieved context instead.
     """
     retriever = TfidfDBRetriever(k=k)
+    answer = RAG_PROMPT | llm | StrOutputParser()
 
-    prompt = PromptTemplate.from_template(
-        """You are a helpful assistant.
-You MUST answer using only the provided context.
-If the context is insufficient, say exactly: "I don't know based on the provided documents."
-Cite sources using [D1], [D2], ... for each factual claim.
-
-Question:
-{question}
+    # two plain steps instead of three RunnableMaps: each map runs its
+    # branches through an executor, which costs more than the lambdas
+    def retrieve_context(inputs, config):
+        if isinstance(inputs, str):
+            inputs = {"question": inputs}
+        if inputs.get("context_docs") is not None:
+            docs = list(inputs["context_docs"])
+            return {"question": inputs["question"], "context": _format_docs(docs), "context_docs": docs}
+        docs = retriever.invoke(
+            inputs["question"],
+            config,
+            tags=list(inputs.get("tags") or []),
+            tags_mode=inputs.get("tags_mode") or "any",
+        )
+        return {"question": inputs["question"], "context": _format_docs(docs), "context_docs": docs}
 
-Context:
-{context}
+    def generate_answer(inputs, config):
+        docs = inputs["context_docs"]
+        gate = get_confidence_gate()
+        reason = gate.refusal_reason([d.metadata["score"] for d in docs]) if gate else ""
+        if reason:
+            return {"answer": REFUSAL_TEXT, "context": docs, "refused": reason, "fallback": ""}
 
-Answer:
-"""
-    )
+        deadline = current_deadline()
+        try:
+            if deadline is not None:
+                deadline.check("retrieval")
+            text = answer.invoke(inputs, config)
+        except DeadlineExceeded as e:
+            return {"answer": "", "context": docs, "refused": "", "fallback": str(e)}
+        return {"answer": text, "context": docs, "refused": "", "fallback": ""}
 
-    base = RunnableMap(
-        {
-            "question": RunnablePassthrough(),
-            "context_docs": retriever,
-        }
+    return RunnableLambda(retrieve_context, name="retrieve_context") | RunnableLambda(
+        generate_answer, name="generate_answer"
     )
 
-    add_context = RunnableMap(
-        {
-            "question": RunnableLambda(lambda x: x["question"]),
-            "context_docs": RunnableLambda(lambda x: x["context_docs"]),
-            "context": RunnableLambda(lambda x: _format_docs(x["context_docs"])),
-        }
-    )
 
-    final = RunnableMap(
-        {
-            "answer": prompt | llm | StrOutputParser(),
-            "context": RunnableLambda(lambda x: x["context_docs"]),
-        }
-    )
+def get_rag_chain(*, k: int = 3):
+    """
+    The RAG chain for the configured LLM, built once per
+    (provider, model, k, prompt version) and reused by every request.
+    Returns (chain, llm).
+    """
+    llm = get_langchain_llm()
+    key = (get_llm_provider(), getattr(llm, "model", ""), k, RAG_PROMPT_VERSION)
 
-    return base | add_context | final
+    with _chains_lock:
+        cached = _chains.get(key)
+        # the LLM is replaced when its generation settings change
+        if cached is None or cached[0] is not llm:
+            cached = (llm, build_rag_chain(llm, k=k))
+            _chains[key] = cached
+    return cached[1], llm
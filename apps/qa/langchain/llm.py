@@ -1,41 +1,79 @@
 from __future__ import annotations
 
 import os
-from langchain_core.language_models import BaseLLM
+import threading
+from typing import List, Optional
+
+from langchain_core.language_models import LLM
 from langchain_core.runnables import RunnableLambda
 
 from django.conf import settings
 
+from apps.qa.services.llm import HFConfig, HuggingFaceLLM
+
+_hf_lock = threading.Lock()
+_hf_llm = None
+_hf_key = None
+
+
+# Simple runnable that always refuses to hallucinate
+_stub_llm = RunnableLambda(lambda prompt: "I don't know based on the provided documents.")
+
+
+def get_llm_provider() -> str:
+    return (os.getenv("LLM_PROVIDER") or getattr(settings, "LLM_PROVIDER", "stub")).lower()
+
 
 def get_langchain_llm():
-    provider = (os.getenv("LLM_PROVIDER") or getattr(settings, "LLM_PROVIDER", "stub")).lower()
+    provider = get_llm_provider()
 
     if provider == "stub":
-        # Simple runnable that always refuses to hallucinate
-        return RunnableLambda(lambda prompt: "I don't know based on the provided documents.")
+        return _stub_llm
 
     if provider in ("hf", "huggingface", "transformers"):
-        from transformers import pipeline
-        from langchain_community.llms import HuggingFacePipeline
-
         model_name = os.getenv("LLM_MODEL_NAME") or getattr(settings, "LLM_MODEL_NAME", "google/flan-t5-small")
         max_new_tokens = int(os.getenv("LLM_MAX_NEW_TOKENS") or getattr(settings, "LLM_MAX_NEW_TOKENS", 128))
         temperature = float(os.getenv("LLM_TEMPERATURE") or getattr(settings, "LLM_TEMPERATURE", 0.2))
-
-        hf = pipeline(
-            "text2text-generation",
-            model=model_name,
-            device=-1,
-        )
-
-        llm = HuggingFacePipeline(
-            pipeline=hf,
-            model_kwargs={
-                "max_new_tokens": max_new_tokens,
-                "do_sample": temperature > 0,
-                "temperature": temperature,
-            },
-        )
-        return llm
+        return _get_hf_llm(model_name, max_new_tokens, temperature)
 
     raise RuntimeError(f"Unsupported LLM_PROVIDER for LangChain: {provider}")
+
+
+class LocalHFLLM(LLM):
+    """
+    LangChain LLM over apps.qa.services.llm.HuggingFaceLLM, so both paths
+    share one loaded model and its encoded instruction prefixes.
+    """
+
+    model: str
+    max_new_tokens: int = 128
+    temperature: float = 0.2
+
+    @property
+    def _llm_type(self) -> str:
+        return "hf-local"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> str:
+        # the model is already loaded: this only checks it under the lock
+        cfg = HFConfig(model_name=self.model, max_new_tokens=self.max_new_tokens, temperature=self.temperature)
+        text = HuggingFaceLLM(cfg).generate(prompt)
+        for token in stop or []:
+            text = text.split(token, 1)[0]
+        return text
+
+
+def _get_hf_llm(model_name: str, max_new_tokens: int, temperature: float):
+    """
+    The model is loaded once per process and configuration, not per request.
+    """
+    global _hf_llm, _hf_key
+
+    key = (model_name, max_new_tokens, temperature)
+    with _hf_lock:
+        if _hf_llm is not None and _hf_key == key:
+            return _hf_llm
+
+        HuggingFaceLLM(HFConfig(model_name=model_name, max_new_tokens=max_new_tokens, temperature=temperature))
+        _hf_llm = LocalHFLLM(model=model_name, max_new_tokens=max_new_tokens, temperature=temperature)
+        _hf_key = key
+        return _hf_llm
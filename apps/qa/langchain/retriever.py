@@ -1,35 +1,55 @@
 from __future__ import annotations
 
-from typing import List
+from typing import List, Optional, Sequence
 
 from langchain_core.documents import Document as LCDocument
 from langchain_core.retrievers import BaseRetriever
 
-from apps.documents.services.retrieval import retrieve_top_k
+from apps.documents.services.retrieval import RetrievalResult, retrieve_top_k
+
+
+def to_langchain_documents(results: Sequence[RetrievalResult]) -> List[LCDocument]:
+    """
+    LangChain Documents for ranked retrieval results, with citation metadata.
+    """
+    docs = []
+    for idx, r in enumerate(results, start=1):
+        d = r.document
+        docs.append(
+            LCDocument(
+                page_content=(d.content or ""),
+                metadata={
+                    "document_id": d.id,
+                    "title": d.title,
+                    "score": float(r.score),
+                    "rank": idx,
+                },
+            )
+        )
+    return docs
+
 
 class TfidfDBRetriever(BaseRetriever):
     """
-    LangChain Retriever Wrapper around our existing TF-IDF retrieve_top_k().
+    LangChain Retriever Wrapper around our existing retrieve_top_k().
     It returns LangChain Documents with metadata for citations.
+
+    `engine` overrides settings.RETRIEVAL_ENGINE (e.g. "bm25", "dense").
+    `tags` / `tags_mode` scope retrieval to tagged documents; both can
+    also be passed per call: `retriever.invoke(query, tags=[...])`.
     """
 
     k: int = 3
-    def _get_relevant_documents(self, query):
-        results = retrieve_top_k(query, k = self.k)
-
-        docs = []
-        for idx, r in enumerate(results, start= 1):
-            d = r.document
-            docs.append(
-                LCDocument(
-                    page_content=(d.content or ""),
-                    metadata={
-                        "document_id": d.id,
-                        "title": d.title,
-                        "score": float(r.score),
-                        "rank": idx,
-                    },
-                )
-            )
-        return docs
+    engine: Optional[str] = None
+    tags: List[str] = []
+    tags_mode: str = "any"
+    def _get_relevant_documents(self, query, *, run_manager=None, tags=None, tags_mode=None):
+        results = retrieve_top_k(
+            query,
+            k = self.k,
+            engine = self.engine,
+            tags = self.tags if tags is None else tags,
+            tags_mode = tags_mode or self.tags_mode,
+        )
+        return to_langchain_documents(results)
         
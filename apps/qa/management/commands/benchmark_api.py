@@ -0,0 +1,100 @@
+import copy
+import io
+import time
+
+import orjson
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework import serializers
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from apps.qa.api import RetrieveAPIView
+from apps.qa.parsers import ORJSONParser
+from apps.qa.renderers import ORJSONRenderer
+from apps.qa.serializers import RetrievalRequestSerializer
+
+# Same fields as RetrievalRequestSerializer, validated by DRF only
+PlainRetrievalRequestSerializer = type(
+    "PlainRetrievalRequestSerializer",
+    (serializers.Serializer,),
+    copy.deepcopy(RetrievalRequestSerializer._declared_fields),
+)
+
+
+def _time_us(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's default JSON parser/renderer and serializer validation "
+        "with the orjson renderer/parser and lean validation used by the QA "
+        "endpoints, per component and end to end on /api/retrieve/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--question", default="How do I filter a queryset with the Django ORM?")
+
+    def handle(self, *args, **options):
+        n = options["iterations"]
+        k = options["k"]
+        payload = {"question": options["question"], "k": k, "tags": [], "tags_mode": "any"}
+        body = orjson.dumps(payload)
+        response = {
+            "question": payload["question"],
+            "k": k,
+            "results": [
+                {"rank": i, "document_id": 1000 + i, "title": f"Document title {i}", "score": 1.0 / i}
+                for i in range(1, k + 1)
+            ],
+            "timings": {"retrieval_ms": 1.234, "rerank_ms": 0.0, "reranked": False, "cached": True},
+        }
+
+        rows = [
+            (
+                "parse request",
+                lambda: JSONParser().parse(io.BytesIO(body)),
+                lambda: ORJSONParser().parse(io.BytesIO(body)),
+            ),
+            (
+                "validate request",
+                lambda: PlainRetrievalRequestSerializer(data=payload).is_valid(raise_exception=True),
+                lambda: RetrievalRequestSerializer(data=payload).is_valid(raise_exception=True),
+            ),
+            (
+                "render response",
+                lambda: JSONRenderer().render(response),
+                lambda: ORJSONRenderer().render(response),
+            ),
+        ]
+
+        factory = RequestFactory()
+        default_view = RetrieveAPIView.as_view(
+            renderer_classes=[JSONRenderer],
+            parser_classes=[JSONParser],
+            serializer_class=PlainRetrievalRequestSerializer,
+        )
+        qa_view = RetrieveAPIView.as_view()
+
+        def call(view):
+            def run():
+                request = factory.post("/api/retrieve/", data=body, content_type="application/json")
+                view(request).render()
+            return run
+
+        # retrieval results are cached after the first call, so the end-to-end
+        # row measures the request/response overhead around a cache hit
+        rows.append(("POST /api/retrieve/", call(default_view), call(qa_view)))
+
+        self.stdout.write(f"{n} iterations, k={k} (microseconds per call)")
+        self.stdout.write(f"{'':<22} {'DRF default':>12} {'QA endpoints':>13} {'speedup':>8}")
+        for name, baseline, fast in rows:
+            base_us, fast_us = _time_us(baseline, n), _time_us(fast, n)
+            self.stdout.write(f"{name:<22} {base_us:>12.1f} {fast_us:>13.1f} {base_us / fast_us:>7.2f}x")
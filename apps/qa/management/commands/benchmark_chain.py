@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnableMap, RunnablePassthrough
+
+from apps.qa.langchain.chain import _format_docs, get_rag_chain
+from apps.qa.langchain.llm import get_langchain_llm
+from apps.qa.langchain.retriever import TfidfDBRetriever
+from apps.qa.services.prompts import RAG_TEMPLATE
+
+
+def _build_per_request_chain(llm, k, tags, tags_mode):
+    """
+    The chain as it used to be built for every request.
+    """
+    retriever = TfidfDBRetriever(k=k, tags=list(tags), tags_mode=tags_mode)
+    prompt = PromptTemplate.from_template(RAG_TEMPLATE)
+    base = RunnableMap({"question": RunnablePassthrough(), "context_docs": retriever})
+    add_context = RunnableMap(
+        {
+            "question": RunnableLambda(lambda x: x["question"]),
+            "context_docs": RunnableLambda(lambda x: x["context_docs"]),
+            "context": RunnableLambda(lambda x: _format_docs(x["context_docs"])),
+        }
+    )
+    final = RunnableMap(
+        {
+            "answer": prompt | llm | StrOutputParser(),
+            "context": RunnableLambda(lambda x: x["context_docs"]),
+        }
+    )
+    return base | add_context | final
+
+
+def _time_us(fn, iterations):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare building the RAG chain for every request with the cached "
+        "chain registry: construction and invocation cost per request with "
+        "the configured LLM (retrieval results are cached after the first call)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500)
+        parser.add_argument("--k", type=int, default=3)
+        parser.add_argument("--question", default="How do I filter a queryset with the Django ORM?")
+
+    def handle(self, *args, **options):
+        n, k, question = options["iterations"], options["k"], options["question"]
+        tags, tags_mode = [], "any"
+
+        llm = get_langchain_llm()
+        per_request = _build_per_request_chain(llm, k, tags, tags_mode)
+        cached, _ = get_rag_chain(k=k)
+        inputs = {"question": question, "tags": tags, "tags_mode": tags_mode}
+
+        rows = [
+            (
+                "construct",
+                lambda: _build_per_request_chain(get_langchain_llm(), k, tags, tags_mode),
+                lambda: get_rag_chain(k=k),
+            ),
+            ("invoke", lambda: per_request.invoke(question), lambda: cached.invoke(inputs)),
+            (
+                "construct + invoke",
+                lambda: _build_per_request_chain(get_langchain_llm(), k, tags, tags_mode).invoke(question),
+                lambda: get_rag_chain(k=k)[0].invoke(inputs),
+            ),
+        ]
+
+        self.stdout.write(f"{n} iterations, k={k}, llm={getattr(llm, 'model', '') or type(llm).__name__} (microseconds per request)")
+        self.stdout.write(f"{'':<20} {'per request':>12} {'registry':>10} {'speedup':>8}")
+        for name, baseline, fast in rows:
+            base_us, fast_us = _time_us(baseline, n), _time_us(fast, n)
+            self.stdout.write(f"{name:<20} {base_us:>12.1f} {fast_us:>10.1f} {base_us / fast_us:>7.2f}x")
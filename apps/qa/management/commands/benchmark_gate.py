@@ -0,0 +1,87 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from langchain_core.output_parsers import StrOutputParser
+
+from apps.qa.langchain.chain import RAG_PROMPT, _format_docs
+from apps.qa.langchain.llm import get_langchain_llm
+from apps.qa.langchain.retriever import TfidfDBRetriever
+from apps.qa.models import Question
+from apps.qa.services.confidence import ConfidenceGate
+from apps.qa.services.prompts import REFUSAL_TEXT
+
+
+def _floats(value):
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run retrieval and the LLM on a query mix (stored questions by default) "
+        "and report, per confidence-gate setting, how many questions the gate "
+        "refuses, the LLM time that saves and how often the LLM would have "
+        "refused them anyway."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", help="File with one query per line (default: the latest stored questions).")
+        parser.add_argument("--n-queries", type=int, default=100)
+        parser.add_argument("--k", type=int, default=None, help="Documents per question (default: RETRIEVAL_TOP_K).")
+        parser.add_argument(
+            "--min-top-score",
+            default=str(getattr(settings, "QA_MIN_TOP_SCORE", 0.0)),
+            help="Comma-separated QA_MIN_TOP_SCORE values to compare.",
+        )
+        parser.add_argument(
+            "--min-score-gap",
+            default=str(getattr(settings, "QA_MIN_SCORE_GAP", 0.0)),
+            help="Comma-separated QA_MIN_SCORE_GAP values to compare.",
+        )
+
+    def handle(self, *args, **options):
+        n = options["n_queries"]
+        if options["queries"]:
+            with open(options["queries"], encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()][:n]
+        else:
+            queries = list(dict.fromkeys(Question.objects.values_list("text", flat=True)[: n * 2]))[:n]
+        if not queries:
+            raise CommandError("No queries: pass --queries or store some questions first.")
+
+        k = options["k"] or int(getattr(settings, "RETRIEVAL_TOP_K", 3))
+        retriever = TfidfDBRetriever(k=k)
+        answer = RAG_PROMPT | get_langchain_llm() | StrOutputParser()
+
+        # one retrieval and one (ungated) generation per query; every gate
+        # setting is then evaluated on the same scores and timings
+        runs = []
+        for query in queries:
+            docs = retriever.invoke(query)
+            started = time.perf_counter()
+            text = answer.invoke({"question": query, "context": _format_docs(docs)})
+            llm_ms = (time.perf_counter() - started) * 1000
+            runs.append(([d.metadata["score"] for d in docs], llm_ms, text.strip() == REFUSAL_TEXT))
+
+        total_ms = sum(ms for _, ms, _ in runs)
+        llm_refused = sum(refused for _, _, refused in runs)
+        self.stdout.write(
+            f"{len(runs)} queries, k={k}, LLM total {total_ms:.0f} ms "
+            f"({total_ms / len(runs):.1f} ms/query), LLM refused {llm_refused}"
+        )
+        self.stdout.write(
+            f"{'min top':>8} {'min gap':>8} {'gated':>6} {'gated %':>8} {'saved ms':>10} {'saved %':>8} "
+            f"{'LLM agreed':>11} {'LLM refused, not gated':>23}"
+        )
+        for min_top in _floats(options["min_top_score"]):
+            for min_gap in _floats(options["min_score_gap"]):
+                gate = ConfidenceGate(min_top_score=min_top, min_score_gap=min_gap)
+                gated = [bool(gate.refusal_reason(scores)) for scores, _, _ in runs]
+                saved_ms = sum(ms for (_, ms, _), g in zip(runs, gated) if g)
+                agreed = sum(refused for (_, _, refused), g in zip(runs, gated) if g)
+                missed = sum(refused for (_, _, refused), g in zip(runs, gated) if not g)
+                self.stdout.write(
+                    f"{min_top:>8.3f} {min_gap:>8.3f} {sum(gated):>6} {100 * sum(gated) / len(runs):>7.1f}% "
+                    f"{saved_ms:>10.0f} {100 * saved_ms / total_ms if total_ms else 0.0:>7.1f}% "
+                    f"{agreed:>11} {missed:>23}"
+                )
@@ -0,0 +1,142 @@
+import contextlib
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from apps.documents.services.evaluation import percentiles
+from apps.qa.langchain.chain import RAG_PROMPT, _format_docs
+from apps.qa.langchain.retriever import TfidfDBRetriever
+from apps.qa.models import Question
+from apps.qa.services import llm as local_llm
+
+# Named inference modes; the first mode of a run is the reference the
+# answers of every other mode are compared against.
+MODES = {
+    "float32": {"LLM_QUANTIZATION": "none"},
+    "int8": {"LLM_QUANTIZATION": "int8"},
+}
+
+
+@contextlib.contextmanager
+def _mode_overrides(overrides):
+    """
+    Applies a mode's LLM_* values to both settings and the environment
+    (the environment wins in services.llm).
+    """
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update({name: str(value) for name, value in overrides.items()})
+    try:
+        with override_settings(**overrides):
+            yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _split(value):
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _token_f1(reference: str, candidate: str) -> float:
+    ref, cand = reference.split(), candidate.split()
+    if not ref or not cand:
+        return float(ref == cand)
+    common = sum((Counter(ref) & Counter(cand)).values())
+    if not common:
+        return 0.0
+    precision, recall = common / len(cand), common / len(ref)
+    return 2 * precision * recall / (precision + recall)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the local HF model in several CPU inference modes and report "
+        "load time, generation latency, tokens/sec and answer drift against "
+        "the first mode, on RAG prompts built from real questions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--modes",
+            default="float32,int8",
+            help=f"Comma-separated inference modes ({', '.join(MODES)}); the first is the reference.",
+        )
+        parser.add_argument("--threads", type=int, default=None, help="LLM_NUM_THREADS for every mode.")
+        parser.add_argument("--model", default=None, help="Model name (default: LLM_MODEL_NAME).")
+        parser.add_argument("--queries", help="File with one query per line (default: the latest stored questions).")
+        parser.add_argument("--n-queries", type=int, default=20)
+        parser.add_argument("--k", type=int, default=None, help="Documents per prompt (default: RETRIEVAL_TOP_K).")
+        parser.add_argument("--max-new-tokens", type=int, default=None)
+        parser.add_argument("--temperature", type=float, default=0.0, help="0 = greedy, comparable across modes.")
+
+    def handle(self, *args, **options):
+        modes = _split(options["modes"])
+        unknown = [m for m in modes if m not in MODES]
+        if unknown or not modes:
+            raise CommandError(f"Unknown modes: {', '.join(unknown) or '(none)'}")
+
+        n = options["n_queries"]
+        if options["queries"]:
+            with open(options["queries"], encoding="utf-8") as f:
+                queries = [line.strip() for line in f if line.strip()][:n]
+        else:
+            queries = list(dict.fromkeys(Question.objects.values_list("text", flat=True)[: n * 2]))[:n]
+        if not queries:
+            raise CommandError("No queries: pass --queries or store some questions first.")
+
+        retriever = TfidfDBRetriever(k=options["k"] or int(getattr(settings, "RETRIEVAL_TOP_K", 3)))
+        prompts = [
+            RAG_PROMPT.format(question=q, context=_format_docs(retriever.invoke(q))) for q in queries
+        ]
+        cfg = local_llm.HFConfig(
+            model_name=options["model"] or getattr(settings, "LLM_MODEL_NAME", "google/flan-t5-base"),
+            max_new_tokens=options["max_new_tokens"] or int(getattr(settings, "LLM_MAX_NEW_TOKENS", 256)),
+            temperature=options["temperature"],
+        )
+
+        # imported up front so the first load time measures loading only
+        import torch  # noqa: F401
+        import transformers  # noqa: F401
+
+        self.stdout.write(f"{cfg.model_name}, {len(prompts)} prompts, max_new_tokens={cfg.max_new_tokens}")
+        self.stdout.write(
+            f"{'mode':<8} {'load ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'tokens/s':>9} {'exact':>6} {'token F1':>9}"
+        )
+
+        reference = None
+        for mode in modes:
+            overrides = dict(MODES[mode])
+            if options["threads"] is not None:
+                overrides["LLM_NUM_THREADS"] = options["threads"]
+
+            with _mode_overrides(overrides):
+                local_llm._hf_model = None
+                started = time.perf_counter()
+                llm = local_llm.HuggingFaceLLM(cfg)
+                load_ms = (time.perf_counter() - started) * 1000
+
+                llm.generate_ids(prompts[0])
+                answers, latencies, n_tokens = [], [], 0
+                for prompt in prompts:
+                    started = time.perf_counter()
+                    ids = llm.generate_ids(prompt)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    n_tokens += int(ids.numel())
+                    answers.append(local_llm._hf_tokenizer.decode(ids, skip_special_tokens=True).strip())
+
+            if reference is None:
+                reference = answers
+            exact = sum(r == a for r, a in zip(reference, answers)) / len(answers)
+            f1 = sum(_token_f1(r, a) for r, a in zip(reference, answers)) / len(answers)
+            p50, p95 = percentiles(latencies, (50, 95))
+            self.stdout.write(
+                f"{mode:<8} {load_ms:>9.0f} {p50:>9.1f} {p95:>9.1f} "
+                f"{n_tokens / (sum(latencies) / 1000):>9.1f} {exact:>6.2f} {f1:>9.3f}"
+            )
@@ -0,0 +1,368 @@
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+import orjson
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test.utils import override_settings
+
+from apps.documents.services.evaluation import overlap_at_k, percentiles, rank_correlation
+from apps.documents.services.retrieval import (
+    build_index,
+    get_engine_name,
+    resolve_allowed,
+    retrieve_top_k,
+    retrieve_top_k_timed,
+)
+from apps.qa.services.answer_generation import generate_answer_for_question
+
+ENDPOINTS = {"retrieve": "/api/retrieve/", "ask": "/api/qa/ask/"}
+
+
+@dataclass
+class ReplayRequest:
+    endpoint: str
+    question: str
+    k: int
+    tags: List[str]
+    tags_mode: str
+
+    def payload(self) -> dict:
+        return {"question": self.question, "k": self.k, "tags": self.tags, "tags_mode": self.tags_mode}
+
+
+@dataclass
+class ReplayOutcome:
+    request: ReplayRequest
+    latency_ms: float
+    error: str = ""
+    cached: Optional[bool] = None  # retrieve only
+    status: str = ""  # ask only: Answer.status
+    ranking: List[int] = field(default_factory=list)  # retrieve only: document ids
+
+
+def _read_requests(path, default_endpoint, default_k, limit, skipped: Counter):
+    """
+    Streams replayable requests from a jsonl file, one JSON object per line:
+    {"endpoint": "retrieve" | "ask", "question": str, "k": int, "tags": [...], "tags_mode": "any" | "all"}
+    (only "question", or "query", is required).
+    """
+    n = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if limit and n >= limit:
+                return
+            if not line.strip():
+                continue
+            try:
+                obj = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                skipped["invalid json"] += 1
+                continue
+
+            question = (obj.get("question") or obj.get("query")) if isinstance(obj, dict) else None
+            endpoint = (obj.get("endpoint") or default_endpoint) if isinstance(obj, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                skipped["no question"] += 1
+                continue
+            if endpoint not in ENDPOINTS:
+                skipped[f"unknown endpoint {endpoint}"] += 1
+                continue
+            try:
+                k = int(obj.get("k") or default_k)
+            except (TypeError, ValueError):
+                skipped["invalid k"] += 1
+                continue
+            tags = obj.get("tags") or []
+            if isinstance(tags, str):
+                tags = [tags]
+            if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+                skipped["invalid tags"] += 1
+                continue
+
+            n += 1
+            yield ReplayRequest(
+                endpoint=endpoint,
+                question=question,
+                k=k,
+                tags=tags,
+                tags_mode=obj.get("tags_mode") or "any",
+            )
+
+
+def _run_in_process(request: ReplayRequest) -> ReplayOutcome:
+    started = time.perf_counter()
+    try:
+        if request.endpoint == "retrieve":
+            results, timings = retrieve_top_k_timed(
+                request.question, k=request.k, tags=request.tags, tags_mode=request.tags_mode
+            )
+            return ReplayOutcome(
+                request,
+                (time.perf_counter() - started) * 1000,
+                cached=timings.cached,
+                ranking=[r.document.id for r in results],
+            )
+
+        # same arguments as the ask endpoint
+        top_k = int(getattr(settings, "RETRIEVAL_TOP_K", request.k) or request.k)
+        answer = generate_answer_for_question(
+            request.question,
+            top_k=top_k,
+            max_context_chars=int(getattr(settings, "MAX_CONTEXT_CHARS", 1500)),
+            tags=request.tags,
+            tags_mode=request.tags_mode,
+        )
+        error = (answer.error_message or "answer failed") if answer.status == "failed" else ""
+        return ReplayOutcome(request, (time.perf_counter() - started) * 1000, error=error, status=str(answer.status))
+    except Exception as e:
+        return ReplayOutcome(request, (time.perf_counter() - started) * 1000, error=f"{type(e).__name__}: {e}")
+    finally:
+        close_old_connections()
+
+
+def _run_over_http(base_url: str, timeout: float):
+    def run(request: ReplayRequest) -> ReplayOutcome:
+        http_request = urllib.request.Request(
+            base_url.rstrip("/") + ENDPOINTS[request.endpoint],
+            data=orjson.dumps(request.payload()),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+            method="POST",
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(http_request, timeout=timeout) as response:
+                body = orjson.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return ReplayOutcome(request, (time.perf_counter() - started) * 1000, error=f"HTTP {e.code}")
+        except Exception as e:
+            return ReplayOutcome(request, (time.perf_counter() - started) * 1000, error=f"{type(e).__name__}: {e}")
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if request.endpoint == "retrieve":
+            return ReplayOutcome(
+                request,
+                latency_ms,
+                cached=bool((body.get("timings") or {}).get("cached")),
+                ranking=[r["document_id"] for r in body.get("results") or []],
+            )
+        status = body.get("status", "")
+        return ReplayOutcome(request, latency_ms, error="answer failed" if status == "failed" else "", status=status)
+
+    return run
+
+
+def _coerce_setting(name: str, value: str):
+    """
+    Parses a --compare-setting value into the type of the current setting.
+    """
+    current = getattr(settings, name, None)
+    if isinstance(current, bool):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    if isinstance(current, int):
+        return int(value)
+    if isinstance(current, float):
+        return float(value)
+    if isinstance(current, list):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a jsonl file of retrieve/ask requests in-process or against a "
+        "running server with configurable concurrency, and report latency "
+        "percentiles, throughput, cache hit ratio and failures. Optionally "
+        "compare the retrieval rankings with another engine or configuration "
+        "(overlap@k and rank correlation)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="jsonl file, one request per line.")
+        parser.add_argument("--mode", choices=("inprocess", "http"), default="inprocess")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Server for --mode http.")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s) for --mode http.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--endpoint", choices=tuple(ENDPOINTS), default="retrieve", help="For lines without one.")
+        parser.add_argument("--k", type=int, default=5, help="For lines without one.")
+        parser.add_argument("--limit", type=int, default=0, help="Replay at most this many requests (0 = all).")
+        parser.add_argument("--report", help="Also write the report as JSON to this file.")
+        parser.add_argument(
+            "--compare-engine",
+            help="Rank every replayed retrieval again with this engine (default: RETRIEVAL_ENGINE).",
+        )
+        parser.add_argument(
+            "--compare-setting",
+            action="append",
+            default=[],
+            metavar="NAME=VALUE",
+            help="Setting override for the comparison ranking, e.g. RETRIEVAL_INDEX_DTYPE=uint8 (repeatable).",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options["concurrency"])
+        compare = bool(options["compare_engine"] or options["compare_setting"])
+        run = _run_in_process if options["mode"] == "inprocess" else _run_over_http(options["base_url"], options["timeout"])
+
+        skipped: Counter = Counter()
+        requests = _read_requests(options["path"], options["endpoint"], options["k"], options["limit"], skipped)
+        outcomes: List[ReplayOutcome] = []
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="replay") as pool:
+            # a bounded number of requests in flight: the file is streamed, not loaded
+            pending = set()
+            for request in requests:
+                if len(pending) >= 2 * concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    outcomes.extend(f.result() for f in done)
+                pending.add(pool.submit(run, request))
+            outcomes.extend(f.result() for f in wait(pending).done)
+        wall_s = time.perf_counter() - started
+
+        if not outcomes:
+            raise CommandError(f"No requests replayed (skipped: {dict(skipped) or 'none'}).")
+
+        report = self._summarize(outcomes, skipped, wall_s, options, concurrency)
+        if compare:
+            report["comparison"] = self._compare(outcomes, options)
+
+        self._print(report)
+        if options["report"]:
+            with open(options["report"], "wb") as f:
+                f.write(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+            self.stdout.write(f"Report written to {options['report']}")
+
+    def _summarize(self, outcomes, skipped, wall_s, options, concurrency) -> dict:
+        by_endpoint = defaultdict(list)
+        for outcome in outcomes:
+            by_endpoint[outcome.request.endpoint].append(outcome)
+
+        endpoints = {}
+        for endpoint, items in by_endpoint.items():
+            latencies = [o.latency_ms for o in items]
+            p50, p95, p99 = percentiles(latencies, (50, 95, 99))
+            summary = {
+                "requests": len(items),
+                "failures": sum(bool(o.error) for o in items),
+                "latency_ms": {
+                    "mean": float(np.mean(latencies)),
+                    "p50": p50,
+                    "p95": p95,
+                    "p99": p99,
+                    "max": float(np.max(latencies)),
+                },
+            }
+            answered = [o for o in items if not o.error]
+            if endpoint == "retrieve":
+                summary["cache_hit_ratio"] = (
+                    sum(bool(o.cached) for o in answered) / len(answered) if answered else 0.0
+                )
+            else:
+                summary["statuses"] = dict(Counter(o.status for o in items if o.status))
+            endpoints[endpoint] = summary
+
+        return {
+            "mode": options["mode"],
+            "concurrency": concurrency,
+            "requests": len(outcomes),
+            "skipped": dict(skipped),
+            "wall_s": wall_s,
+            "throughput_rps": len(outcomes) / wall_s if wall_s else 0.0,
+            "endpoints": endpoints,
+            "errors": dict(Counter(o.error for o in outcomes if o.error).most_common(10)),
+        }
+
+    def _compare(self, outcomes, options) -> dict:
+        """
+        Ranks the replayed retrieval requests again under the comparison
+        engine/settings and compares with the rankings the replay returned.
+        """
+        overrides = {}
+        for spec in options["compare_setting"]:
+            name, sep, value = spec.partition("=")
+            if not sep or not name.strip():
+                raise CommandError(f"Invalid --compare-setting {spec!r}, expected NAME=VALUE")
+            overrides[name.strip()] = _coerce_setting(name.strip(), value)
+
+        engine = (options["compare_engine"] or overrides.get("RETRIEVAL_ENGINE") or "").lower() or None
+        replayed = [o for o in outcomes if o.request.endpoint == "retrieve" and not o.error]
+
+        with override_settings(**overrides):
+            index = None
+            if overrides and engine != "hybrid":
+                # a fresh index: the shared one and the result cache are keyed
+                # by engine only and would not reflect the overrides
+                index = build_index(engine or get_engine_name(), "replay-compare")
+            elif overrides:
+                raise CommandError("--compare-setting is not supported with the hybrid engine.")
+
+            rankings = []
+            for o in replayed:
+                r = o.request
+                if index is not None:
+                    hits = index.search(r.question, r.k, resolve_allowed(index, r.tags, r.tags_mode))
+                    rankings.append([doc_id for doc_id, _ in hits])
+                else:
+                    results = retrieve_top_k(r.question, k=r.k, engine=engine, tags=r.tags, tags_mode=r.tags_mode)
+                    rankings.append([res.document.id for res in results])
+
+        overlaps, correlations, top1 = [], [], []
+        for o, candidate in zip(replayed, rankings):
+            overlaps.append(overlap_at_k(o.ranking, candidate, o.request.k))
+            correlation = rank_correlation(o.ranking, candidate)
+            if correlation is not None:
+                correlations.append(correlation)
+            top1.append(o.ranking[:1] == candidate[:1])
+
+        return {
+            "engine": engine or "(configured)",
+            "settings": dict(overrides),
+            "queries": len(replayed),
+            "overlap_at_k": float(np.mean(overlaps)) if overlaps else 1.0,
+            "rank_correlation": float(np.mean(correlations)) if correlations else None,
+            "rank_correlation_queries": len(correlations),
+            "top1_agreement": float(np.mean(top1)) if top1 else 1.0,
+        }
+
+    def _print(self, report: dict) -> None:
+        self.stdout.write(
+            f"{report['requests']} requests ({report['mode']}, concurrency {report['concurrency']}) in "
+            f"{report['wall_s']:.2f} s: {report['throughput_rps']:.1f} req/s"
+        )
+        if report["skipped"]:
+            self.stdout.write(f"skipped lines: {report['skipped']}")
+
+        self.stdout.write(
+            f"{'endpoint':<10} {'requests':>9} {'failures':>9} {'mean ms':>9} {'p50 ms':>9} "
+            f"{'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'cache hit':>10}"
+        )
+        for endpoint, s in report["endpoints"].items():
+            latency = s["latency_ms"]
+            hit = f"{s['cache_hit_ratio']:>10.1%}" if "cache_hit_ratio" in s else f"{'-':>10}"
+            self.stdout.write(
+                f"{endpoint:<10} {s['requests']:>9} {s['failures']:>9} {latency['mean']:>9.1f} {latency['p50']:>9.1f} "
+                f"{latency['p95']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f} {hit}"
+            )
+            if s.get("statuses"):
+                self.stdout.write(f"{'':<10} statuses: {s['statuses']}")
+
+        for error, count in report["errors"].items():
+            self.stdout.write(self.style.WARNING(f"{count:>6} x {error}"))
+
+        comparison = report.get("comparison")
+        if comparison:
+            correlation = comparison["rank_correlation"]
+            self.stdout.write(
+                f"vs engine={comparison['engine']} settings={comparison['settings']} on {comparison['queries']} "
+                f"retrievals: overlap@k {comparison['overlap_at_k']:.3f}, top1 {comparison['top1_agreement']:.3f}, "
+                f"rank correlation "
+                + (f"{correlation:.3f} ({comparison['rank_correlation_queries']} queries)" if correlation is not None else "n/a")
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.qa.services.warmup import run_warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the retrieval index, the reranker (when HYBRID_RERANK=1) and the LLM "
+        "and run one dummy generation, reporting timings."
+    )
+
+    def handle(self, *args, **options):
+        state = run_warmup()
+
+        for name, ms in state.timings_ms.items():
+            self.stdout.write(f"{name:>18}: {ms:10.1f} ms")
+
+        if state.status != "ready":
+            raise CommandError(f"Warm-up failed: {state.error}")
+
+        self.stdout.write(self.style.SUCCESS("Warm-up complete"))
@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-19 19:04
+
+from django.db import migrations, models
+
+
+# Admin search uses icontains, i.e. UPPER(col::text) LIKE UPPER('%term%') on Postgres;
+# a trigram GIN index on the same expression lets it skip the sequential scan.
+TRIGRAM_INDEXES = [
+    ('qa_question_text_trgm_idx', 'qa_question', 'text'),
+    ('qa_answer_text_trgm_idx', 'qa_answer', 'text'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0002_indexes'),
+        ('qa', '0002_answer_context_chars_answer_error_message_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['created_at'], name='qa_answer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['status', 'created_at'], name='qa_answer_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['created_at'], name='qa_question_created_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
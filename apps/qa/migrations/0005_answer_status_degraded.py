@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 19:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('qa', '0004_answer_status_refused'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('success', 'Success'), ('failed', 'Failed'), ('refused', 'Refused'), ('degraded', 'Degraded')], default='pending', max_length=10),
+        ),
+    ]
@@ -8,6 +8,9 @@ class Question(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='qa_question_created_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"Q#{self.id}"
@@ -18,6 +21,8 @@ class Answer(models.Model):
         PENDING = 'pending', 'Pending'
         SUCCESS = 'success', 'Success'
         FAILED = 'failed', 'Failed'
+        REFUSED = 'refused', 'Refused'
+        DEGRADED = 'degraded', 'Degraded'
 
     question = models.OneToOneField(Question, on_delete=models.CASCADE, related_name='answer')
     text = models.TextField()
@@ -38,6 +43,11 @@ class Answer(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='qa_answer_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='qa_answer_status_created_idx'),
+        ]
 
     def __str__(self) -> str:
-        return f"A#{self.id} for Q#{self.question.id} [{self.status}]"
+        # question_id avoids loading the question (N+1 in list views)
+        return f"A#{self.id} for Q#{self.question_id} [{self.status}]"
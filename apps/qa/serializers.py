@@ -1,7 +1,146 @@
+from django.core.validators import (
+    MaxLengthValidator,
+    MaxValueValidator,
+    MinLengthValidator,
+    MinValueValidator,
+)
 from rest_framework import serializers
+from rest_framework.fields import (
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+    empty,
+)
 
+_LEAN_VALIDATORS = (
+    MaxLengthValidator,
+    MinLengthValidator,
+    MaxValueValidator,
+    MinValueValidator,
+    ProhibitNullCharactersValidator,
+    ProhibitSurrogateCharactersValidator,
+)
 
-class RetrievalRequestSerializer(serializers.Serializer):
+
+class _Fallback(Exception):
+    pass
+
+
+def _lean_supported(field) -> bool:
+    if any(not isinstance(v, _LEAN_VALIDATORS) for v in field.validators):
+        return False
+    if isinstance(field, serializers.ListField):
+        return isinstance(field.child, serializers.CharField) and _lean_supported(field.child)
+    return isinstance(field, (serializers.ChoiceField, serializers.CharField)) or type(field) is serializers.IntegerField
+
+
+def _lean_value(field, value):
+    """
+    The validated value of a well-formed input; raises _Fallback for anything
+    DRF would reject or coerce.
+    """
+    if isinstance(field, serializers.ChoiceField):
+        if type(value) is not str or value not in field.choice_strings_to_values:
+            raise _Fallback
+        return field.choice_strings_to_values[value]
+
+    if isinstance(field, serializers.CharField):
+        if type(value) is not str or "\x00" in value:
+            raise _Fallback
+        if field.trim_whitespace:
+            value = value.strip()
+        if (
+            (not value and not field.allow_blank)
+            or (field.max_length is not None and len(value) > field.max_length)
+            or (field.min_length is not None and len(value) < field.min_length)
+        ):
+            raise _Fallback
+        try:
+            value.encode("utf-8")
+        except UnicodeEncodeError:  # lone surrogates
+            raise _Fallback
+        return value
+
+    if isinstance(field, serializers.ListField):
+        if (
+            type(value) is not list
+            or (not value and not field.allow_empty)
+            or (field.max_length is not None and len(value) > field.max_length)
+            or (field.min_length is not None and len(value) < field.min_length)
+        ):
+            raise _Fallback
+        return [_lean_value(field.child, v) for v in value]
+
+    # IntegerField
+    if type(value) is not int:
+        raise _Fallback
+    if (field.max_value is not None and value > field.max_value) or (
+        field.min_value is not None and value < field.min_value
+    ):
+        raise _Fallback
+    return value
+
+
+# Serializer for small flat JSON request bodies.
+#
+# is_valid() first checks the payload in plain Python against the declared
+# fields, without binding or copying them. Anything it does not accept
+# as-is (wrong types, coercible strings, out-of-range values, form data)
+# goes through normal DRF validation, so error responses are unchanged.
+# Only Char/Choice/Integer fields and lists of CharField with their
+# built-in validators take the fast path; other serializers always use DRF.
+# (A comment, not a docstring: drf-spectacular would publish an inherited
+# docstring as the description of every request schema.)
+class LeanRequestSerializer(serializers.Serializer):
+    _lean_fields = None
+
+    @classmethod
+    def _get_lean_fields(cls):
+        if cls.__dict__.get("_lean_fields") is None:
+            fields = cls._declared_fields
+            supported = (
+                cls.validate is serializers.Serializer.validate
+                and not any(hasattr(cls, f"validate_{name}") for name in fields)
+                and all(
+                    not f.read_only
+                    and f.source in (None, name)
+                    and not getattr(f.default, "requires_context", False)
+                    and _lean_supported(f)
+                    for name, f in fields.items()
+                )
+            )
+            cls._lean_fields = list(fields.items()) if supported else []
+        return cls._lean_fields
+
+    def _lean_validate(self, data):
+        fields = self._get_lean_fields()
+        if not fields or type(data) is not dict:
+            return None
+
+        validated = {}
+        try:
+            for name, field in fields:
+                value = data.get(name, empty)
+                if value is empty:
+                    if field.default is empty:
+                        return None
+                    validated[name] = field.default() if callable(field.default) else field.default
+                else:
+                    validated[name] = _lean_value(field, value)
+        except _Fallback:
+            return None
+        return validated
+
+    def is_valid(self, *, raise_exception=False):
+        if not hasattr(self, "_validated_data") and hasattr(self, "initial_data"):
+            validated = self._lean_validate(self.initial_data)
+            if validated is not None:
+                self._validated_data = validated
+                self._errors = {}
+                return True
+        return super().is_valid(raise_exception=raise_exception)
+
+
+class RetrievalRequestSerializer(LeanRequestSerializer):
     question = serializers.CharField(help_text="User question")
     k = serializers.IntegerField(
         required=False,
@@ -10,9 +149,22 @@ class RetrievalRequestSerializer(serializers.Serializer):
         max_value=20,
         help_text="Number of documents to retrieve",
     )
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=64),
+        required=False,
+        default=list,
+        max_length=20,
+        help_text="Only retrieve documents having these tag names",
+    )
+    tags_mode = serializers.ChoiceField(
+        choices=["any", "all"],
+        required=False,
+        default="any",
+        help_text="Match documents with any of the tags, or with all of them",
+    )
 
 
-class AskRequestSerializer(serializers.Serializer):
+class AskRequestSerializer(LeanRequestSerializer):
     question = serializers.CharField(help_text="User question")
     k = serializers.IntegerField(
         required=False,
@@ -21,6 +173,19 @@ class AskRequestSerializer(serializers.Serializer):
         max_value=20,
         help_text="Number of documents to use for retrieval",
     )
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=64),
+        required=False,
+        default=list,
+        max_length=20,
+        help_text="Only use documents having these tag names",
+    )
+    tags_mode = serializers.ChoiceField(
+        choices=["any", "all"],
+        required=False,
+        default="any",
+        help_text="Match documents with any of the tags, or with all of them",
+    )
 
 
 class AskSourceSerializer(serializers.Serializer):
@@ -31,9 +196,9 @@ class AskSourceSerializer(serializers.Serializer):
 
 
 class AskResponseSerializer(serializers.Serializer):
-    question_id = serializers.IntegerField(help_text="ID of the created question")
-    answer_id = serializers.IntegerField(help_text="ID of the generated answer")
-    status = serializers.CharField(help_text="Status of the answer generation")
+    question_id = serializers.IntegerField(allow_null=True, help_text="ID of the created question (null while a buffered write is pending)")
+    answer_id = serializers.IntegerField(allow_null=True, help_text="ID of the generated answer (null while a buffered write is pending)")
+    status = serializers.CharField(help_text="Status of the answer generation: success | failed | refused | degraded")
     answer = serializers.CharField(allow_blank=True, help_text="Generated answer text")
     sources = AskSourceSerializer(many=True, help_text="Retrieved sources used for answering")
     model_name = serializers.CharField(allow_blank=True, help_text="Name of the LLM model used")    
@@ -46,7 +211,22 @@ class RetrievalResultSerializer(serializers.Serializer):
     score = serializers.FloatField(help_text="Similarity score between question and document")
 
 
+class RetrievalTimingsSerializer(serializers.Serializer):
+    retrieval_ms = serializers.FloatField(help_text="Time spent retrieving and fusing candidates")
+    rerank_ms = serializers.FloatField(help_text="Time spent in the cross-encoder reranker (0 if not used)")
+    reranked = serializers.BooleanField(help_text="False when reranking was disabled or ran out of budget")
+    cached = serializers.BooleanField(help_text="Whether the result came from the retrieval cache")
+
+
 class RetrievalResponseSerializer(serializers.Serializer):
     question = serializers.CharField(help_text="The user question")
     k = serializers.IntegerField(help_text="Number of retrieved documents")
     results = RetrievalResultSerializer(many=True, help_text="Ranked retrieval results")
+    timings = RetrievalTimingsSerializer(help_text="Retrieval and rerank timings")
+
+
+class ReadinessSerializer(serializers.Serializer):
+    ready = serializers.BooleanField(help_text="True once the worker is warmed up (or warm-up is disabled)")
+    status = serializers.CharField(help_text="pending | running | ready | failed | disabled")
+    timings_ms = serializers.DictField(child=serializers.FloatField(), help_text="Duration of each warm-up phase")
+    error = serializers.CharField(allow_blank=True, help_text="Warm-up error, if any")
@@ -1,14 +1,114 @@
 from __future__ import annotations
 
 import time
+from typing import Optional, Sequence
+
 from django.db import transaction
 
+from apps.documents.services.retrieval import RetrievalResult
 from apps.qa.models import Answer, Question
-from apps.qa.langchain.llm import get_langchain_llm
-from apps.qa.langchain.chain import build_rag_chain
+from apps.qa.services.context import extractive_answer
+from apps.qa.services.deadline import current_deadline, deadline_scope, request_deadline
+from apps.qa.services.persistence import (
+    PERSIST_BUFFERED,
+    PERSIST_EAGER,
+    QARecord,
+    add_sources,
+    get_buffered_writer,
+    get_persistence_mode,
+    persist_record,
+)
+from apps.qa.services.prompts import RAG_PROMPT_VERSION, REFUSAL_TEXT
+
+PROMPT_VERSION = RAG_PROMPT_VERSION
+
+
+def _run_chain(
+    record: QARecord,
+    max_context_chars: int,
+    tags: Sequence[str] | None,
+    tags_mode: str,
+    results: Optional[Sequence[RetrievalResult]] = None,
+) -> None:
+    # LangChain (and transformers for the hf provider) load on first use
+    from apps.qa.langchain.chain import get_rag_chain
+    from apps.qa.langchain.retriever import to_langchain_documents
+
+    chain, llm = get_rag_chain(k=record.retrieval_top_k)
+    inputs = {"question": record.question_text, "tags": list(tags or []), "tags_mode": tags_mode}
+    if results is not None:
+        inputs["context_docs"] = to_langchain_documents(results)
+    # retrieval and generation share one deadline (QA_DEADLINE_MS); a caller
+    # that retrieved first has opened it already
+    with deadline_scope(current_deadline() or request_deadline()):
+        out = chain.invoke(inputs)
+    ctx_docs = out.get("context") or []
+
+    record.text = (out.get("answer") or "").strip()
+    record.status = Answer.Status.SUCCESS
+    record.error_message = ""
+    if out.get("refused"):
+        # the confidence gate answered without invoking the model
+        record.status = Answer.Status.REFUSED
+    elif out.get("fallback"):
+        # out of time: answer with the top retrieved passages instead
+        record.text = extractive_answer(
+            [(d.metadata.get("title", ""), d.page_content) for d in ctx_docs], max_context_chars
+        ) or REFUSAL_TEXT
+        record.status = Answer.Status.DEGRADED
+        record.error_message = out["fallback"]
+    record.model_name = getattr(llm, "model", "") or getattr(llm, "_llm_type", "") or "langchain"
+    record.context_chars = min(max_context_chars, len("".join([d.page_content for d in ctx_docs])))
+    record.source_ids = [
+        int(d.metadata["document_id"]) for d in ctx_docs if d.metadata.get("document_id")
+    ]
+
+
+def generate_answer_for_question(
+    question_text: str,
+    top_k: int,
+    max_context_chars: int,
+    tags: Sequence[str] | None = None,
+    tags_mode: str = "any",
+    results: Optional[Sequence[RetrievalResult]] = None,
+) -> Answer:
+    """
+    Runs the RAG chain and persists the Question/Answer according to
+    settings.QA_PERSISTENCE_MODE:
+    - eager: PENDING row first, updated after generation (default)
+    - deferred: everything written in one transaction after generation
+    - buffered: handed to a background writer; the returned Answer is unsaved
+
+    `results` are the question's top_k retrieval results when the caller
+    has them already; the chain then answers from them without retrieving.
+    """
+    mode = get_persistence_mode()
+    if mode == PERSIST_EAGER:
+        return _generate_eager(question_text, top_k, max_context_chars, tags, tags_mode, results)
+
+    started = time.perf_counter()
+    record = QARecord(question_text=question_text, retrieval_top_k=top_k, prompt_version=PROMPT_VERSION)
+
+    try:
+        _run_chain(record, max_context_chars, tags, tags_mode, results)
+    except Exception as e:
+        record.status = Answer.Status.FAILED
+        record.error_message = str(e)
+    record.latency_ms = int((time.perf_counter() - started) * 1000)
+
+    if mode == PERSIST_BUFFERED:
+        return get_buffered_writer().submit(record)
+    return persist_record(record)
 
 
-def generate_answer_for_question(question_text: str, top_k: int, max_context_chars: int) -> Answer:
+def _generate_eager(
+    question_text: str,
+    top_k: int,
+    max_context_chars: int,
+    tags: Sequence[str] | None,
+    tags_mode: str,
+    results: Optional[Sequence[RetrievalResult]],
+) -> Answer:
     started = time.perf_counter()
 
     with transaction.atomic():
@@ -17,36 +117,25 @@ def generate_answer_for_question(question_text: str, top_k: int, max_context_cha
             question=q,
             status=Answer.Status.PENDING,
             retrieval_top_k=top_k,
-            prompt_version="langchain-v1",
+            prompt_version=PROMPT_VERSION,
         )
 
+    record = QARecord(question_text=question_text, retrieval_top_k=top_k, prompt_version=PROMPT_VERSION)
     try:
-        llm = get_langchain_llm()
-        chain = build_rag_chain(llm, k=top_k)
-
-        # invoke expects dict with "input"
-        out = chain.invoke(question_text)
-        answer_text = (out.get("answer") or "").strip()
-        ctx_docs = out.get("context") or []
-        used_ids = []
-        for d in ctx_docs:
-            doc_id = d.metadata.get("document_id")
-            if doc_id:
-                used_ids.append(int(doc_id))
+        _run_chain(record, max_context_chars, tags, tags_mode, results)
 
         latency_ms = int((time.perf_counter() - started) * 1000)
 
         with transaction.atomic():
-            a.text = answer_text
-            a.status = Answer.Status.SUCCESS
-            a.model_name = getattr(llm, "model", "") or getattr(llm, "_llm_type", "") or "langchain"
-            a.context_chars = min(max_context_chars, len("".join([d.page_content for d in ctx_docs])))
+            a.text = record.text
+            a.status = record.status
+            a.model_name = record.model_name
+            a.context_chars = record.context_chars
             a.latency_ms = latency_ms
-            a.error_message = ""
+            a.error_message = record.error_message
             a.save(update_fields=["text", "status", "model_name", "context_chars", "latency_ms", "error_message"])
 
-            if used_ids:
-                a.source_documents.set(used_ids)
+            add_sources([a], [record.source_ids])
 
         return a
 
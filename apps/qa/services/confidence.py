@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from django.conf import settings
+
+
+@dataclass(frozen=True)
+class ConfidenceGate:
+    """
+    Decides from retrieval scores alone whether generation is worth running.
+
+    Scores are on the scale of the retrieval engine (cosine for tfidf and
+    dense, unbounded for bm25, reciprocal-rank sums for hybrid), so the
+    thresholds have to be tuned per engine (see `manage.py benchmark_gate`).
+    """
+
+    min_top_score: float = 0.0
+    min_score_gap: float = 0.0
+
+    def refusal_reason(self, scores: Sequence[float]) -> str:
+        """
+        Why the question should be refused without generation ("" to generate).
+        `scores` are in rank order.
+        """
+        if not scores:
+            return "no documents retrieved"
+
+        top = float(scores[0])
+        if top < self.min_top_score:
+            return f"top score {top:.4f} below {self.min_top_score}"
+
+        # rank 1 barely ahead of rank k: nothing in the corpus stands out
+        gap = top - float(scores[-1])
+        if self.min_score_gap > 0 and len(scores) > 1 and gap < self.min_score_gap:
+            return f"score gap {gap:.4f} between ranks 1 and {len(scores)} below {self.min_score_gap}"
+        return ""
+
+
+def get_confidence_gate() -> Optional[ConfidenceGate]:
+    if not getattr(settings, "QA_CONFIDENCE_GATE", True):
+        return None
+    return ConfidenceGate(
+        min_top_score=float(getattr(settings, "QA_MIN_TOP_SCORE", 0.0)),
+        min_score_gap=float(getattr(settings, "QA_MIN_SCORE_GAP", 0.0)),
+    )
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 
-from typing import List, Tuple
+from typing import List, Sequence, Tuple
 
 from apps.documents.services.retrieval import RetrievalResult
 
@@ -41,4 +41,26 @@ def pack_context(results: List[RetrievalResult], max_chars: int) -> PackedContex
             break
 
     ctx = "\n---\n".join(chunks).strip()
-    return PackedContext(text=ctx, used_doc_ids=used_doc_ids, context_chars=len(ctx))
\ No newline at end of file
+    return PackedContext(text=ctx, used_doc_ids=used_doc_ids, context_chars=len(ctx))
+
+
+def extractive_answer(passages: Sequence[Tuple[str, str]], max_chars: int) -> str:
+    """
+    Degraded answer made of the top retrieved (title, text) passages, cited
+    as [D1], [D2], ... like generated answers. Passages are cut at a word
+    boundary so the whole answer stays within max_chars.
+    """
+    parts: List[str] = []
+    total = 0
+
+    for idx, (title, text) in enumerate(passages, start=1):
+        piece = f"[D{idx}] {title}: {' '.join((text or '').split())}"
+        remaining = max_chars - total
+        if remaining <= 0:
+            break
+        if len(piece) > remaining:
+            piece = piece[:remaining - 2].rsplit(" ", 1)[0].rstrip() + " …"
+        parts.append(piece)
+        total += len(piece) + 2
+
+    return "\n\n".join(parts)
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import contextlib
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from django.conf import settings
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """
+    Point in time (time.perf_counter) by which a request must be answered.
+    """
+
+    expires_at: float
+    budget_ms: int
+
+    @classmethod
+    def after_ms(cls, budget_ms: int) -> "Deadline":
+        return cls(expires_at=time.perf_counter() + budget_ms / 1000.0, budget_ms=budget_ms)
+
+    @property
+    def remaining_ms(self) -> float:
+        return (self.expires_at - time.perf_counter()) * 1000.0
+
+    @property
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.expires_at
+
+    def check(self, stage: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(f"Deadline of {self.budget_ms} ms exceeded during {stage}")
+
+
+# Deadline of the request being served by this thread/context. Contextvars
+# follow the call into the chain, the LangChain LLM and the local model
+# without threading it through every signature.
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("qa_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+def request_deadline() -> Optional[Deadline]:
+    """
+    A new deadline of QA_DEADLINE_MS from now (None when disabled).
+    """
+    budget_ms = int(getattr(settings, "QA_DEADLINE_MS", 0) or 0)
+    return Deadline.after_ms(budget_ms) if budget_ms > 0 else None
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+import copy
 import os
 import threading
 from dataclasses import dataclass
+from typing import Dict, List
+
 from django.conf import settings
+
+from apps.qa.services.deadline import Deadline, current_deadline
+from apps.qa.services.prompts import PROMPT_PREFIXES
+
+
 class LLMError(RuntimeError):
     pass
 
@@ -33,53 +41,180 @@ class HFConfig:
     temperature: float
 
 _hf_lock = threading.Lock()
-_hf_pipeline = None
+_hf_model = None
+_hf_tokenizer = None
 _hf_model_name = None
+_hf_prefixes: Dict[str, "_EncodedPrefix"] = {}
+
+
+@dataclass
+class _EncodedPrefix:
+    """
+    A fixed instruction block, encoded once per loaded model.
+
+    A prompt made of prefix + suffix is fed to the model as
+    lead + body + tokens(suffix) + trail, i.e. what the tokenizer produces
+    for the whole prompt when the split falls on a line break.
+    """
+
+    lead: List[int]  # special tokens the tokenizer puts before the text
+    body: List[int]  # the prefix text itself
+    trail: List[int]  # special tokens the tokenizer puts after the text
+    past_key_values: object = None  # decoder-only models: KV cache of lead + body
+
+
+def _encode_prefix(prefix: str) -> _EncodedPrefix:
+    import torch
+
+    with_special = _hf_tokenizer(prefix)["input_ids"]
+    body = _hf_tokenizer(prefix, add_special_tokens=False)["input_ids"]
+    n_lead = with_special.index(body[0]) if body and body[0] in with_special else 0
+    encoded = _EncodedPrefix(
+        lead=with_special[:n_lead],
+        body=body,
+        trail=with_special[n_lead + len(body):],
+    )
+
+    # Encoder-decoder models (flan-t5) attend over the whole input in both
+    # directions, so encoder states of the prefix depend on the suffix and
+    # only its token ids can be reused. Decoder-only models attend causally:
+    # the KV cache of the prefix is exact and is computed here once.
+    if not _hf_model.config.is_encoder_decoder:
+        with torch.inference_mode():
+            input_ids = torch.tensor([encoded.lead + encoded.body])
+            encoded.past_key_values = _hf_model(input_ids=input_ids, use_cache=True).past_key_values
+    return encoded
+
+
+def _deadline_criteria(deadline: Deadline):
+    """
+    Stops generation between two tokens once `deadline` has passed.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class DeadlineCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), deadline.expired, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([DeadlineCriteria()])
+
+
+LLM_QUANTIZATIONS = ("none", "int8")
+
+
+def _optimize_for_cpu(model, quantization: str, num_threads: int):
+    import torch
+
+    if num_threads > 0:
+        # per process: several workers on one host should split the cores
+        torch.set_num_threads(num_threads)
+    if quantization == "int8":
+        # weights of every nn.Linear stored as int8, activations quantized on
+        # the fly; embeddings and layer norms stay float32
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
 
 
 class HuggingFaceLLM(BaseLLM):
     """
     Local LLM using HuggingFace transformers (CPU).
-    Uses a cached pipeline so we don't reload the model on every request.
+    The model is loaded once per process, not on every request. Prompts
+    starting with one of prompts.PROMPT_PREFIXES reuse the prefix encoded at
+    load time and only tokenize (and, for decoder-only models, run the model
+    over) the question/context part (LLM_PREFIX_CACHE=1).
+    LLM_QUANTIZATION=int8 quantizes linear layers dynamically and
+    LLM_NUM_THREADS caps the intra-op threads of this process.
     """
     name = "hf"
     def __init__(self, cfg: HFConfig):
         self.cfg = cfg
-        self._ensure_pipeline(cfg.model_name)
-    
-    def _ensure_pipeline(self, model_name: str):
-        global _hf_pipeline, _hf_model_name
+        self._ensure_model(cfg.model_name)
 
-        with _hf_lock:
-            if _hf_pipeline is not None and _hf_model_name == self.cfg.model_name:
-                return
-            from transformers import pipeline
+    def _ensure_model(self, model_name: str):
+        global _hf_model, _hf_tokenizer, _hf_model_name, _hf_prefixes
 
-            _hf_pipeline = pipeline(
-                task = "text2text-generation",
-                model = self.cfg.model_name,
-                device = -1
-            )
-            _hf_model_name = model_name
+        quantization = str(os.getenv("LLM_QUANTIZATION") or getattr(settings, "LLM_QUANTIZATION", "none") or "none").lower()
+        if quantization not in LLM_QUANTIZATIONS:
+            raise LLMError(f"Unsupported LLM_QUANTIZATION: {quantization}")
+        num_threads = int(os.getenv("LLM_NUM_THREADS") or getattr(settings, "LLM_NUM_THREADS", 0) or 0)
+        key = (model_name, quantization, num_threads)
 
-    def generate(self, prompt: str) -> str:
-        global _hf_pipeline
+        with _hf_lock:
+            if _hf_model is not None and _hf_model_name == key:
+                return
+            from transformers import AutoConfig, AutoModelForCausalLM, AutoModelForSeq2SeqLM, AutoTokenizer
+
+            config = AutoConfig.from_pretrained(model_name)
+            model_cls = AutoModelForSeq2SeqLM if config.is_encoder_decoder else AutoModelForCausalLM
+            _hf_tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = model_cls.from_pretrained(model_name)
+            model.eval()
+            _hf_model = _optimize_for_cpu(model, quantization, num_threads)
+            _hf_model_name = key
+
+            _hf_prefixes = {}
+            prefix_cache = os.getenv("LLM_PREFIX_CACHE")
+            prefix_cache = (prefix_cache == "1") if prefix_cache else getattr(settings, "LLM_PREFIX_CACHE", True)
+            if prefix_cache:
+                _hf_prefixes = {prefix: _encode_prefix(prefix) for prefix in PROMPT_PREFIXES}
+
+    def _input_ids(self, prompt: str):
+        """
+        Token ids of `prompt` and, when its prefix has one, a private copy
+        of the prefix KV cache.
+        """
+        for prefix, encoded in _hf_prefixes.items():
+            if prompt.startswith(prefix) and len(prompt) > len(prefix):
+                suffix = _hf_tokenizer(prompt[len(prefix):], add_special_tokens=False)["input_ids"]
+                past = copy.deepcopy(encoded.past_key_values) if encoded.past_key_values is not None else None
+                return encoded.lead + encoded.body + suffix + encoded.trail, past
+        return _hf_tokenizer(prompt)["input_ids"], None
+
+    def generate_ids(self, prompt: str):
+        """
+        Token ids of the generated answer (without the prompt).
+        """
+        import torch
+
+        if _hf_model is None:
+            raise LLMError("HF model is not initialized")
 
-        if _hf_pipeline is None:
-            raise LLMError("HF pipeline is not initialized")
-        
         prompt = (prompt or "").strip()
         if not prompt:
             raise LLMError("Prompt is empty")
-        
-        out = _hf_pipeline(
-            prompt,
-            max_new_tokens = self.cfg.max_new_tokens,
-            do_sample = self.cfg.temperature > 0.0,
-            temperature = self.cfg.temperature,
-        )
-
-        text = (out[0]["generated_text"] or "").strip()
+
+        # the request deadline (apps.qa.services.deadline) bounds generation:
+        # checked before encoding and between tokens, DeadlineExceeded past it
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("generation")
+
+        ids, past = self._input_ids(prompt)
+        input_ids = torch.tensor([ids])
+        kwargs = {"max_new_tokens": self.cfg.max_new_tokens, "use_cache": True}
+        if self.cfg.temperature > 0.0:
+            kwargs.update(do_sample=True, temperature=self.cfg.temperature)
+        else:
+            # greedy fast path: a single beam, no sampling, KV cache between steps
+            kwargs.update(do_sample=False, num_beams=1)
+        if past is not None:
+            # generation only runs the model over the tokens after the cached prefix
+            kwargs["past_key_values"] = past
+        if deadline is not None:
+            kwargs["stopping_criteria"] = _deadline_criteria(deadline)
+
+        with torch.inference_mode():
+            out = _hf_model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **kwargs)
+        if deadline is not None:
+            # a cut-off answer is not returned as if it were complete
+            deadline.check("generation")
+        if not _hf_model.config.is_encoder_decoder:
+            out = out[:, input_ids.shape[1]:]
+        return out[0]
+
+    def generate(self, prompt: str) -> str:
+        text = (_hf_tokenizer.decode(self.generate_ids(prompt), skip_special_tokens=True) or "").strip()
         return text or "I don't know based on the provided documents."
 
 
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from apps.qa.models import Answer, Question
+
+logger = logging.getLogger(__name__)
+
+PERSIST_EAGER = "eager"        # PENDING row before generation, updated afterwards
+PERSIST_DEFERRED = "deferred"  # one transaction with bulk inserts after generation
+PERSIST_BUFFERED = "buffered"  # batched asynchronously by a background writer
+
+
+def get_persistence_mode() -> str:
+    mode = str(getattr(settings, "QA_PERSISTENCE_MODE", PERSIST_EAGER) or PERSIST_EAGER).lower()
+    if mode not in (PERSIST_EAGER, PERSIST_DEFERRED, PERSIST_BUFFERED):
+        raise RuntimeError(f"Unsupported QA_PERSISTENCE_MODE: {mode}")
+    return mode
+
+
+@dataclass
+class QARecord:
+    """
+    Everything needed to persist one question/answer pair after generation.
+    """
+
+    question_text: str
+    retrieval_top_k: int
+    prompt_version: str
+    status: str = Answer.Status.PENDING
+    text: str = ""
+    error_message: str = ""
+    model_name: str = ""
+    context_chars: int = 0
+    latency_ms: int = 0
+    source_ids: List[int] = field(default_factory=list)
+
+    def to_models(self) -> tuple[Question, Answer]:
+        q = Question(text=self.question_text)
+        a = Answer(
+            question=q,
+            text=self.text,
+            status=self.status,
+            error_message=self.error_message,
+            model_name=self.model_name,
+            prompt_version=self.prompt_version,
+            retrieval_top_k=self.retrieval_top_k,
+            context_chars=self.context_chars,
+            latency_ms=self.latency_ms,
+        )
+        return q, a
+
+
+def add_sources(answers: List[Answer], source_ids: List[List[int]]) -> None:
+    """
+    Bulk-inserts answer -> document through-rows for freshly created answers
+    (no existing rows to diff against, unlike source_documents.set()).
+    """
+    through = Answer.source_documents.through
+    rows = [
+        through(answer_id=a.id, document_id=doc_id)
+        for a, ids in zip(answers, source_ids)
+        for doc_id in dict.fromkeys(ids)
+    ]
+    if rows:
+        through.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def persist_records(records: List[QARecord]) -> List[Answer]:
+    """
+    Writes Questions, Answers and their source rows in a single transaction:
+    one bulk insert per table when the backend returns primary keys from
+    bulk inserts (Postgres, SQLite 3.35+), row-by-row inserts otherwise.
+    """
+    pairs = [r.to_models() for r in records]
+    questions = [q for q, _ in pairs]
+    answers = [a for _, a in pairs]
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Question.objects.bulk_create(questions)
+            for q, a in pairs:
+                a.question = q
+            Answer.objects.bulk_create(answers)
+        else:
+            for q, a in pairs:
+                q.save(force_insert=True)
+                a.question = q
+                a.save(force_insert=True)
+
+        add_sources(answers, [r.source_ids for r in records])
+
+    return answers
+
+
+def persist_record(record: QARecord) -> Answer:
+    return persist_records([record])[0]
+
+
+class BufferedQAWriter:
+    """
+    Collects QARecords in memory and flushes them from a background thread,
+    in batches of `batch_size` or every `flush_interval` seconds.
+
+    Records are lost if the process dies before a flush, and submitted
+    answers have no primary key yet; use it when write throughput matters
+    more than read-your-writes.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval: float = 0.2, max_size: int = 10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue[QARecord] = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="qa-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: QARecord) -> Answer:
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # back-pressure: write this one synchronously
+            return persist_record(record)
+        return record.to_models()[1]
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            batch: List[QARecord] = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return 0
+            try:
+                persist_records(batch)
+            except Exception:
+                logger.exception("Dropping %d QA records after a failed flush", len(batch))
+            return len(batch)
+
+    def flush_all(self) -> None:
+        while self.flush():
+            pass
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush_all()
+            finally:
+                close_old_connections()
+
+
+_writer_lock = threading.Lock()
+_writer: BufferedQAWriter | None = None
+
+
+def get_buffered_writer() -> BufferedQAWriter:
+    global _writer
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = BufferedQAWriter(
+                batch_size=int(getattr(settings, "QA_BUFFER_BATCH_SIZE", 100)),
+                flush_interval=int(getattr(settings, "QA_BUFFER_FLUSH_INTERVAL_MS", 200)) / 1000.0,
+                max_size=int(getattr(settings, "QA_BUFFER_MAX_SIZE", 10000)),
+            )
+            atexit.register(_writer.flush_all)
+        return _writer
@@ -1,5 +1,28 @@
 PROMPT_VERSION = "v1"
 
+RAG_PROMPT_VERSION = "langchain-v1"
+
+REFUSAL_TEXT = "I don't know based on the provided documents."
+
+# Instruction block of the LangChain RAG prompt. Prompts starting with a known
+# instruction block get its tokens (and, for decoder-only models, its KV cache)
+# reused by the local generator; see apps.qa.services.llm.
+RAG_INSTRUCTIONS = """You are a helpful assistant.
+You MUST answer using only the provided context.
+If the context is insufficient, say exactly: "I don't know based on the provided documents."
+Cite sources using [D1], [D2], ... for each factual claim.
+
+"""
+
+RAG_TEMPLATE = RAG_INSTRUCTIONS + """Question:
+{question}
+
+Context:
+{context}
+
+Answer:
+"""
+
 SYSTEM_STYLE = """You are a helpful assistant.
 You MUST answer using only the provided context.
 If the context is insufficient, say exactly: "I don't know based on the provided documents."
@@ -20,3 +43,5 @@ def build_prompt(context: str, question: str) -> str:
     Answer:
     """
 
+
+PROMPT_PREFIXES = (RAG_INSTRUCTIONS, SYSTEM_STYLE)
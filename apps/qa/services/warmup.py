@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import importlib
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupState:
+    status: str = "pending"  # pending | running | ready | failed | disabled
+    started_at: float | None = None
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    error: str = ""
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "disabled")
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "timings_ms": dict(self.timings_ms),
+            "error": self.error,
+        }
+
+
+_state_lock = threading.Lock()
+_state = WarmupState()
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+def _timed(timings: Dict[str, float], name: str, fn):
+    started = time.perf_counter()
+    result = fn()
+    timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _import_heavy_modules():
+    modules = ["sklearn.feature_extraction.text", "scipy.sparse", "langchain_core.runnables"]
+    provider = str(getattr(settings, "LLM_PROVIDER", "stub")).lower()
+    if provider in ("hf", "huggingface", "transformers"):
+        modules += ["torch", "transformers"]
+    for name in modules:
+        importlib.import_module(name)
+
+
+def _reranks() -> bool:
+    from apps.documents.services.retrieval import get_engine_name
+
+    return get_engine_name() == "hybrid" and bool(getattr(settings, "HYBRID_RERANK", False))
+
+
+def _load_retrieval_index():
+    from apps.documents.services.retrieval import get_engine_name, get_index
+
+    engine = get_engine_name()
+    engines = getattr(settings, "HYBRID_ENGINES", []) if engine == "hybrid" else [engine]
+    for name in engines:
+        get_index(name.strip().lower())
+
+
+def _load_reranker():
+    from apps.documents.services.hybrid import get_reranker
+
+    get_reranker().load()
+
+
+def _load_llm():
+    from apps.qa.langchain.llm import get_langchain_llm
+
+    return get_langchain_llm()
+
+
+def run_warmup() -> WarmupState:
+    """
+    Imports heavy dependencies, builds the retrieval index, loads the
+    cross-encoder (hybrid engine with HYBRID_RERANK), loads the LLM and runs
+    one dummy generation. Safe to call more than once: a finished or
+    in-flight warm-up is not repeated.
+    """
+    global _state
+
+    with _state_lock:
+        if _state.status in ("running", "ready"):
+            return _state
+        _state = WarmupState(status="running", started_at=time.time())
+        state = _state
+
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        _timed(timings, "imports", _import_heavy_modules)
+        _timed(timings, "retrieval_index", _load_retrieval_index)
+        if _reranks():
+            _timed(timings, "reranker_load", _load_reranker)
+        llm = _timed(timings, "llm_load", _load_llm)
+        _timed(timings, "dummy_generation", lambda: llm.invoke("Answer with OK."))
+        state.status = "ready"
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        state.status = "failed"
+        state.error = str(e)
+    finally:
+        timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        state.timings_ms = timings
+        logger.info("Warm-up %s in %.1f ms: %s", state.status, timings["total"], timings)
+
+    return state
+
+
+def start_warmup_in_background() -> None:
+    threading.Thread(target=run_warmup, name="qa-warmup", daemon=True).start()
+
+
+def _warmup_on_request(sender, **kwargs):
+    if _state.status == "pending":
+        start_warmup_in_background()
+
+
+def start_warmup_on_first_request() -> None:
+    """
+    Starts the warm-up when this process handles its first request (usually
+    the readiness probe).
+
+    Servers that load the app before forking workers (gunicorn --preload)
+    run AppConfig.ready() in the master. A warm-up thread started there
+    would not survive the fork, and the workers would report "running"
+    forever. Requests are only ever handled by workers.
+    """
+    from django.core.signals import request_started
+
+    request_started.connect(_warmup_on_request, dispatch_uid="qa-warmup")
+
+
+def mark_warmup_disabled() -> None:
+    global _state
+
+    with _state_lock:
+        if _state.status == "pending":
+            _state = WarmupState(status="disabled")
@@ -1,3 +1,288 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework import serializers
+
+from apps.documents.models import Document
+from apps.documents.services import retrieval
+from apps.documents.services.retrieval import RetrievalResult
+from apps.qa.models import Answer, Question
+from apps.qa.serializers import AskRequestSerializer, LeanRequestSerializer, RetrievalRequestSerializer
+from apps.qa.services.answer_generation import generate_answer_for_question
+from apps.qa.services.confidence import ConfidenceGate
+from apps.qa.services.deadline import Deadline, current_deadline, deadline_scope, request_deadline
+from apps.qa.services.persistence import BufferedQAWriter
+from apps.qa.services.prompts import REFUSAL_TEXT
+
+PAYLOADS = [
+    {"question": "what is bm25?"},
+    {"question": "  padded question  ", "k": 5, "tags": ["a", "b"], "tags_mode": "all"},
+    {"question": "q", "k": "5"},
+    {"question": "q", "k": 5.0},
+    {"question": "q", "k": 5.5},
+    {"question": "q", "k": True},
+    {"question": "q", "k": 0},
+    {"question": "q", "k": 21},
+    {"question": "q", "k": None},
+    {"question": ""},
+    {"question": "   "},
+    {"question": None},
+    {"question": 42},
+    {"question": "nul \x00 byte"},
+    {"question": "lone \ud800 surrogate"},
+    {"question": "q", "tags": "single"},
+    {"question": "q", "tags": ["x" * 65]},
+    {"question": "q", "tags": [str(i) for i in range(21)]},
+    {"question": "q", "tags": [1, "b"]},
+    {"question": "q", "tags": []},
+    {"question": "q", "tags_mode": "none"},
+    {"k": 3},
+    {"question": "q", "unexpected": "ignored"},
+    ["question", "q"],
+    "question=q",
+]
+
+
+def drf_only(serializer_class, data):
+    serializer = serializer_class(data=data)
+    valid = super(LeanRequestSerializer, serializer).is_valid()
+    return serializer, valid
+
+
+class LeanRequestSerializerTests(TestCase):
+    def test_lean_path_matches_drf_validation(self):
+        for serializer_class in (RetrievalRequestSerializer, AskRequestSerializer):
+            for data in PAYLOADS:
+                with self.subTest(serializer=serializer_class.__name__, data=data):
+                    lean = serializer_class(data=data)
+                    valid = lean.is_valid()
+                    expected, expected_valid = drf_only(serializer_class, data)
+
+                    self.assertEqual(valid, expected_valid)
+                    self.assertEqual(lean.errors, expected.errors)
+                    self.assertEqual(lean.validated_data, expected.validated_data)
+                    if valid:
+                        self.assertEqual(
+                            {k: type(v) for k, v in lean.validated_data.items()},
+                            {k: type(v) for k, v in expected.validated_data.items()},
+                        )
+
+    def test_well_formed_payload_skips_drf(self):
+        serializer = AskRequestSerializer(data={"question": "q", "k": 4, "tags": ["a"]})
+        self.assertEqual(
+            serializer._lean_validate(serializer.initial_data),
+            {"question": "q", "k": 4, "tags": ["a"], "tags_mode": "any"},
+        )
+        self.assertIsNone(serializer._lean_validate({"question": "q", "k": "4"}))
+
+    def test_custom_validation_disables_lean_path(self):
+        class ValidatedSerializer(LeanRequestSerializer):
+            question = serializers.CharField()
+
+            def validate_question(self, value):
+                raise serializers.ValidationError("rejected")
+
+        serializer = ValidatedSerializer(data={"question": "q"})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors, {"question": ["rejected"]})
+
+
+def reset_retrieval():
+    # ids are reused after each test's rollback, so an index built by another
+    # test could carry the same version
+    retrieval._indexes.clear()
+    retrieval.invalidate_index()
+    cache.clear()
+
+
+def make_results(n=3):
+    docs = Document.objects.bulk_create(
+        [Document(title=f"Doc {i}", content=f"Passage number {i} about wombats.") for i in range(n)]
+    )
+    return [RetrievalResult(document=d, score=1.0 - i / 10) for i, d in enumerate(docs)]
+
+
+@override_settings(LLM_PROVIDER="stub", QA_CONFIDENCE_GATE=True, QA_MIN_TOP_SCORE=0.0, QA_MIN_SCORE_GAP=0.0)
+class PersistenceTests(TestCase):
+    def setUp(self):
+        self.results = make_results()
+
+    def generate(self):
+        return generate_answer_for_question("what about wombats?", 3, 1500, results=self.results)
+
+    def assertPersisted(self, answer):
+        answer = Answer.objects.get(pk=answer.pk)
+        self.assertEqual(answer.status, Answer.Status.SUCCESS)
+        self.assertEqual(answer.question.text, "what about wombats?")
+        self.assertEqual(
+            sorted(answer.source_documents.values_list("pk", flat=True)),
+            sorted(r.document.pk for r in self.results),
+        )
+
+    # counts include the SAVEPOINT/RELEASE pair of each atomic block inside the test transaction
+
+    @override_settings(QA_PERSISTENCE_MODE="eager")
+    def test_eager_writes_a_pending_row_then_updates_it(self):
+        # insert question + pending answer, then update answer + insert sources
+        with self.assertNumQueries(8):
+            answer = self.generate()
+        self.assertPersisted(answer)
+
+    @override_settings(QA_PERSISTENCE_MODE="deferred")
+    def test_deferred_writes_one_transaction_of_bulk_inserts(self):
+        # one insert per table
+        with self.assertNumQueries(5):
+            answer = self.generate()
+        self.assertPersisted(answer)
+
+    @override_settings(QA_PERSISTENCE_MODE="buffered")
+    def test_buffered_records_are_written_by_the_flush(self):
+        # a writer that never flushes on its own; the test flushes it
+        writer = BufferedQAWriter(batch_size=10, flush_interval=3600)
+        with mock.patch("apps.qa.services.answer_generation.get_buffered_writer", return_value=writer):
+            with self.assertNumQueries(0):
+                answers = [self.generate() for _ in range(3)]
+
+        self.assertTrue(all(a.pk is None for a in answers))
+        self.assertEqual(Answer.objects.count(), 0)
+
+        # one batch: still one insert per table
+        with self.assertNumQueries(5):
+            writer.flush_all()
+        self.assertEqual(Question.objects.count(), 3)
+        for answer in Answer.objects.all():
+            self.assertPersisted(answer)
+
+    @override_settings(QA_PERSISTENCE_MODE="buffered")
+    def test_full_buffer_writes_synchronously(self):
+        writer = BufferedQAWriter(batch_size=10, flush_interval=3600, max_size=1)
+        with mock.patch("apps.qa.services.answer_generation.get_buffered_writer", return_value=writer):
+            queued, written = self.generate(), self.generate()
+
+        self.assertIsNone(queued.pk)
+        self.assertPersisted(written)
+        writer.flush_all()
+        self.assertEqual(Answer.objects.count(), 2)
+
+
+def failing_llm():
+    from langchain_core.runnables import RunnableLambda
+
+    def invoke(prompt):
+        raise AssertionError("the LLM must not be invoked")
+
+    return RunnableLambda(invoke)
+
+
+class ConfidenceGateTests(TestCase):
+    def test_refusal_reasons(self):
+        gate = ConfidenceGate(min_top_score=0.5, min_score_gap=0.1)
+        self.assertEqual(gate.refusal_reason([]), "no documents retrieved")
+        self.assertIn("top score", gate.refusal_reason([0.4, 0.1]))
+        self.assertIn("score gap", gate.refusal_reason([0.9, 0.85, 0.82]))
+        self.assertEqual(gate.refusal_reason([0.9, 0.5]), "")
+        # a single hit has no gap to measure
+        self.assertEqual(gate.refusal_reason([0.9]), "")
+
+
+@override_settings(LLM_PROVIDER="stub", QA_PERSISTENCE_MODE="eager", QA_CONFIDENCE_GATE=True, QA_MIN_SCORE_GAP=0.0)
+class RefusalTests(TestCase):
+    def setUp(self):
+        reset_retrieval()
+        self.results = make_results()
+        patcher = mock.patch("apps.qa.langchain.chain.get_langchain_llm", side_effect=failing_llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(QA_MIN_TOP_SCORE=2.0)
+    def test_low_scores_are_refused_without_generation(self):
+        answer = Answer.objects.get(pk=generate_answer_for_question("wombats?", 3, 1500, results=self.results).pk)
+        self.assertEqual(answer.status, Answer.Status.REFUSED)
+        self.assertEqual(answer.text, REFUSAL_TEXT)
+        self.assertEqual(answer.source_documents.count(), 3)
+
+    @override_settings(QA_MIN_TOP_SCORE=0.0)
+    def test_no_results_are_refused_without_generation(self):
+        answer = Answer.objects.get(pk=generate_answer_for_question("wombats?", 3, 1500, results=[]).pk)
+        self.assertEqual(answer.status, Answer.Status.REFUSED)
+        self.assertEqual(answer.text, REFUSAL_TEXT)
+
+    @override_settings(QA_MIN_TOP_SCORE=1e9, RETRIEVAL_ENGINE="bm25", RETRIEVAL_VERSION_CHECK_SECONDS=0)
+    def test_ask_endpoint_records_the_refusal(self):
+        response = self.client.post("/api/qa/ask/", {"question": "wombats"}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "refused")
+        answer = Answer.objects.get(pk=response.json()["answer_id"])
+        self.assertEqual(answer.status, Answer.Status.REFUSED)
+        self.assertEqual(answer.text, REFUSAL_TEXT)
+
+
+def slow_llm():
+    from langchain_core.runnables import RunnableLambda
+
+    # like the local model: checks the deadline between decoding steps
+    def invoke(prompt):
+        for _ in range(100):
+            time.sleep(0.005)
+            current_deadline().check("generation")
+        return "generated"
+
+    return RunnableLambda(invoke)
+
+
+@override_settings(LLM_PROVIDER="stub", QA_PERSISTENCE_MODE="eager", QA_CONFIDENCE_GATE=False, MAX_CONTEXT_CHARS=1500)
+class DeadlineTests(TestCase):
+    def setUp(self):
+        reset_retrieval()
+        self.results = make_results()
+
+    def test_expired_deadline_answers_from_the_passages(self):
+        with mock.patch("apps.qa.langchain.chain.get_langchain_llm", side_effect=failing_llm):
+            with deadline_scope(Deadline(expires_at=0.0, budget_ms=5)):
+                answer = generate_answer_for_question("wombats?", 3, 1500, results=self.results)
+
+        answer = Answer.objects.get(pk=answer.pk)
+        self.assertEqual(answer.status, Answer.Status.DEGRADED)
+        self.assertTrue(answer.text.startswith("[D1] Doc 0: Passage number 0 about wombats."))
+        self.assertIn("[D3] Doc 2", answer.text)
+        self.assertEqual(answer.error_message, "Deadline of 5 ms exceeded during retrieval")
+        self.assertEqual(answer.source_documents.count(), 3)
+
+    def test_deadline_passing_during_generation_degrades(self):
+        with mock.patch("apps.qa.langchain.chain.get_langchain_llm", side_effect=slow_llm):
+            with deadline_scope(Deadline.after_ms(50)):
+                answer = generate_answer_for_question("wombats?", 3, 40, results=self.results)
+
+        self.assertEqual(answer.status, Answer.Status.DEGRADED)
+        self.assertEqual(answer.error_message, "Deadline of 50 ms exceeded during generation")
+        self.assertLessEqual(len(answer.text), 40)
+        self.assertTrue(answer.text.startswith("[D1] Doc 0:"))
+
+    @override_settings(QA_DEADLINE_MS=50, RETRIEVAL_ENGINE="bm25", RETRIEVAL_VERSION_CHECK_SECONDS=0)
+    def test_slow_retrieval_degrades_the_ask_endpoint(self):
+        real_retrieve = retrieval.retrieve_top_k
+
+        def slow_retrieve(*args, **kwargs):
+            time.sleep(0.1)
+            return real_retrieve(*args, **kwargs)
+
+        with (
+            mock.patch("apps.qa.api.retrieve_top_k", side_effect=slow_retrieve) as retrieve,
+            mock.patch("apps.qa.langchain.retriever.retrieve_top_k", side_effect=AssertionError("retrieved twice")),
+            mock.patch("apps.qa.langchain.chain.get_langchain_llm", side_effect=failing_llm),
+        ):
+            response = self.client.post("/api/qa/ask/", {"question": "wombats"}, content_type="application/json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(retrieve.call_count, 1)
+        body = response.json()
+        self.assertEqual(body["status"], "degraded")
+        self.assertTrue(body["answer"].startswith("[D1] "))
+        self.assertEqual(len(body["sources"]), 3)
+
+    @override_settings(QA_DEADLINE_MS=0)
+    def test_zero_disables_the_deadline(self):
+        self.assertIsNone(request_deadline())
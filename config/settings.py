@@ -29,10 +29,78 @@ if not SECRET_KEY:
 RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
 MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "1500"))
 
+# Ranking engine behind retrieve_top_k: "tfidf", "bm25", "hashing", "dense" or "hybrid"
+RETRIEVAL_ENGINE = os.getenv("RETRIEVAL_ENGINE", "tfidf")
+BM25_K1 = float(os.getenv("BM25_K1", "1.5"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Stop scoring new candidates once the top-k can no longer change (MaxScore)
+RETRIEVAL_EARLY_EXIT = os.getenv("RETRIEVAL_EARLY_EXIT", "1") == "1"
+# Partition the lexical index into N shards (doc_id % N) scored in parallel
+RETRIEVAL_SHARDS = int(os.getenv("RETRIEVAL_SHARDS", "1"))
+RETRIEVAL_SHARD_WORKERS = int(os.getenv("RETRIEVAL_SHARD_WORKERS", "0"))  # 0 = one per shard
+# Seconds between checks of the document set in the database (0 = every query), and
+# the age after which an index is rebuilt anyway (covers QuerySet.update / raw SQL)
+RETRIEVAL_VERSION_CHECK_SECONDS = float(os.getenv("RETRIEVAL_VERSION_CHECK_SECONDS", "5"))
+RETRIEVAL_INDEX_MAX_AGE_SECONDS = float(os.getenv("RETRIEVAL_INDEX_MAX_AGE_SECONDS", "300"))
+# Full tfidf/bm25 builds: documents streamed in chunks, tokenized/counted by N processes
+RETRIEVAL_BUILD_WORKERS = int(os.getenv("RETRIEVAL_BUILD_WORKERS", "1"))
+RETRIEVAL_BUILD_CHUNK_SIZE = int(os.getenv("RETRIEVAL_BUILD_CHUNK_SIZE", "2000"))
+# Lexical index storage: float32 | uint8 (per-term quantized impacts)
+RETRIEVAL_INDEX_DTYPE = os.getenv("RETRIEVAL_INDEX_DTYPE", "float32")
+# Look terms up through sorted 64-bit hashes instead of a Python dict
+RETRIEVAL_COMPACT_VOCAB = os.getenv("RETRIEVAL_COMPACT_VOCAB", "0") == "1"
+# Text analysis shared by indexing and queries (NFKC + Persian/Arabic unification always on)
+ANALYSIS_STOP_WORDS = [s for s in os.getenv("ANALYSIS_STOP_WORDS", "").split(",") if s.strip()]  # english,persian
+ANALYSIS_STEMMING = os.getenv("ANALYSIS_STEMMING", "0") == "1"
+# Hashed term columns for RETRIEVAL_ENGINE=hashing (no vocabulary, incremental updates)
+HASHING_N_FEATURES = int(os.getenv("HASHING_N_FEATURES", str(2 ** 18)))
+
+# Dense retrieval (RETRIEVAL_ENGINE=dense)
+DENSE_MODEL_NAME = os.getenv("DENSE_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+DENSE_BATCH_SIZE = int(os.getenv("DENSE_BATCH_SIZE", "32"))
+DENSE_DTYPE = os.getenv("DENSE_DTYPE", "float16")  # float16 | int8
+DENSE_INDEX_DIR = os.getenv("DENSE_INDEX_DIR", str(BASE_DIR / "var" / "dense"))
+DENSE_IVF_NLIST = int(os.getenv("DENSE_IVF_NLIST", "0"))  # 0 = sqrt(n_docs)
+DENSE_IVF_NPROBE = int(os.getenv("DENSE_IVF_NPROBE", "8"))
+
+# Hybrid retrieval (RETRIEVAL_ENGINE=hybrid): RRF over several engines + optional rerank
+HYBRID_ENGINES = [e for e in os.getenv("HYBRID_ENGINES", "bm25,dense").split(",") if e.strip()]
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "100"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_RERANK = os.getenv("HYBRID_RERANK", "0") == "1"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "150"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "stub")
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "google/flan-t5-base")
 LLM_MAX_NEW_TOKENS = int(os.getenv("LLM_MAX_NEW_TOKENS", "256"))
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+# Encode the fixed instruction prefix once per model instead of per request
+LLM_PREFIX_CACHE = os.getenv("LLM_PREFIX_CACHE", "1") == "1"
+# CPU inference: none (float32) | int8 (dynamic quantization of linear layers)
+LLM_QUANTIZATION = os.getenv("LLM_QUANTIZATION", "none")
+# Intra-op threads per worker process (0 = torch default, all cores)
+LLM_NUM_THREADS = int(os.getenv("LLM_NUM_THREADS", "0"))
+
+# Refuse without invoking the LLM when retrieval scores are too weak (engine-specific scale)
+QA_CONFIDENCE_GATE = os.getenv("QA_CONFIDENCE_GATE", "1") == "1"
+QA_MIN_TOP_SCORE = float(os.getenv("QA_MIN_TOP_SCORE", "0.0"))
+QA_MIN_SCORE_GAP = float(os.getenv("QA_MIN_SCORE_GAP", "0.0"))
+
+# Per-request deadline for retrieval + generation; past it the answer falls
+# back to the top retrieved passages (0 = no deadline)
+QA_DEADLINE_MS = int(os.getenv("QA_DEADLINE_MS", "15000"))
+
+# QA persistence: eager | deferred | buffered (see apps.qa.services.persistence)
+QA_PERSISTENCE_MODE = os.getenv("QA_PERSISTENCE_MODE", "eager")
+QA_BUFFER_BATCH_SIZE = int(os.getenv("QA_BUFFER_BATCH_SIZE", "100"))
+QA_BUFFER_FLUSH_INTERVAL_MS = int(os.getenv("QA_BUFFER_FLUSH_INTERVAL_MS", "200"))
+QA_BUFFER_MAX_SIZE = int(os.getenv("QA_BUFFER_MAX_SIZE", "10000"))
+
+# Load index + LLM and run a dummy generation when a worker boots
+WARMUP_ON_BOOT = os.getenv("WARMUP_ON_BOOT", "0") == "1"
 
 
 # SECURITY WARNING: don't run with debug turned on in production!
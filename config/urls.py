@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from apps.qa.api import RetrieveAPIView, AskAPIView
+from apps.qa.api import RetrieveAPIView, AskAPIView, ReadinessAPIView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 
@@ -27,4 +27,5 @@ urlpatterns = [
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     path("api/qa/ask/", AskAPIView.as_view(), name="api-qa-ask"),
+    path("api/health/ready/", ReadinessAPIView.as_view(), name="api-health-ready"),
 ]